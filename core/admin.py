@@ -1,11 +1,33 @@
+import io
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.contrib import messages
 from django.forms import BaseInlineFormSet
-from django.core.exceptions import ValidationError
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.contrib.admin import AdminSite
-from .models import Categoria, Nutricional, Producto, Rol, Direccion, Usuario, MetodoPago, Venta, DetalleVenta
+from django.contrib.admin.widgets import AdminDateWidget, ForeignKeyRawIdWidget
+from django.forms.models import ModelChoiceIterator
+from django.utils.text import Truncator
+from django import forms
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.db import transaction
+from django.db.models import Q, Sum
+from .models import Categoria, Nutricional, Producto, Rol, Direccion, Usuario, MetodoPago, Venta, DetalleVenta, ResumenVentaDiario, MovimientoStock, AlertaStock
+from .alertas import DIAS_VELOCIDAD, umbral_de, unidades_vendidas
+from .busqueda import PRODUCTOS, USUARIOS, BusquedaTextoMixin
+from .cache_maestros import cache_de, ordenar
+from .exportacion import FORMATOS, exportar, lineas_de_venta
+from .importacion import ArchivoInvalido, importar_productos
+from .paginacion import KeysetChangeList
+from .politica import PoliticaAccesoMixin
+from .reposicion import LIMITE_SINCRONO, reponer_en_segundo_plano, reponer_stock, tareas_de_usuario
+from .resumen import refrescar_para_panel
+from .roles import es_cliente
+from .stock import StockInsuficiente, agotar_stock, ajustar_stock, cantidades_por_producto, devolver_stock, diferencia_stock
 
 # Admin personalizado con filtrado por roles
 class RoleBasedAdminSite(AdminSite):
@@ -14,7 +36,7 @@ class RoleBasedAdminSite(AdminSite):
 
     def index(self, request, extra_context=None):
         # Filtrar modelos según el rol del usuario
-        if hasattr(request.user, 'rol') and request.user.rol and request.user.rol.nombre == 'Cliente':
+        if es_cliente(request):
             # Los clientes solo ven su propio perfil
             extra_context = extra_context or {}
             extra_context['show_only_profile'] = True
@@ -24,76 +46,190 @@ class RoleBasedAdminSite(AdminSite):
 admin_site = RoleBasedAdminSite(name='role_based_admin')
 
 
+# Tablas maestras leídas desde core/cache_maestros.py en filtros y formularios
+class FiltroMaestro(admin.RelatedFieldListFilter):
+    """Filtro lateral por una tabla maestra con las opciones leídas del cache."""
+
+    def field_choices(self, field, request, model_admin):
+        cache = cache_de(field.remote_field.model)
+        if cache is None or not cache.completo:
+            return super().field_choices(field, request, model_admin)
+        ordering = self.field_admin_ordering(field, request, model_admin) or field.remote_field.model._meta.ordering
+        return [(fila.pk, str(fila)) for fila in ordenar(cache.todos(), ordering)]
+
+
+class IteradorMaestro(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        ordering = self.queryset.query.order_by or self.queryset.model._meta.ordering
+        for fila in ordenar(self.field.cache.todos(), ordering):
+            yield self.choice(fila)
+
+    def __len__(self):
+        return len(self.field.cache.todos()) + (self.field.empty_label is not None)
+
+
+class CampoMaestro(forms.ModelChoiceField):
+    """Select de una tabla maestra: opciones y validación desde el cache, sin consultas."""
+    iterator = IteradorMaestro
+
+    def __init__(self, queryset, *, cache, **kwargs):
+        super().__init__(queryset, **kwargs)
+        self.cache = cache
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        fila = self.cache.obtener(value)
+        if fila is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return fila
+
+
+class RawIdMaestroWidget(ForeignKeyRawIdWidget):
+    """raw_id_fields con la etiqueta del objeto leída del cache."""
+
+    def label_and_url_for_value(self, value):
+        fila = cache_de(self.rel.model).obtener(value)
+        if fila is None:
+            return '', ''
+        url = reverse(f'{self.admin_site.name}:{fila._meta.app_label}_{fila._meta.model_name}_change', args=(fila.pk,))
+        return Truncator(fila).words(14), url
+
+
+class MaestrosEnCacheMixin:
+    """Claves foráneas a tablas maestras con CampoMaestro o RawIdMaestroWidget."""
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        cache = cache_de(db_field.remote_field.model)
+        if cache is None or 'widget' in kwargs or 'queryset' in kwargs or db_field.get_limit_choices_to():
+            return super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name in self.raw_id_fields:
+            kwargs['widget'] = RawIdMaestroWidget(db_field.remote_field, self.admin_site, using=kwargs.get('using'))
+        elif cache.completo and db_field.name not in self.get_autocomplete_fields(request) and db_field.name not in self.radio_fields:
+            kwargs.update(form_class=CampoMaestro, cache=cache)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
 @admin.register(Categoria)
-class CategoriaAdmin(admin.ModelAdmin):
-    list_display = ('id', 'nombre', 'descripcion')
+class CategoriaAdmin(PoliticaAccesoMixin, admin.ModelAdmin):
+    list_display = ('id', 'nombre', 'descripcion', 'stock_objetivo', 'umbral_alerta')
     search_fields = ('nombre',)
     list_filter = ('nombre',)
     ordering = ('nombre',)
     
-    def has_module_permission(self, request):
-        # Los clientes no pueden acceder a categorías
-        if hasattr(request.user, 'rol') and request.user.rol and request.user.rol.nombre == 'Cliente':
-            return False
-        return super().has_module_permission(request)
 
 @admin.register(Nutricional)
-class NutricionalAdmin(admin.ModelAdmin):
+class NutricionalAdmin(PoliticaAccesoMixin, admin.ModelAdmin):
     list_display = ('id', 'ingredientes', 'tiempo_preparacion', 'proteinas', 'azucar', 'gluten')
     search_fields = ('ingredientes',)
     list_filter = ('proteinas', 'azucar')
     ordering = ('id',)
 
+class ImportarProductosForm(forms.Form):
+    archivo = forms.FileField(help_text='CSV con columnas codigo, nombre, tipo, precio y categoria; opcionales marca, stock_actual, stock_objetivo, umbral_alerta e ingredientes, tiempo_preparacion, proteinas, azucar, gluten.')
+
 @admin.register(Producto)
-class ProductoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'nombre', 'marca', 'precio', 'tipo', 'categoria', 'stock_actual', 'stock_status')
+class ProductoAdmin(PoliticaAccesoMixin, MaestrosEnCacheMixin, BusquedaTextoMixin, admin.ModelAdmin):
+    list_display = ('id', 'codigo', 'nombre', 'marca', 'precio', 'tipo', 'categoria', 'stock_actual', 'stock_status')
     search_fields = ('nombre', 'marca', 'tipo')
-    list_filter = ('tipo', 'categoria', 'created_at')
+    list_filter = ('tipo', ('categoria', FiltroMaestro), 'created_at')
     ordering = ('nombre',)
     list_select_related = ('categoria', 'nutricional')
+    raw_id_fields = ('nutricional',)
     actions = ['actualizar_stock', 'marcar_agotado']
+    change_list_template = 'admin/core/producto/change_list.html'
+    # Errores por fila que se muestran tras importar
+    MAX_ERRORES_MOSTRADOS = 500
+
+    def filtro_busqueda(self, termino):
+        # Índice de texto sobre nombre, marca y tipo; ver core/busqueda.py
+        ids = PRODUCTOS.ids(termino)
+        return Q(pk__in=ids) if ids is not None else None
     
     def stock_status(self, obj):
+        # Umbral del producto o de su categoría (ver core/alertas.py); categoria viene en list_select_related
         if obj.stock_actual == 0:
             return format_html('<span style="color: red; font-weight: bold;">AGOTADO</span>')
-        elif obj.stock_actual < 10:
+        elif obj.stock_actual < umbral_de(obj):
             return format_html('<span style="color: orange;">BAJO STOCK</span>')
         else:
             return format_html('<span style="color: green;">DISPONIBLE</span>')
     stock_status.short_description = 'Estado Stock'
     
     def actualizar_stock(self, request, queryset):
-        updated = 0
-        for producto in queryset:
-            if producto.stock_actual < 5:
-                producto.stock_actual = 50  # Reponer stock
-                producto.save()
-                updated += 1
+        # Selecciones muy grandes se reponen por lotes sin retener la petición
+        if queryset.count() > LIMITE_SINCRONO:
+            tarea = reponer_en_segundo_plano(queryset, request.user.pk)
+            self.message_user(request, f'Reposición de {tarea.total} productos iniciada en segundo plano.', messages.INFO)
+            return
+        updated = reponer_stock(queryset)
         self.message_user(request, f'Stock actualizado para {updated} productos.', messages.SUCCESS)
     actualizar_stock.short_description = "Actualizar stock bajo"
     
     def marcar_agotado(self, request, queryset):
-        updated = queryset.update(stock_actual=0)
+        updated = agotar_stock(queryset)
         self.message_user(request, f'{updated} productos marcados como agotados.', messages.WARNING)
     marcar_agotado.short_description = "Marcar como agotado"
+
+    def get_urls(self):
+        urls = [path('importar/', self.admin_site.admin_view(self.importar_view), name='core_producto_importar')]
+        return urls + super().get_urls()
+
+    def importar_view(self, request):
+        # La importación crea y modifica productos
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        form = ImportarProductosForm(request.POST or None, request.FILES or None)
+        resultado = None
+        if form.is_valid():
+            # Se lee línea a línea desde el archivo subido, sin cargarlo completo
+            lineas = io.TextIOWrapper(form.cleaned_data['archivo'].file, encoding='utf-8-sig', newline='')
+            try:
+                resultado = importar_productos(lineas)
+            except (ArchivoInvalido, UnicodeDecodeError) as e:
+                form.add_error('archivo', str(e))
+            else:
+                self.message_user(
+                    request, f'{resultado.importadas} de {resultado.filas} filas importadas.',
+                    messages.SUCCESS if not resultado.errores else messages.WARNING,
+                )
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Importar productos',
+            'opts': self.model._meta,
+            'form': form,
+            'resultado': resultado,
+            'errores': resultado.errores[:self.MAX_ERRORES_MOSTRADOS] if resultado else [],
+        }
+        return TemplateResponse(request, 'admin/core/producto/importar.html', context)
+
+    def changelist_view(self, request, extra_context=None):
+        # Informar el avance de las reposiciones en segundo plano del usuario
+        for tarea in tareas_de_usuario(request.user.pk):
+            if tarea.error:
+                self.message_user(request, f'La reposición de stock falló: {tarea.error}', messages.ERROR)
+            elif tarea.terminada:
+                self.message_user(request, f'Reposición terminada: stock actualizado para {tarea.actualizados} productos.', messages.SUCCESS)
+            else:
+                self.message_user(request, f'Reposición en curso: {tarea.procesados}/{tarea.total} ({tarea.porcentaje}%).', messages.INFO)
+        return super().changelist_view(request, extra_context)
     
-    def has_module_permission(self, request):
-        # Los clientes no pueden acceder a productos
-        if hasattr(request.user, 'rol') and request.user.rol and request.user.rol.nombre == 'Cliente':
-            return False
-        return super().has_module_permission(request)
 
 @admin.register(Rol)
-class RolAdmin(admin.ModelAdmin):
+class RolAdmin(PoliticaAccesoMixin, admin.ModelAdmin):
     list_display = ('id', 'nombre', 'descripcion')
     search_fields = ('nombre',)
 
 @admin.register(Usuario)
-class UsuarioAdmin(UserAdmin):
+class UsuarioAdmin(PoliticaAccesoMixin, MaestrosEnCacheMixin, UserAdmin):
     list_display = ('id', 'username', 'email', 'first_name', 'paterno', 'run', 'rol', 'is_staff', 'is_active')
     search_fields = ('username', 'email', 'first_name', 'paterno', 'run')
-    list_filter = ('rol', 'is_staff', 'is_active', 'is_superuser')
+    list_filter = (('rol', FiltroMaestro), 'is_staff', 'is_active', 'is_superuser')
     ordering = ('first_name',)
+    list_select_related = ('rol',)
+    raw_id_fields = ('direccion',)
     
     fieldsets = UserAdmin.fieldsets + (
         ('Información Personal', {'fields': ('paterno', 'materno', 'run', 'fono', 'rol', 'direccion')}),
@@ -105,24 +241,13 @@ class UsuarioAdmin(UserAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         # Si el usuario es cliente, solo puede ver su propio perfil
-        if hasattr(request.user, 'rol') and request.user.rol and request.user.rol.nombre == 'Cliente':
+        if es_cliente(request):
             return qs.filter(id=request.user.id)
         return qs
     
-    def has_add_permission(self, request):
-        # Solo admins pueden agregar usuarios
-        if hasattr(request.user, 'rol') and request.user.rol and request.user.rol.nombre == 'Cliente':
-            return False
-        return super().has_add_permission(request)
-    
-    def has_delete_permission(self, request, obj=None):
-        # Solo admins pueden eliminar usuarios
-        if hasattr(request.user, 'rol') and request.user.rol and request.user.rol.nombre == 'Cliente':
-            return False
-        return super().has_delete_permission(request, obj)
 
 @admin.register(MetodoPago)
-class MetodoPagoAdmin(admin.ModelAdmin):
+class MetodoPagoAdmin(PoliticaAccesoMixin, admin.ModelAdmin):
     list_display = ('id', 'nombre')
 
 # FormSet con validación para DetalleVenta
@@ -138,37 +263,123 @@ class DetalleVentaFormSet(BaseInlineFormSet):
                 precio = form.cleaned_data.get('precio_unitario', 0)
                 total_venta += cantidad * precio
                 
-                # Validación: verificar stock disponible
+                # Validación previa de stock; el descuento real es condicional al guardar
                 producto = form.cleaned_data.get('producto')
-                if producto and cantidad > producto.stock_actual:
+                requerido = cantidad
+                if form.instance.pk and form.initial.get('producto') == getattr(producto, 'pk', None):
+                    # Al editar una línea existente solo se descuenta la diferencia
+                    requerido -= form.initial.get('cantidad', 0)
+                if producto and requerido > producto.stock_actual:
                     raise ValidationError(f'No hay suficiente stock para {producto.nombre}. Stock disponible: {producto.stock_actual}')
         
         if total_venta <= 0:
             raise ValidationError('La venta debe tener al menos un producto con cantidad mayor a 0.')
 
+class ExportarVentasForm(forms.Form):
+    desde = forms.DateField(widget=AdminDateWidget)
+    hasta = forms.DateField(widget=AdminDateWidget)
+    formato = forms.ChoiceField(choices=[(f, f.upper()) for f in FORMATOS])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('desde') and cleaned_data.get('hasta') and cleaned_data['desde'] > cleaned_data['hasta']:
+            raise ValidationError('La fecha inicial debe ser anterior a la final.')
+        return cleaned_data
+
 # Inline para DetalleVenta
 class DetalleVentaInline(admin.TabularInline):
     model = DetalleVenta
     extra = 1
     fields = ('producto', 'cantidad', 'precio_unitario')
     formset = DetalleVentaFormSet
+    # Un select con todo el catálogo carga cada Producto en cada fila del inline
+    autocomplete_fields = ('producto',)
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('producto')
 
 @admin.register(Venta)
-class VentaAdmin(admin.ModelAdmin):
+class VentaAdmin(PoliticaAccesoMixin, MaestrosEnCacheMixin, BusquedaTextoMixin, admin.ModelAdmin):
     list_display = ('id', 'usuario', 'monto_total', 'estado', 'canal_venta', 'fecha', 'monto_coloreado')
     search_fields = ('usuario__first_name', 'usuario__paterno', 'estado')
     list_filter = ('estado', 'canal_venta', 'fecha')
     ordering = ('-fecha',)
     inlines = [DetalleVentaInline]
     list_select_related = ('usuario', 'metodo_pago')
+    autocomplete_fields = ('usuario',)
+    # Paginación por (fecha, id) en lugar de OFFSET; ver core/paginacion.py
+    keyset_fields = ('fecha', 'id')
+    change_list_template = 'admin/core/venta/change_list.html'
+    # monto_total se deriva de las líneas de detalle
+    readonly_fields = ('monto_total',)
     
     # Acción personalizada
-    actions = ['marcar_como_pagado', 'marcar_como_entregado']
+    actions = ['marcar_como_pagado', 'marcar_como_entregado', 'exportar_csv', 'exportar_jsonl']
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_urls(self):
+        urls = [path('exportar/', self.admin_site.admin_view(self.exportar_view), name='core_venta_exportar')]
+        return urls + super().get_urls()
+
+    def respuesta_exportacion(self, lineas, formato, nombre):
+        # Se escribe a medida que se lee: la memoria no crece con el número de líneas
+        response = StreamingHttpResponse(exportar(lineas, formato), content_type=FORMATOS[formato])
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+        return response
+
+    def exportar_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        form = ExportarVentasForm(request.GET or None)
+        if form.is_valid():
+            desde, hasta, formato = (form.cleaned_data[c] for c in ('desde', 'hasta', 'formato'))
+            lineas = lineas_de_venta(self.get_queryset(request), desde, hasta)
+            return self.respuesta_exportacion(lineas, formato, f'ventas_{desde}_{hasta}')
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Exportar ventas',
+            'opts': self.model._meta,
+            'form': form,
+            'media': self.media + form.media,
+        }
+        return TemplateResponse(request, 'admin/core/venta/exportar.html', context)
+
+    def filtro_busqueda(self, termino):
+        ids = USUARIOS.ids(termino)
+        if ids is None:
+            return None
+        # estado tiene pocos valores distintos: se resuelven antes y se filtra por igualdad
+        estados = [e for e in Venta.objects.order_by().values_list('estado', flat=True).distinct() if termino.lower() in e.lower()]
+        return Q(usuario_id__in=ids) | Q(estado__in=estados)
     
+    def save_related(self, request, form, formsets, change):
+        # Cantidades previas para descontar solo la diferencia al editar
+        antes = cantidades_por_producto(form.instance) if change else {}
+        super().save_related(request, form, formsets, change)
+        ajustar_stock(diferencia_stock(antes, cantidades_por_producto(form.instance)), venta_id=form.instance.pk)
+
+    # Eliminar una venta devuelve su stock, igual que quitar sus líneas en el formulario
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            devolver_stock(Venta.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            devolver_stock(queryset)
+            super().delete_queryset(request, queryset)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except StockInsuficiente as e:
+            # La transacción del formulario ya fue revertida completa
+            self.message_user(request, str(e), messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
     def monto_coloreado(self, obj):
         if obj.monto_total > 10000:
             return format_html('<span style="color: green; font-weight: bold;">${}</span>', obj.monto_total)
@@ -187,11 +398,19 @@ class VentaAdmin(admin.ModelAdmin):
         updated = queryset.update(estado='Entregado')
         self.message_user(request, f'{updated} ventas marcadas como entregadas.', messages.SUCCESS)
     marcar_como_entregado.short_description = "Marcar como entregado"
+
+    def exportar_csv(self, request, queryset):
+        return self.respuesta_exportacion(lineas_de_venta(queryset), 'csv', 'ventas')
+    exportar_csv.short_description = "Exportar líneas de venta (CSV)"
+
+    def exportar_jsonl(self, request, queryset):
+        return self.respuesta_exportacion(lineas_de_venta(queryset), 'jsonl', 'ventas')
+    exportar_jsonl.short_description = "Exportar líneas de venta (JSONL)"
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         # Si el usuario es cliente, solo puede ver sus propias ventas
-        if hasattr(request.user, 'rol') and request.user.rol and request.user.rol.nombre == 'Cliente':
+        if es_cliente(request):
             return qs.filter(usuario=request.user)
         return qs
     
@@ -200,6 +419,127 @@ class VentaAdmin(admin.ModelAdmin):
         return True
 
 @admin.register(DetalleVenta)
-class DetalleVentaAdmin(admin.ModelAdmin):
+class DetalleVentaAdmin(PoliticaAccesoMixin, admin.ModelAdmin):
     list_display = ('id', 'venta', 'producto', 'cantidad', 'precio_unitario')
     search_fields = ('producto__nombre', 'venta__id')
+    ordering = ('-id',)
+    # str(venta) incluye al usuario
+    list_select_related = ('venta__usuario', 'producto')
+    raw_id_fields = ('venta',)
+    autocomplete_fields = ('producto',)
+    keyset_fields = ('id',)
+    change_list_template = 'admin/core/change_list_keyset.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(PoliticaAccesoMixin, admin.ModelAdmin):
+    # Registro de solo inserción: se consulta, no se edita
+    # venta_id: str(venta) cargaría al usuario de cada venta
+    list_display = ('id', 'fecha', 'producto', 'tipo', 'cantidad', 'venta_id')
+    list_filter = ('tipo',)
+    ordering = ('-id',)
+    list_select_related = ('producto',)
+    raw_id_fields = ('producto', 'venta')
+    keyset_fields = ('id',)
+    change_list_template = 'admin/core/change_list_keyset.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(AlertaStock)
+class AlertaStockAdmin(PoliticaAccesoMixin, admin.ModelAdmin):
+    # Panel de reposición: el conjunto de alertas se mantiene con cada cambio de stock
+    list_display = ('producto', 'stock_actual', 'umbral', 'faltante', 'vendidas', 'por_dia', 'dias_restantes', 'desde')
+    list_filter = (('producto__categoria', FiltroMaestro),)
+    ordering = ('-faltante', '-id')
+    list_select_related = ('producto',)
+    keyset_fields = ('faltante', 'id')
+    change_list_template = 'admin/core/change_list_keyset.html'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(producto__deleted_at__isnull=True)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        if hasattr(response, 'context_data') and 'cl' in response.context_data:
+            # Velocidad de venta solo de los productos de la página, en una consulta
+            alertas = response.context_data['cl'].result_list
+            vendidas = unidades_vendidas([a.producto_id for a in alertas])
+            for alerta in alertas:
+                alerta.vendidas = vendidas.get(alerta.producto_id, 0)
+        return response
+
+    def stock_actual(self, obj):
+        return obj.producto.stock_actual
+    stock_actual.short_description = 'Stock'
+
+    def vendidas(self, obj):
+        return getattr(obj, 'vendidas', None)
+    vendidas.short_description = f'Vendidas ({DIAS_VELOCIDAD} días)'
+
+    def por_dia(self, obj):
+        if getattr(obj, 'vendidas', None) is None:
+            return None
+        return f'{obj.vendidas / DIAS_VELOCIDAD:.1f}'
+    por_dia.short_description = 'Venta diaria'
+
+    def dias_restantes(self, obj):
+        # Días que dura el stock al ritmo de venta reciente; sin ventas no se estima
+        if not getattr(obj, 'vendidas', None):
+            return None
+        return f'{obj.producto.stock_actual * DIAS_VELOCIDAD / obj.vendidas:.1f}'
+    dias_restantes.short_description = 'Días de stock'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ResumenVentaDiario)
+class ResumenVentaDiarioAdmin(PoliticaAccesoMixin, admin.ModelAdmin):
+    list_display = ('fecha', 'producto', 'canal_venta', 'metodo_pago', 'cantidad', 'monto', 'num_ventas')
+    list_filter = ('canal_venta', ('metodo_pago', FiltroMaestro), ('producto__categoria', FiltroMaestro), 'fecha')
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha',)
+    list_select_related = ('producto', 'metodo_pago')
+
+    def changelist_view(self, request, extra_context=None):
+        # Los resúmenes se refrescan antes de mostrar el panel, sin escribir en cada visita
+        refrescar_para_panel()
+        response = super().changelist_view(request, extra_context)
+        if hasattr(response, 'context_data') and 'cl' in response.context_data:
+            qs = response.context_data['cl'].queryset.order_by()
+            response.context_data['totales_por_canal'] = (
+                qs.values('canal_venta').annotate(unidades=Sum('cantidad'), total=Sum('monto')).order_by('-total')
+            )
+            response.context_data['totales_por_metodo'] = (
+                qs.values('metodo_pago__nombre').annotate(unidades=Sum('cantidad'), total=Sum('monto')).order_by('-total')
+            )
+        return response
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,120 @@
+import datetime
+
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AlertaStock, DetalleVenta, Producto, borrar_filas
+
+# Umbral usado cuando ni el producto ni su categoría definen umbral_alerta
+UMBRAL_ALERTA_DEFECTO = 10
+# Días de ventas con que se calcula la velocidad de venta
+DIAS_VELOCIDAD = 14
+TAMANO_LOTE = 2000
+
+
+def umbral_alerta():
+    """Expresión SQL con el umbral de alerta: producto, luego categoría, luego el valor por defecto."""
+    return Coalesce(F('umbral_alerta'), F('categoria__umbral_alerta'), Value(UMBRAL_ALERTA_DEFECTO))
+
+
+def umbral_de(producto):
+    """Umbral de alerta de un producto ya cargado, con su categoría."""
+    for umbral in (producto.umbral_alerta, producto.categoria.umbral_alerta):
+        if umbral is not None:
+            return umbral
+    return UMBRAL_ALERTA_DEFECTO
+
+
+def revisar_alertas(productos):
+    """
+    Pone al día AlertaStock para los productos indicados (ids o un queryset
+    de ids), tras un cambio de su stock o de su umbral.
+
+    Lee en una consulta el stock, el umbral y la alerta actual de esos
+    productos y solo escribe las alertas que cambian: las que aparecen, las
+    que cambian de faltante y las que se resuelven. El costo depende de los
+    productos revisados, no del catálogo. Retorna (alertas escritas,
+    alertas resueltas). Se llama dentro de la transacción que cambió el stock.
+    """
+    filas = (
+        Producto.all_objects.filter(pk__in=productos).order_by()
+        .annotate(umbral=umbral_alerta())
+        .values_list('pk', 'stock_actual', 'deleted_at', 'umbral', 'alerta__umbral', 'alerta__faltante')
+    )
+    escritas, resueltas = [], []
+    for producto_id, stock, eliminado, umbral, umbral_actual, faltante_actual in filas:
+        if eliminado is None and stock < umbral:
+            if (umbral, umbral - stock) != (umbral_actual, faltante_actual):
+                escritas.append(AlertaStock(producto_id=producto_id, umbral=umbral, faltante=umbral - stock))
+        elif faltante_actual is not None:
+            resueltas.append(producto_id)
+    if escritas:
+        # desde se conserva en las alertas que ya existían
+        AlertaStock.objects.bulk_create(
+            escritas, update_conflicts=True, unique_fields=['producto'], update_fields=['umbral', 'faltante'],
+        )
+    if resueltas:
+        # Borrado directo: delete() leería las filas antes para las señales
+        borrar_filas(AlertaStock.objects.filter(producto_id__in=resueltas))
+    return len(escritas), len(resueltas)
+
+
+def reconstruir_alertas():
+    """Revisa el catálogo completo por lotes de id; corrige alertas desfasadas por UPDATEs directos."""
+    escritas = resueltas = 0
+    ultimo = 0
+    while True:
+        ids = list(
+            Producto.all_objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:TAMANO_LOTE]
+        )
+        if not ids:
+            return escritas, resueltas
+        e, r = revisar_alertas(ids)
+        escritas += e
+        resueltas += r
+        ultimo = ids[-1]
+
+
+def unidades_vendidas(producto_ids, dias=DIAS_VELOCIDAD):
+    """{producto_id: unidades vendidas en los últimos `dias` días}, en una consulta agrupada."""
+    desde = timezone.now() - datetime.timedelta(days=dias)
+    return dict(
+        DetalleVenta.objects.filter(producto_id__in=producto_ids, venta__fecha__gte=desde)
+        .order_by().values('producto_id').annotate(total=Sum('cantidad'))
+        .values_list('producto_id', 'total')
+    )
+
+
+def candidatos_reposicion(limite=None, dias=DIAS_VELOCIDAD):
+    """
+    Productos en alerta, de mayor a menor faltante, como dicts con el stock,
+    el umbral, las unidades vendidas en `dias` días, la venta diaria y los
+    días de stock que quedan a ese ritmo (None si no hubo ventas).
+    """
+    alertas = (
+        AlertaStock.objects.filter(producto__deleted_at__isnull=True)
+        .order_by('-faltante', '-id')
+        .values('producto_id', 'producto__nombre', 'producto__stock_actual', 'umbral', 'faltante', 'desde')
+    )
+    if limite is not None:
+        alertas = alertas[:limite]
+    alertas = list(alertas)
+    vendidas = unidades_vendidas([a['producto_id'] for a in alertas], dias)
+    candidatos = []
+    for alerta in alertas:
+        unidades = vendidas.get(alerta['producto_id'], 0)
+        por_dia = unidades / dias
+        stock = alerta['producto__stock_actual']
+        candidatos.append({
+            'producto_id': alerta['producto_id'],
+            'nombre': alerta['producto__nombre'],
+            'stock': stock,
+            'umbral': alerta['umbral'],
+            'faltante': alerta['faltante'],
+            'desde': alerta['desde'],
+            'vendidas': unidades,
+            'por_dia': por_dia,
+            'dias_restantes': stock / por_dia if por_dia else None,
+        })
+    return candidatos
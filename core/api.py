@@ -0,0 +1,156 @@
+import json
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from .busqueda import PRODUCTOS, terminos
+from .cache_maestros import CATEGORIAS
+from .caja import CarritoInvalido, ClaveAjena, registrar_venta
+from .models import Producto, Venta
+from .roles import aget_rol, get_rol
+from .sincronizacion import ACEPTADA, DUPLICADA, RECHAZADA, LoteInvalido, leer_jsonl, sincronizar_ventas
+from .stock import StockInsuficiente
+
+# Productos por respuesta del catálogo
+LIMITE_CATALOGO = 100
+
+
+def _error(mensaje, status):
+    return JsonResponse({'error': mensaje}, status=status)
+
+
+def _puede(user, permiso):
+    # /api/ está fuera del admin: se exigen las mismas condiciones que el admin para el modelo
+    return user.is_staff and user.has_perm(permiso)
+
+
+async def _apuede(user, permiso):
+    return user.is_staff and await user.ahas_perm(permiso)
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+@require_GET
+async def catalogo(request):
+    """
+    Productos vigentes ordenados por id, de a LIMITE_CATALOGO. Filtros:
+    ?categoria=<id>, ?q=<texto> (como la búsqueda del admin) y ?despues=<id>
+    con el valor de "siguiente" de la respuesta anterior.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error('Autenticación requerida.', 401)
+    qs = Producto.objects.order_by('id')
+    for parametro in ('categoria', 'despues'):
+        if parametro in request.GET and _entero(request.GET[parametro]) is None:
+            return _error(f'El parámetro {parametro} debe ser un número.', 400)
+    if 'categoria' in request.GET:
+        qs = qs.filter(categoria_id=_entero(request.GET['categoria']))
+    if 'despues' in request.GET:
+        qs = qs.filter(id__gt=_entero(request.GET['despues']))
+    for termino in terminos(request.GET.get('q', '')):
+        ids = PRODUCTOS.ids(termino)
+        if ids is not None:
+            qs = qs.filter(pk__in=ids)
+        else:
+            qs = qs.filter(Q(nombre__icontains=termino) | Q(marca__icontains=termino) | Q(tipo__icontains=termino))
+    campos = ('id', 'codigo', 'nombre', 'marca', 'precio', 'tipo', 'categoria_id', 'stock_actual')
+    productos = [producto async for producto in qs.values(*campos)[:LIMITE_CATALOGO + 1]]
+    siguiente = productos[LIMITE_CATALOGO - 1]['id'] if len(productos) > LIMITE_CATALOGO else None
+    productos = productos[:LIMITE_CATALOGO]
+    for producto in productos:
+        # Las categorías vienen del cache de tablas maestras, sin JOIN
+        categoria = await CATEGORIAS.aobtener(producto['categoria_id'])
+        producto['categoria'] = categoria.nombre if categoria is not None else None
+    return JsonResponse({'productos': productos, 'siguiente': siguiente})
+
+
+@require_GET
+async def estado_venta(request, pk):
+    """Estado y monto de una venta; un cliente solo consulta las suyas."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error('Autenticación requerida.', 401)
+    if not await _apuede(user, 'core.view_venta'):
+        return _error('No tienes permisos para ver ventas.', 403)
+    qs = Venta.objects.filter(pk=pk)
+    if (await aget_rol(request)).es_cliente:
+        qs = qs.filter(usuario_id=user.pk)
+    venta = await qs.values('id', 'estado', 'monto_total', 'canal_venta', 'fecha').afirst()
+    if venta is None:
+        return _error('Venta no encontrada.', 404)
+    return JsonResponse(venta)
+
+
+@require_POST
+def cobrar(request):
+    """
+    Registra una venta de la caja (ver core/caja.py). Cuerpo JSON:
+    {"lineas": [{"producto": id, "cantidad": n}, ...], "metodo_pago": id,
+    "canal_venta": "Local"}. La cabecera Idempotency-Key identifica el intento:
+    un reintento con la misma clave responde 200 con la venta ya registrada.
+    Como el resto del sitio, exige la sesión y el token CSRF (X-CSRFToken).
+    Una clave ya usada por otro usuario responde 409.
+    """
+    if not request.user.is_authenticated:
+        return _error('Autenticación requerida.', 401)
+    if get_rol(request).es_cliente or not _puede(request.user, 'core.add_venta'):
+        return _error('No tienes permisos para registrar ventas.', 403)
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        return _error('El cuerpo debe ser JSON.', 400)
+    if not isinstance(datos, dict) or not isinstance(datos.get('lineas'), list):
+        return _error('Falta la lista de líneas.', 400)
+    lineas = [
+        (linea.get('producto'), linea.get('cantidad')) if isinstance(linea, dict) else (None, None)
+        for linea in datos['lineas']
+    ]
+    try:
+        venta, creada = registrar_venta(
+            request.user, lineas, metodo_pago_id=datos.get('metodo_pago'),
+            canal_venta=datos.get('canal_venta', 'Local'), clave=request.headers.get('Idempotency-Key'),
+        )
+    except CarritoInvalido as e:
+        return JsonResponse({'error': 'Carrito inválido.', 'errores': e.errores}, status=400)
+    except ClaveAjena as e:
+        return _error(str(e), 409)
+    except StockInsuficiente as e:
+        fallidos = [{'producto': pid, 'cantidad': cantidad} for pid, cantidad in e.fallidos]
+        return JsonResponse({'error': str(e), 'fallidos': fallidos}, status=409)
+    datos_venta = {
+        'id': venta.pk, 'estado': venta.estado, 'monto_total': venta.monto_total,
+        'canal_venta': venta.canal_venta, 'fecha': venta.fecha,
+    }
+    return JsonResponse(datos_venta, status=201 if creada else 200)
+
+
+@require_POST
+def sincronizar(request):
+    """
+    Recibe las ventas que una terminal guardó sin conexión (ver
+    core/sincronizacion.py): un JSONL con una venta por línea,
+    {"id": "<id de la terminal>", "fecha": "<ISO 8601>", "lineas":
+    [{"producto": id, "cantidad": n, "precio": "1200.00"}, ...],
+    "metodo_pago": id}, comprimido con gzip si se envía Content-Encoding:
+    gzip. Responde el resultado de cada venta; reenviar el lote no las duplica.
+    """
+    if not request.user.is_authenticated:
+        return _error('Autenticación requerida.', 401)
+    if get_rol(request).es_cliente or not _puede(request.user, 'core.add_venta'):
+        return _error('No tienes permisos para registrar ventas.', 403)
+    try:
+        lineas = leer_jsonl(request, comprimido=request.headers.get('Content-Encoding') == 'gzip')
+    except LoteInvalido as e:
+        return _error(str(e), 400)
+    resultados = sincronizar_ventas(request.user, lineas)
+    totales = {estado: 0 for estado in (ACEPTADA, DUPLICADA, RECHAZADA)}
+    for resultado in resultados:
+        totales[resultado['estado']] += 1
+    return JsonResponse({'totales': totales, 'resultados': resultados})
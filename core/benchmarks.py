@@ -0,0 +1,750 @@
+import statistics
+import time
+
+from . import middleware
+from .models import DetalleVenta, MovimientoStock, Venta
+
+# Escenarios registrados para el comando `benchmark`: nombre -> función(salida, opciones)
+ESCENARIOS = {}
+
+
+def escenario(nombre):
+    def registrar(funcion):
+        ESCENARIOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def medir(funcion, repeticiones=5):
+    """Ejecuta funcion varias veces y retorna los tiempos en milisegundos (mediana, mínimo, máximo)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), min(tiempos), max(tiempos)
+
+
+def formatear(etiqueta, tiempos):
+    mediana, minimo, maximo = tiempos
+    return f'{etiqueta:<40} mediana {mediana:9.2f} ms  min {minimo:9.2f} ms  max {maximo:9.2f} ms'
+
+
+def asegurar_lineas(salida, num_lineas):
+    """Completa la base con ventas sintéticas hasta tener num_lineas DetalleVenta."""
+    from .datos_sinteticos import generar_ventas
+
+    faltan = num_lineas - DetalleVenta.objects.count()
+    if faltan > 0:
+        salida(f'Generando {faltan} líneas de venta sintéticas...')
+        inicio = time.perf_counter()
+        generar_ventas(num_lineas=faltan)
+        salida(f'  listo en {time.perf_counter() - inicio:.1f} s')
+
+
+@escenario('resumen')
+def benchmark_resumen(salida, opciones):
+    from .resumen import ingresos, ingresos_sin_resumen, refrescar_resumen
+
+    asegurar_lineas(salida, opciones['lineas'])
+    salida(f'DetalleVenta: {DetalleVenta.objects.count()} filas')
+    inicio = time.perf_counter()
+    filas = refrescar_resumen(completo=True)
+    salida(f'Reconstrucción completa de resúmenes: {filas} filas en {time.perf_counter() - inicio:.1f} s')
+    salida(formatear('Refresco incremental sin cambios', medir(refrescar_resumen, opciones['repeticiones'])))
+
+    for por in ('producto', 'categoria', 'canal', 'metodo_pago'):
+        for periodo in ('dia', 'semana'):
+            crudo = medir(lambda: list(ingresos_sin_resumen(por, periodo)), opciones['repeticiones'])
+            resumido = medir(lambda: list(ingresos(por, periodo)), opciones['repeticiones'])
+            salida(formatear(f'{por}/{periodo} agregando DetalleVenta', crudo))
+            salida(formatear(f'{por}/{periodo} desde resúmenes', resumido))
+            salida(f'{"":<40} aceleración x{crudo[0] / resumido[0]:.1f}')
+
+
+@escenario('paginacion')
+def benchmark_paginacion(salida, opciones):
+    from .paginacion import LIMITE_CONTEO, filtro_seek
+
+    asegurar_lineas(salida, opciones['lineas'])
+    por_pagina = 100
+    for modelo, campos in ((Venta, ('fecha', 'id')), (DetalleVenta, ('id',))):
+        qs = modelo.objects.order_by(*['-' + campo for campo in campos])
+        total = qs.count()
+        salida(f'{modelo.__name__}: {total} filas')
+        salida(formatear('  COUNT(*) exacto', medir(qs.count, opciones['repeticiones'])))
+        salida(formatear(
+            f'  conteo acotado a {LIMITE_CONTEO}',
+            medir(lambda: qs.order_by()[:LIMITE_CONTEO + 1].count(), opciones['repeticiones']),
+        ))
+        for pagina in (1, 10, 100, 1000, 5000):
+            inicio = (pagina - 1) * por_pagina
+            if inicio >= total:
+                break
+            offset = medir(lambda: list(qs[inicio:inicio + por_pagina]), opciones['repeticiones'])
+            if pagina == 1:
+                seek = qs
+            else:
+                # El cursor es la última fila de la página anterior, como en los enlaces del admin
+                seek = qs.filter(filtro_seek(campos, qs.values_list(*campos)[inicio - 1]))
+            keyset = medir(lambda: list(seek[:por_pagina]), opciones['repeticiones'])
+            salida(formatear(f'  página {pagina} con OFFSET', offset))
+            salida(formatear(f'  página {pagina} con keyset', keyset))
+
+
+@escenario('busqueda')
+def benchmark_busqueda(salida, opciones):
+    from django.contrib.admin.sites import site
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+
+    from .busqueda import BusquedaTextoMixin
+    from .datos_sinteticos import generar_maestros
+    from .models import Producto, Usuario
+
+    asegurar_lineas(salida, opciones['lineas'])
+    # Catálogo y clientes a escala: solo se crean los maestros que falten
+    generar_maestros(50_000, 100_000)
+    salida(f'Producto: {Producto.objects.count()} filas, Usuario: {Usuario.objects.count()} filas')
+
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    casos = (
+        (Producto, ('012345', 'tico 04', 'Propia', 'inexistente')),
+        (Venta, ('Cliente42', 'Pagado', 'inexistente')),
+    )
+    for modelo, terminos in casos:
+        modelo_admin = site._registry[modelo]
+        qs = modelo_admin.get_queryset(request).order_by(*modelo_admin.ordering)
+        for termino in terminos:
+            def like():
+                resultado, _ = super(BusquedaTextoMixin, modelo_admin).get_search_results(request, qs, termino)
+                return resultado.count(), list(resultado[:100])
+
+            def fts():
+                resultado, _ = modelo_admin.get_search_results(request, qs, termino)
+                return resultado.count(), list(resultado[:100])
+
+            salida(f'{modelo.__name__} "{termino}": {like()[0]} resultados')
+            con_like = medir(like, opciones['repeticiones'])
+            con_fts = medir(fts, opciones['repeticiones'])
+            salida(formatear('  LIKE (search_fields)', con_like))
+            salida(formatear('  índice de texto', con_fts))
+            salida(f'{"":<40} aceleración x{con_like[0] / con_fts[0]:.1f}')
+
+
+@escenario('admin')
+def benchmark_admin(salida, opciones):
+    from django.core.management.base import CommandError
+    from django.test.utils import setup_test_environment
+
+    from .models import Usuario
+    from .rendimiento_admin import cargar_presupuestos, ejecutar_suite, excesos, guardar_presupuestos
+
+    asegurar_lineas(salida, opciones['lineas'])
+    usuarios = {rol: Usuario.objects.filter(username=nombre).first() for rol, nombre in (('Admin', 'admin'), ('Cliente', 'cliente'))}
+    if None in usuarios.values():
+        raise CommandError('Faltan los usuarios admin y cliente; ejecute seed_db primero.')
+    # El cliente de pruebas necesita el contexto de las plantillas y el host testserver
+    setup_test_environment()
+    resultados = ejecutar_suite(usuarios, opciones['repeticiones'])
+    for clave, medicion in resultados.items():
+        salida(
+            f'{clave:<40} {medicion["estado"]}  {medicion["consultas"]:4d} consultas  '
+            f'{medicion["ms"]:9.2f} ms  {medicion["kb"]:7d} KB'
+        )
+    if opciones['guardar']:
+        guardar_presupuestos('benchmark', resultados)
+        salida('Línea base guardada.')
+        return
+    presupuestos = cargar_presupuestos('benchmark')
+    if not presupuestos:
+        salida('Sin línea base para comparar; use --guardar para registrarla.')
+        return
+    problemas = excesos(resultados, presupuestos)
+    if problemas:
+        raise CommandError('Páginas sobre su presupuesto:\n' + '\n'.join(problemas))
+    salida('Todas las páginas dentro de su presupuesto.')
+
+
+def csv_productos(num_filas, prefijo, semilla=1):
+    """CSV en memoria con num_filas productos (uno de cada cinco con ficha nutricional)."""
+    import csv
+    import io
+    import random
+
+    from .importacion import COLUMNAS_NUTRICIONAL, COLUMNAS_OBLIGATORIAS, COLUMNAS_OPCIONALES
+
+    rng = random.Random(semilla)
+    archivo = io.StringIO()
+    escritor = csv.writer(archivo)
+    escritor.writerow([*COLUMNAS_OBLIGATORIAS, *COLUMNAS_OPCIONALES, *COLUMNAS_NUTRICIONAL])
+    for i in range(num_filas):
+        nutricional = ['Harina, agua, sal', rng.randrange(10, 120), 5, 1, 'si'] if i % 5 == 0 else [''] * 5
+        escritor.writerow([
+            f'{prefijo}{i:07d}', f'Importado {i:07d}', 'Reventa', rng.randrange(500, 20000, 100),
+            f'Importada {i % 20:02d}', 'Proveedor', rng.randrange(0, 200), 50, *nutricional,
+        ])
+    archivo.seek(0)
+    return archivo
+
+
+@escenario('importacion')
+def benchmark_importacion(salida, opciones):
+    from .importacion import importar_productos
+    from .models import Categoria, Nutricional, Producto
+
+    prefijo = 'BENCH-'
+    archivo = csv_productos(opciones['filas'], prefijo)
+    # La primera pasada inserta; la segunda actualiza los mismos códigos
+    try:
+        for etapa in ('inserción', 'actualización'):
+            archivo.seek(0)
+            inicio = time.perf_counter()
+            resultado = importar_productos(archivo)
+            segundos = time.perf_counter() - inicio
+            salida(
+                f'{etapa:<15} {resultado.importadas} filas en {segundos:.2f} s '
+                f'({resultado.importadas / segundos:,.0f} filas/s, {len(resultado.errores)} errores)'
+            )
+    finally:
+        productos = Producto.all_objects.filter(codigo__startswith=prefijo)
+        nutricionales = list(productos.exclude(nutricional=None).values_list('nutricional_id', flat=True))
+        productos.hard_delete()
+        Nutricional.all_objects.filter(pk__in=nutricionales).hard_delete()
+        Categoria.objects.filter(nombre__startswith='Importada ').delete()
+
+
+@escenario('instrumentacion')
+def benchmark_instrumentacion(salida, opciones):
+    from django.core.management.base import CommandError
+    from django.test import Client, override_settings
+    from django.test.utils import setup_test_environment
+
+    from . import instrumentacion
+    from .models import Usuario
+
+    admin = Usuario.objects.filter(username='admin').first()
+    if admin is None:
+        raise CommandError('Falta el usuario admin; ejecute seed_db primero.')
+    setup_test_environment()
+    client = Client()
+    client.force_login(admin)
+    # Costo agregado por la instrumentación a cada petición medida; las dos
+    # variantes se alternan para que el ruido de la máquina afecte a ambas
+    for url in ('/admin/', '/admin/core/producto/', '/admin/core/venta/'):
+        client.get(url)
+        tiempos = {0.0: [], 1.0: []}
+        for _ in range(opciones['repeticiones']):
+            for muestreo, lista in tiempos.items():
+                with override_settings(INSTRUMENTACION_MUESTREO=muestreo):
+                    lista.extend(medir(lambda: client.get(url), 1)[:1])
+        for muestreo, lista in tiempos.items():
+            salida(formatear(f'{url} muestreo {muestreo:.0%}', (statistics.median(lista), min(lista), max(lista))))
+    instrumentacion.limpiar()
+
+
+def _acceso_por_subcadenas(request):
+    """Reglas anteriores de RoleBasedAccessMiddleware, solo como referencia del benchmark."""
+    from .roles import get_rol
+
+    if request.path.startswith('/admin/') and request.user.is_authenticated and get_rol(request).es_cliente:
+        if request.path.endswith('/change/') and 'usuario' in request.path and str(request.user.id) not in request.path:
+            return False
+        for model in ['venta', 'detalleventa', 'producto', 'categoria', 'nutricional']:
+            if f'/{model}/' in request.path and not request.user.is_staff:
+                return False
+    return True
+
+
+@escenario('politica')
+def benchmark_politica(salida, opciones):
+    from django.core.management.base import CommandError
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    from . import politica
+    from .models import Usuario
+
+    cliente = Usuario.objects.filter(username='cliente').first()
+    if cliente is None:
+        raise CommandError('Falta el usuario cliente; ejecute seed_db primero.')
+    llamadas = 10_000
+    politica.compilar()
+    for path in ('/admin/', '/admin/core/venta/', '/admin/core/producto/', f'/admin/core/usuario/{cliente.pk}/change/'):
+        request = RequestFactory().get(path)
+        request.user = cliente
+        request.resolver_match = match = resolve(path)
+        # Costo por petición de decidir el acceso, con el rol ya resuelto
+        for etiqueta, decidir in (
+            ('subcadenas', lambda: _acceso_por_subcadenas(request)),
+            ('política compilada', lambda: politica.acceso_vista(request, match.kwargs)),
+        ):
+            decidir()
+            mediana, minimo, _ = medir(lambda: [decidir() for _ in range(llamadas)], opciones['repeticiones'])
+            salida(f'{path:<32} {etiqueta:<20} mediana {mediana * 1000 / llamadas:6.2f} µs  min {minimo * 1000 / llamadas:6.2f} µs')
+
+
+@escenario('carga')
+def benchmark_carga(salida, opciones):
+    import threading
+
+    from django.conf import settings
+    from django.core.management.base import CommandError
+    from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+    from django.db.models import F
+    from django.test import Client, override_settings
+
+    from .carga import generar_carga, servidor
+    from .models import Producto, Usuario
+
+    if connection.vendor != 'sqlite':
+        raise CommandError('El escenario carga compara modos de SQLite; la base configurada es otra.')
+    admin = Usuario.objects.filter(username='admin').first()
+    producto = Producto.objects.first()
+    if admin is None or producto is None:
+        raise CommandError('Faltan el usuario admin y productos; ejecute seed_db primero.')
+    client = Client()
+    client.force_login(admin)
+    cabeceras = {'Cookie': f'sessionid={client.cookies["sessionid"].value}', 'Host': 'localhost'}
+    # Páginas livianas: el costo de abrir la conexión y los bloqueos pesan más que el render
+    rutas = ('/admin/', '/admin/core/categoria/', '/admin/core/metodopago/', '/admin/core/rol/')
+    peticiones = [('GET', ruta, None, cabeceras) for ruta in rutas]
+
+    sin_wal = {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout']}
+    variantes = (
+        ('sin WAL, sin pool', sin_wal, 0),
+        ('sin WAL, con pool', sin_wal, 60),
+        ('WAL, sin pool', settings.SQLITE_PRAGMAS, 0),
+        ('WAL, con pool', settings.SQLITE_PRAGMAS, 60),
+    )
+    config_db = connections.settings[DEFAULT_DB_ALIAS]
+    conn_max_age = config_db['CONN_MAX_AGE']
+    salida(f'{opciones["hilos"]} hilos de servidor, {opciones["hilos"]} clientes, {opciones["segundos"]} s por variante, un escritor concurrente')
+    try:
+        for etiqueta, pragmas, max_age in variantes:
+            config_db['CONN_MAX_AGE'] = max_age
+            with override_settings(SQLITE_PRAGMAS=pragmas, INSTRUMENTACION_MUESTREO=0, ALLOWED_HOSTS=['localhost']):
+                # journal_mode es de la base: se cambia sin otras conexiones abiertas
+                connection.close()
+                connection.ensure_connection()
+                detener = threading.Event()
+                escrituras = {'commits': 0, 'bloqueos': 0}
+
+                def escritor():
+                    # Escrituras cortas como las de una caja: compiten con las lecturas del admin
+                    while not detener.is_set():
+                        try:
+                            with transaction.atomic():
+                                Producto.all_objects.filter(pk=producto.pk).update(stock_actual=F('stock_actual'))
+                            escrituras['commits'] += 1
+                        except OperationalError:
+                            escrituras['bloqueos'] += 1
+                        time.sleep(0.005)
+                    connections.close_all()
+
+                with servidor(opciones['hilos']) as direccion:
+                    hilo = threading.Thread(target=escritor)
+                    hilo.start()
+                    try:
+                        resultado = generar_carga(direccion, peticiones, opciones['hilos'], opciones['segundos'])
+                    finally:
+                        detener.set()
+                        hilo.join()
+            salida(
+                f'{etiqueta:<18} {resultado["por_segundo"]:7.1f} pet/s  p50 {resultado["p50_ms"]:7.1f} ms  '
+                f'p95 {resultado["p95_ms"]:7.1f} ms  {len(resultado["errores"])} errores  '
+                f'escritor {escrituras["commits"]} commits, {escrituras["bloqueos"]} bloqueos'
+            )
+            for error in resultado['errores'][:3]:
+                salida(f'    {error}')
+    finally:
+        config_db['CONN_MAX_AGE'] = conn_max_age
+        connection.close()
+
+
+@escenario('concurrencia')
+def benchmark_concurrencia(salida, opciones):
+    import threading
+
+    from django.core.management.base import CommandError
+    from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+    from django.test import override_settings
+
+    from . import concurrencia
+    from .models import Producto
+    from .stock import ajustar_stock
+
+    if connection.vendor != 'sqlite':
+        raise CommandError('El escenario concurrencia compara modos de SQLite; la base configurada es otra.')
+    producto = Producto.objects.first()
+    if producto is None:
+        raise CommandError('Faltan productos; ejecute seed_db primero.')
+
+    def venta_y_devolucion():
+        # Lee y luego escribe en la misma transacción; el stock queda igual
+        with transaction.atomic():
+            Producto.objects.get(pk=producto.pk)
+            ajustar_stock({producto.pk: 1})
+            ajustar_stock({producto.pk: -1})
+
+    variantes = (
+        ('DEFERRED sin reintentos', 'DEFERRED', 1, False),
+        ('DEFERRED con reintentos', 'DEFERRED', 5, False),
+        ('IMMEDIATE', 'IMMEDIATE', 5, False),
+        ('IMMEDIATE con cola', 'IMMEDIATE', 5, True),
+    )
+    opciones_db = connections.settings[DEFAULT_DB_ALIAS].setdefault('OPTIONS', {})
+    transaction_mode = opciones_db.get('transaction_mode')
+    salida(f'{opciones["hilos"]} hilos escribiendo durante {opciones["segundos"]} s por variante')
+    try:
+        for etiqueta, modo, reintentos, cola in variantes:
+            opciones_db['transaction_mode'] = modo
+            fin = time.perf_counter() + opciones['segundos']
+            conteo = {'ok': 0, 'bloqueos': 0}
+
+            def trabajar():
+                while time.perf_counter() < fin:
+                    try:
+                        concurrencia.escribir(venta_y_devolucion)
+                        conteo['ok'] += 1
+                    except OperationalError:
+                        conteo['bloqueos'] += 1
+                connections.close_all()
+
+            with override_settings(SQLITE_REINTENTOS=reintentos, SQLITE_COLA_ESCRITURA=cola):
+                hilos = [threading.Thread(target=trabajar) for _ in range(opciones['hilos'])]
+                inicio = time.perf_counter()
+                for hilo in hilos:
+                    hilo.start()
+                for hilo in hilos:
+                    hilo.join()
+                duracion = time.perf_counter() - inicio
+                concurrencia.COLA.detener()
+            salida(
+                f'{etiqueta:<24} {conteo["ok"] / duracion:8.1f} escrituras/s  '
+                f'{conteo["bloqueos"]} fallidas por "database is locked"'
+            )
+    finally:
+        opciones_db['transaction_mode'] = transaction_mode
+
+
+class InstrumentacionSoloSync(middleware.InstrumentacionMiddleware):
+    """Los middleware como eran antes de soportar async, para el escenario asgi."""
+    async_capable = False
+
+
+class AccesoSoloSync(middleware.RoleBasedAccessMiddleware):
+    async_capable = False
+
+
+@escenario('asgi')
+def benchmark_asgi(salida, opciones):
+    import importlib.util
+
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.management.base import CommandError
+    from django.test import Client, override_settings
+
+    from .carga import generar_carga_async, servidor, servidor_asgi
+    from .models import Usuario
+
+    if importlib.util.find_spec('uvicorn') is None:
+        raise CommandError('El escenario asgi necesita uvicorn: pip install -r requirements.txt')
+    admin = Usuario.objects.filter(username='admin').first()
+    venta = Venta.objects.order_by('-id').first()
+    if admin is None or venta is None:
+        raise CommandError('Faltan el usuario admin y ventas; ejecute seed_db primero.')
+    client = Client(HTTP_HOST='localhost')
+    client.force_login(admin)
+    cabeceras = {'Host': 'localhost', 'Cookie': f'sessionid={client.cookies["sessionid"].value}'}
+    rutas = ('/api/catalogo/', f'/api/ventas/{venta.pk}/estado/', '/admin/core/categoria/')
+    # WSGI con un pool de hilos (las vistas async corren con async_to_sync) contra
+    # uvicorn/ASGI, con los middleware propios solo síncronos como antes (cada
+    # petición pasa a un hilo antes de llegar a la vista) y con soporte async
+    solo_sync = [
+        {'core.middleware.InstrumentacionMiddleware': 'core.benchmarks.InstrumentacionSoloSync',
+         'core.middleware.RoleBasedAccessMiddleware': 'core.benchmarks.AccesoSoloSync'}.get(ruta, ruta)
+        for ruta in settings.MIDDLEWARE
+    ]
+    variantes = (
+        (f'WSGI {opciones["hilos"]} hilos', lambda: servidor(opciones['hilos'])),
+        ('ASGI mw sync', lambda: servidor_asgi(ASGIHandler())),
+        ('ASGI mw async', lambda: servidor_asgi(ASGIHandler())),
+    )
+    for ruta in rutas:
+        peticiones = [('GET', ruta, None, cabeceras)]
+        for clientes in (opciones['hilos'], opciones['hilos'] * 16):
+            for etiqueta, levantar in variantes:
+                lista = solo_sync if etiqueta == 'ASGI mw sync' else settings.MIDDLEWARE
+                with override_settings(MIDDLEWARE=lista), levantar() as direccion:
+                    generar_carga_async(direccion, peticiones, 1, 0.5)
+                    resultado = generar_carga_async(direccion, peticiones, clientes, opciones['segundos'])
+                salida(
+                    f'{ruta:<28} {clientes:4d} conexiones  {etiqueta:<14} {resultado["por_segundo"]:7.1f} pet/s  '
+                    f'p50 {resultado["p50_ms"]:8.1f} ms  p95 {resultado["p95_ms"]:8.1f} ms  {len(resultado["errores"])} errores'
+                )
+
+
+@escenario('caja')
+def benchmark_caja(salida, opciones):
+    import json
+    import uuid
+
+    from django.core.management.base import CommandError
+    from django.db import DEFAULT_DB_ALIAS
+    from django.test import Client, override_settings
+
+    from . import concurrencia
+    from .alertas import revisar_alertas
+    from .caja import registrar_venta
+    from .carga import generar_carga, servidor
+    from .instrumentacion import percentil
+    from .models import Producto, Usuario
+
+    admin = Usuario.objects.filter(username='admin').first()
+    productos = list(Producto.objects.order_by('id').values_list('id', 'stock_actual')[:10])
+    if admin is None or len(productos) < 10:
+        raise CommandError('Faltan el usuario admin y 10 productos; ejecute seed_db primero.')
+    stock_original = dict(productos)
+    # Cada venta descuenta una unidad por línea: se sube el stock y se restaura al final
+    Producto.all_objects.filter(pk__in=stock_original).update(stock_actual=1_000_000)
+    lineas = [(pid, 1) for pid in stock_original]
+    cuerpo = json.dumps({'lineas': [{'producto': pid, 'cantidad': 1} for pid in stock_original], 'canal_venta': 'Benchmark'})
+
+    def resumen(etiqueta, tiempos):
+        return (
+            f'{etiqueta:<32} {len(tiempos):6d} ventas  p50 {percentil(tiempos, 50):7.2f} ms  '
+            f'p95 {percentil(tiempos, 95):7.2f} ms  p99 {percentil(tiempos, 99):7.2f} ms'
+        )
+
+    salida(f'Carrito de 10 líneas, una clave de idempotencia nueva por venta; por HTTP {opciones["hilos"]} clientes')
+    try:
+        tiempos = []
+        for _ in range(500):
+            inicio = time.perf_counter()
+            registrar_venta(admin, lineas, canal_venta='Benchmark', clave=uuid.uuid4().hex)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        salida(resumen('registrar_venta()', tiempos))
+
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(admin)
+        with override_settings(ALLOWED_HOSTS=['localhost'], INSTRUMENTACION_MUESTREO=0):
+            tiempos = []
+            for _ in range(500):
+                inicio = time.perf_counter()
+                respuesta = client.post('/api/ventas/', cuerpo, content_type='application/json',
+                                        HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                if respuesta.status_code != 201:
+                    raise CommandError(f'POST /api/ventas/ respondió {respuesta.status_code}: {respuesta.content[:200]}')
+            salida(resumen('POST /api/ventas/ (en proceso)', tiempos))
+
+            # Por HTTP con clientes concurrentes; el token CSRF va en la cookie y en la cabecera
+            client.get('/admin/')
+            token = client.cookies['csrftoken'].value
+            cabeceras = {
+                'Host': 'localhost', 'Content-Type': 'application/json', 'X-CSRFToken': token,
+                'Cookie': f'sessionid={client.cookies["sessionid"].value}; csrftoken={token}',
+            }
+            for etiqueta, cola in (('HTTP', False), ('HTTP, cola', True)):
+                peticiones = [
+                    ('POST', '/api/ventas/', cuerpo.encode(), {**cabeceras, 'Idempotency-Key': uuid.uuid4().hex})
+                    for _ in range(20_000)
+                ]
+                with override_settings(SQLITE_COLA_ESCRITURA=cola), servidor(opciones['hilos']) as direccion:
+                    resultado = generar_carga(direccion, peticiones, opciones['hilos'], opciones['segundos'])
+                    concurrencia.COLA.detener()
+                salida(
+                    f'{"POST /api/ventas/ (" + etiqueta + ")":<32} {resultado["peticiones"]:6d} ventas  '
+                    f'p50 {resultado["p50_ms"]:7.2f} ms  p95 {resultado["p95_ms"]:7.2f} ms  p99 {resultado["p99_ms"]:7.2f} ms  '
+                    f'{resultado["por_segundo"]:.1f} ventas/s  estados {resultado["estados"]}'
+                )
+    finally:
+        # Sin sus movimientos, el registro vuelve a coincidir con el stock restaurado
+        MovimientoStock.objects.filter(venta__canal_venta='Benchmark')._raw_delete(DEFAULT_DB_ALIAS)
+        Venta.all_objects.filter(canal_venta='Benchmark').hard_delete()
+        for pid, stock in stock_original.items():
+            Producto.all_objects.filter(pk=pid).update(stock_actual=stock)
+        revisar_alertas(list(stock_original))
+
+
+def backlog_ventas(num_ventas, productos, prefijo, semilla=1):
+    """Líneas JSONL (bytes) de num_ventas ventas de terminal sobre productos [(id, precio)], como las encola la caja."""
+    import json
+    import random
+
+    rng = random.Random(semilla)
+    lineas = []
+    for i in range(num_ventas):
+        venta = {
+            'id': f'{prefijo}{i:08d}', 'canal_venta': 'Benchmark',
+            'lineas': [
+                {'producto': pid, 'cantidad': rng.randint(1, 3), 'precio': str(precio)}
+                for pid, precio in rng.sample(productos, rng.randint(1, 5))
+            ],
+        }
+        lineas.append(json.dumps(venta).encode())
+    return lineas
+
+
+@escenario('sincronizacion')
+def benchmark_sincronizacion(salida, opciones):
+    import gzip
+    import io
+    import json
+
+    from django.core.management.base import CommandError
+    from django.db import DEFAULT_DB_ALIAS
+    from django.test import Client, override_settings
+
+    from .alertas import revisar_alertas
+    from .caja import registrar_venta
+    from .clientes import recalcular_clientes
+    from .models import Producto, Usuario
+    from .sincronizacion import leer_jsonl, sincronizar_ventas
+
+    admin = Usuario.objects.filter(username='admin').first()
+    productos = list(Producto.objects.order_by('id').values_list('id', 'precio')[:200])
+    if admin is None or len(productos) < 10:
+        raise CommandError('Faltan el usuario admin y al menos 10 productos; ejecute seed_db primero.')
+    stock_original = dict(Producto.objects.filter(pk__in=[pid for pid, _ in productos]).values_list('id', 'stock_actual'))
+    Producto.all_objects.filter(pk__in=stock_original).update(stock_actual=1_000_000)
+    num_ventas, por_lote = opciones['ventas'], 500
+    backlog = backlog_ventas(num_ventas, productos, 'sinc-')
+    lotes = [backlog[i:i + por_lote] for i in range(0, num_ventas, por_lote)]
+    comprimidos = [gzip.compress(b'\n'.join(lote)) for lote in lotes]
+    salida(
+        f'{num_ventas} ventas en {len(lotes)} lotes de {por_lote} '
+        f'({sum(map(len, comprimidos)) / len(comprimidos) / 1024:.1f} KiB por lote comprimido)'
+    )
+
+    def resumen(etiqueta, ventas, segundos):
+        salida(f'{etiqueta:<46} {ventas:7d} ventas en {segundos:7.2f} s  {ventas / segundos:9,.0f} ventas/s')
+
+    try:
+        # Referencia: cada venta por separado, como la subiría la terminal a /api/ventas/
+        muestra = min(2000, num_ventas)
+        inicio = time.perf_counter()
+        for numero, texto in enumerate(backlog_ventas(muestra, productos, 'sinc-una-'), start=1):
+            venta = json.loads(texto)
+            registrar_venta(
+                admin, [(l['producto'], l['cantidad']) for l in venta['lineas']],
+                canal_venta='Benchmark', clave=venta['id'],
+            )
+        resumen('una venta por llamada', muestra, time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        for lote in lotes:
+            sincronizar_ventas(admin, list(enumerate(lote, start=1)))
+        resumen(f'sincronizar_ventas(), lotes de {por_lote}', num_ventas, time.perf_counter() - inicio)
+
+        # El mismo backlog otra vez: todas duplicadas
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(admin)
+        with override_settings(ALLOWED_HOSTS=['localhost'], INSTRUMENTACION_MUESTREO=0):
+            inicio = time.perf_counter()
+            duplicadas = 0
+            for cuerpo in comprimidos:
+                respuesta = client.post('/api/ventas/lote/', cuerpo, content_type='application/x-ndjson',
+                                        HTTP_CONTENT_ENCODING='gzip')
+                if respuesta.status_code != 200:
+                    raise CommandError(f'POST /api/ventas/lote/ respondió {respuesta.status_code}: {respuesta.content[:200]}')
+                duplicadas += respuesta.json()['totales']['duplicada']
+            resumen(f'POST /api/ventas/lote/ reenvío ({duplicadas} dup.)', num_ventas, time.perf_counter() - inicio)
+
+            # Un backlog nuevo por HTTP, con descompresión y validación incluidas
+            nuevos = [gzip.compress(b'\n'.join(lote)) for lote in (
+                backlog_ventas(num_ventas, productos, 'sinc-http-', semilla=2)[i:i + por_lote]
+                for i in range(0, num_ventas, por_lote)
+            )]
+            inicio = time.perf_counter()
+            for cuerpo in nuevos:
+                client.post('/api/ventas/lote/', cuerpo, content_type='application/x-ndjson', HTTP_CONTENT_ENCODING='gzip')
+            resumen(f'POST /api/ventas/lote/, lotes de {por_lote}', num_ventas, time.perf_counter() - inicio)
+        salida(formatear(
+            f'leer_jsonl() de un lote de {por_lote}',
+            medir(lambda: leer_jsonl(io.BytesIO(comprimidos[0]), comprimido=True), opciones['repeticiones']),
+        ))
+    finally:
+        # Borrado directo: hard_delete() recorrería cada línea para ajustar monto_total
+        DetalleVenta.all_objects.filter(venta__canal_venta='Benchmark')._raw_delete(DEFAULT_DB_ALIAS)
+        MovimientoStock.objects.filter(venta__canal_venta='Benchmark')._raw_delete(DEFAULT_DB_ALIAS)
+        Venta.all_objects.filter(canal_venta='Benchmark')._raw_delete(DEFAULT_DB_ALIAS)
+        recalcular_clientes([admin.pk])
+        for pid, stock in stock_original.items():
+            Producto.all_objects.filter(pk=pid).update(stock_actual=stock)
+        revisar_alertas(list(stock_original))
+
+
+@escenario('alertas')
+def benchmark_alertas(salida, opciones):
+    from django.db.models import F
+
+    from .alertas import candidatos_reposicion, reconstruir_alertas, revisar_alertas, umbral_alerta
+    from .models import AlertaStock, Producto
+
+    salida(f'Producto: {Producto.all_objects.count()} filas, AlertaStock: {AlertaStock.objects.count()} filas')
+    ids = list(Producto.objects.order_by('-id').values_list('id', flat=True)[:10])
+    salida(formatear('revisar_alertas() de 10 productos', medir(lambda: revisar_alertas(ids), opciones['repeticiones'])))
+    salida(formatear(
+        'Recorrido del catálogo con umbral',
+        medir(lambda: list(
+            Producto.objects.alias(umbral=umbral_alerta()).filter(stock_actual__lt=F('umbral')).values_list('id', flat=True)
+        ), opciones['repeticiones']),
+    ))
+    salida(formatear('reconstruir_alertas()', medir(reconstruir_alertas, 1)))
+    salida(formatear('candidatos_reposicion(50)', medir(lambda: candidatos_reposicion(50), opciones['repeticiones'])))
+
+
+@escenario('clientes')
+def benchmark_clientes(salida, opciones):
+    from django.contrib.auth.models import Permission
+    from django.core.cache import cache
+    from django.core.management.base import CommandError
+    from django.db.models import Count, Max, Sum
+    from django.test import Client
+
+    from .clientes import historial
+    from .models import ResumenCliente
+
+    asegurar_lineas(salida, opciones['lineas'])
+    # El cliente con más compras: con la ley de Zipf de datos_sinteticos, varias decenas de miles
+    resumen = ResumenCliente.objects.select_related('usuario').order_by('-num_ventas').first()
+    if resumen is None:
+        raise CommandError('No hay ventas; ejecute seed_db primero.')
+    cliente = resumen.usuario
+    salida(f'Cliente {cliente.username}: {resumen.num_ventas} ventas, ${resumen.total_gastado}')
+
+    ventas = Venta.objects.filter(usuario=cliente).order_by()
+    salida(formatear('Resumen agregando sus ventas', medir(lambda: (
+        ventas.aggregate(total=Sum('monto_total'), num=Count('id'), ultima=Max('fecha')),
+        list(DetalleVenta.objects.filter(venta__usuario=cliente).values('producto_id')
+             .annotate(u=Sum('cantidad')).order_by('-u')[:5]),
+    ), opciones['repeticiones'])))
+    salida(formatear('Resumen materializado, sin cache', medir(
+        lambda: (cache.clear(), historial(cliente.pk)), opciones['repeticiones'],
+    )))
+    salida(formatear('Resumen materializado, en cache', medir(lambda: historial(cliente.pk), opciones['repeticiones'])))
+
+    # El cliente entra al admin como lo haría con su cuenta: staff con permiso de ver sus ventas
+    permiso = Permission.objects.get(codename='view_venta')
+    era_staff = cliente.is_staff
+    cliente.is_staff = True
+    cliente.save(update_fields=['is_staff'])
+    cliente.user_permissions.add(permiso)
+    try:
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(cliente)
+        for etiqueta, url in (('Changelist de ventas (admin)', '/admin/core/venta/'), ('Mis compras', '/admin/mis-compras/')):
+            if client.get(url).status_code != 200:
+                raise CommandError(f'{url} no respondió 200.')
+            salida(formatear(etiqueta, medir(lambda: client.get(url), opciones['repeticiones'])))
+        salida(formatear('Mis compras, sin cache', medir(
+            lambda: (cache.clear(), client.get('/admin/mis-compras/')), opciones['repeticiones'],
+        )))
+    finally:
+        cliente.user_permissions.remove(permiso)
+        cliente.is_staff = era_staff
+        cliente.save(update_fields=['is_staff'])
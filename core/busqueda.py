@@ -0,0 +1,117 @@
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.text import smart_split, unescape_string_literal
+
+# Largo mínimo de un término para que lo resuelva el índice: el tokenizador
+# trigram de SQLite trabaja con 3 caracteres y el parser ngram de MySQL con 2
+LARGO_MINIMO = {'sqlite': 3, 'mysql': 2}
+
+
+class IndiceTexto:
+    """
+    Índice de texto completo sobre columnas de una tabla.
+
+    En SQLite es una tabla virtual FTS5 (tokenizador trigram, así busca
+    subcadenas igual que LIKE '%término%') con contenido externo, mantenida
+    por triggers; así también ven los cambios bulk_create y update(). En
+    MySQL es un índice FULLTEXT con parser ngram que InnoDB mantiene solo.
+
+    SQLite rehace la tabla en muchas operaciones de migración (p. ej. agregar
+    una columna única) y con ello pierde los triggers: esas migraciones deben
+    eliminar el índice antes y crearlo de nuevo después.
+    """
+
+    def __init__(self, tabla, columnas):
+        self.tabla = tabla
+        self.columnas = columnas
+        self.nombre = f'{tabla}_fts'
+
+    def sql_crear(self, vendor):
+        cols = ', '.join(self.columnas)
+        if vendor == 'mysql':
+            return [f'CREATE FULLTEXT INDEX {self.nombre} ON {self.tabla} ({cols}) WITH PARSER ngram']
+        if vendor != 'sqlite':
+            return []
+        nuevos = ', '.join(f'new.{c}' for c in self.columnas)
+        viejos = ', '.join(f'old.{c}' for c in self.columnas)
+        borrar = f"INSERT INTO {self.nombre}({self.nombre}, rowid, {cols}) VALUES ('delete', old.id, {viejos});"
+        insertar = f'INSERT INTO {self.nombre}(rowid, {cols}) VALUES (new.id, {nuevos});'
+        return [
+            f"CREATE VIRTUAL TABLE {self.nombre} USING fts5({cols}, content='{self.tabla}', "
+            f"content_rowid='id', tokenize='trigram')",
+            f'CREATE TRIGGER {self.nombre}_ai AFTER INSERT ON {self.tabla} BEGIN {insertar} END',
+            f'CREATE TRIGGER {self.nombre}_ad AFTER DELETE ON {self.tabla} BEGIN {borrar} END',
+            f'CREATE TRIGGER {self.nombre}_au AFTER UPDATE OF {cols} ON {self.tabla} BEGIN {borrar} {insertar} END',
+            f"INSERT INTO {self.nombre}({self.nombre}) VALUES ('rebuild')",
+        ]
+
+    def sql_eliminar(self, vendor):
+        if vendor == 'mysql':
+            return [f'DROP INDEX {self.nombre} ON {self.tabla}']
+        if vendor != 'sqlite':
+            return []
+        return [f'DROP TRIGGER IF EXISTS {self.nombre}_{sufijo}' for sufijo in ('ai', 'ad', 'au')] + [
+            f'DROP TABLE IF EXISTS {self.nombre}',
+        ]
+
+    def ids(self, termino):
+        """Subconsulta con los id de las filas que contienen termino, o None si el índice no lo resuelve."""
+        vendor = connection.vendor
+        if vendor not in LARGO_MINIMO or len(termino) < LARGO_MINIMO[vendor]:
+            return None
+        # El término va como frase literal: sin operadores de la sintaxis de búsqueda
+        frase = '"%s"' % termino.replace('"', '""' if vendor == 'sqlite' else ' ')
+        if vendor == 'sqlite':
+            return RawSQL(f'SELECT rowid FROM {self.nombre} WHERE {self.nombre} MATCH %s', (frase,))
+        cols = ', '.join(self.columnas)
+        return RawSQL(f'SELECT id FROM {self.tabla} WHERE MATCH({cols}) AGAINST (%s IN BOOLEAN MODE)', (frase,))
+
+
+PRODUCTOS = IndiceTexto('core_producto', ('nombre', 'marca', 'tipo'))
+USUARIOS = IndiceTexto('core_usuario', ('first_name', 'paterno'))
+INDICES = (PRODUCTOS, USUARIOS)
+
+
+def crear_indices(schema_editor, indices=INDICES):
+    for indice in indices:
+        for sql in indice.sql_crear(schema_editor.connection.vendor):
+            schema_editor.execute(sql, params=None)
+
+
+def eliminar_indices(schema_editor, indices=INDICES):
+    for indice in indices:
+        for sql in indice.sql_eliminar(schema_editor.connection.vendor):
+            schema_editor.execute(sql, params=None)
+
+
+def terminos(search_term):
+    """Separa la búsqueda en términos igual que el admin (las comillas agrupan)."""
+    resultado = []
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        if bit:
+            resultado.append(bit)
+    return resultado
+
+
+class BusquedaTextoMixin:
+    """
+    Resuelve la caja de búsqueda del admin con los índices de texto.
+
+    El admin define filtro_busqueda(termino), que retorna un Q o None cuando
+    el término no puede resolverse con el índice (muy corto, u otro motor);
+    en ese caso se usa la búsqueda estándar con LIKE sobre search_fields.
+    """
+
+    def filtro_busqueda(self, termino):
+        """Sin índice propio: se usa la búsqueda con LIKE."""
+        return None
+
+    def get_search_results(self, request, queryset, search_term):
+        filtros = [self.filtro_busqueda(termino) for termino in terminos(search_term)]
+        if not filtros or any(filtro is None for filtro in filtros):
+            return super().get_search_results(request, queryset, search_term)
+        for filtro in filtros:
+            queryset = queryset.filter(filtro)
+        return queryset, False
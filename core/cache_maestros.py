@@ -0,0 +1,178 @@
+import copy
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Categoria, MetodoPago, Nutricional, Rol
+
+# Filas por pk que se guardan de una tabla que no se cachea completa
+LIMITE_POR_PK = 10_000
+# Marca de un pk que no está en el cache (None es una fila inexistente ya consultada)
+_FALTA = object()
+
+
+class CacheMaestro:
+    """
+    Cache de lectura de una tabla maestra (filas vigentes), local al proceso.
+
+    completo=True carga la tabla entera en la primera lectura (tablas
+    chicas que se listan en filtros y selects); completo=False guarda solo
+    las filas pedidas por pk. Los datos llevan un número de versión: al
+    invalidar se descartan y, si settings.CACHE_MAESTROS nombra un alias de
+    CACHES, la versión vive ahí y se comparte entre procesos, igual que la
+    tabla completa ya cargada por cualquiera de ellos.
+    """
+
+    def __init__(self, modelo, completo=True):
+        self.modelo = modelo
+        self.completo = completo
+        self.clave = f'maestros:{modelo._meta.label_lower}'
+        self._lock = threading.Lock()
+        self._version = 0
+        self._filas = None
+        self._por_pk = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.compartidos = 0
+
+    def _compartido(self):
+        alias = getattr(settings, 'CACHE_MAESTROS', '')
+        return caches[alias] if alias else None
+
+    def _vigente(self):
+        """Versión vigente; descarta los datos locales si otro proceso invalidó."""
+        compartido = self._compartido()
+        if compartido is None:
+            return self._version
+        version = compartido.get_or_set(f'{self.clave}:version', 1)
+        if version != self._version:
+            with self._lock:
+                self._version, self._filas, self._por_pk = version, None, {}
+        return version
+
+    def todos(self):
+        """Filas vigentes ordenadas por pk. Solo lectura: son compartidas entre peticiones."""
+        return self._tabla()[0]
+
+    def _tabla(self):
+        """
+        (filas, {pk: fila}) de la tabla completa, leídos juntos: una
+        invalidación entre ambas lecturas no deja un índice vacío para filas cargadas.
+        """
+        version = self._vigente()
+        with self._lock:
+            filas, por_pk = self._filas, self._por_pk
+        if filas is not None:
+            self.aciertos += 1
+            return filas, por_pk
+        compartido = self._compartido()
+        filas = compartido.get(f'{self.clave}:{version}') if compartido is not None else None
+        if filas is not None:
+            self.compartidos += 1
+        else:
+            self.fallos += 1
+            filas = list(self.modelo.objects.order_by('pk'))
+            if compartido is not None:
+                compartido.set(f'{self.clave}:{version}', filas)
+        por_pk = {fila.pk: fila for fila in filas}
+        with self._lock:
+            if version == self._version:
+                self._filas, self._por_pk = filas, por_pk
+        return filas, por_pk
+
+    def obtener(self, pk):
+        """Copia de la fila vigente con ese pk, o None."""
+        try:
+            pk = self.modelo._meta.pk.to_python(pk)
+        except ValidationError:
+            return None
+        if self.completo:
+            fila = self._tabla()[1].get(pk)
+            return copy.copy(fila) if fila is not None else None
+        version = self._vigente()
+        # Una sola lectura del dict: entre `in` y el acceso otro hilo podría vaciarlo
+        fila = self._por_pk.get(pk, _FALTA)
+        if fila is not _FALTA:
+            self.aciertos += 1
+        else:
+            self.fallos += 1
+            fila = self.modelo.objects.filter(pk=pk).first()
+            with self._lock:
+                if version == self._version and len(self._por_pk) < LIMITE_POR_PK:
+                    self._por_pk[pk] = fila
+        return copy.copy(fila) if fila is not None else None
+
+    async def aobtener(self, pk):
+        """obtener() para código async: sin pasar por un hilo si la tabla ya está en memoria del proceso."""
+        if self.completo and self._filas is not None and self._compartido() is None:
+            return self.obtener(pk)
+        return await sync_to_async(self.obtener)(pk)
+
+    def _descartar(self):
+        compartido = self._compartido()
+        with self._lock:
+            self._version += 1
+            self._filas, self._por_pk = None, {}
+        if compartido is not None:
+            try:
+                compartido.incr(f'{self.clave}:version')
+            except ValueError:
+                compartido.set(f'{self.clave}:version', 1)
+
+    def invalidar(self):
+        self._descartar()
+        # Una lectura entre el cambio y el commit podría volver a cargar los datos previos
+        transaction.on_commit(self._descartar)
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos + self.compartidos
+        return {
+            'modelo': self.modelo._meta.verbose_name_plural,
+            'version': self._version,
+            'filas': len(self._filas) if self._filas is not None else len(self._por_pk),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'compartidos': self.compartidos,
+            'tasa_aciertos': round(100 * self.aciertos / total, 1) if total else None,
+        }
+
+    def reiniciar_contadores(self):
+        self.aciertos = self.fallos = self.compartidos = 0
+
+
+ROLES = CacheMaestro(Rol)
+CATEGORIAS = CacheMaestro(Categoria)
+METODOS_PAGO = CacheMaestro(MetodoPago)
+# Nutricional crece con el catálogo: solo las fichas consultadas
+NUTRICIONALES = CacheMaestro(Nutricional, completo=False)
+
+CACHES_MAESTROS = {cache.modelo: cache for cache in (ROLES, CATEGORIAS, METODOS_PAGO, NUTRICIONALES)}
+
+
+def cache_de(modelo):
+    return CACHES_MAESTROS.get(modelo)
+
+
+def invalidar(modelo):
+    cache = CACHES_MAESTROS.get(modelo)
+    if cache is not None:
+        cache.invalidar()
+
+
+def estadisticas():
+    return [cache.estadisticas() for cache in CACHES_MAESTROS.values()]
+
+
+def ordenar(filas, ordering):
+    """Filas del cache ordenadas como order_by(*ordering) (solo nombres de campo, con '-' opcional)."""
+    filas = list(filas)
+    # Orden estable: del último criterio al primero
+    for campo in reversed([c for c in ordering if isinstance(c, str) and c != '?']):
+        descendente = campo.startswith('-')
+        campo = campo.lstrip('-')
+        filas.sort(key=lambda fila: (getattr(fila, campo) is None, getattr(fila, campo)), reverse=descendente)
+    return filas
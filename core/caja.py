@@ -0,0 +1,106 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+
+from .cache_maestros import METODOS_PAGO
+from .concurrencia import escribir
+from .models import DetalleVenta, Producto, Venta
+from .stock import ajustar_stock
+
+# Largo máximo de la clave de idempotencia (Venta.clave_idempotencia)
+LARGO_CLAVE = 64
+MAX_LINEAS = 500
+
+
+class CarritoInvalido(Exception):
+    def __init__(self, errores):
+        self.errores = errores
+        super().__init__('; '.join(errores))
+
+
+class ClaveAjena(Exception):
+    """La clave de idempotencia ya identifica una venta de otro usuario."""
+
+
+def validar_carrito(lineas, metodo_pago_id, canal_venta, clave):
+    """Cantidades por producto del carrito; CarritoInvalido con todos los errores si no es válido."""
+    errores = []
+    if not lineas:
+        errores.append('El carrito no tiene líneas.')
+    elif len(lineas) > MAX_LINEAS:
+        errores.append(f'El carrito tiene más de {MAX_LINEAS} líneas.')
+    cantidades = Counter()
+    for i, (producto_id, cantidad) in enumerate(lineas or (), start=1):
+        if not isinstance(producto_id, int) or isinstance(producto_id, bool):
+            errores.append(f'Línea {i}: producto inválido.')
+        elif not isinstance(cantidad, int) or isinstance(cantidad, bool) or cantidad <= 0:
+            errores.append(f'Línea {i}: la cantidad debe ser un entero mayor a 0.')
+        else:
+            cantidades[producto_id] += cantidad
+    if not isinstance(canal_venta, str) or not 0 < len(canal_venta) <= 50:
+        errores.append('Canal de venta inválido.')
+    if metodo_pago_id is not None and METODOS_PAGO.obtener(metodo_pago_id) is None:
+        errores.append('Método de pago inexistente.')
+    if clave is not None and not 0 < len(clave) <= LARGO_CLAVE:
+        errores.append(f'La clave de idempotencia debe tener entre 1 y {LARGO_CLAVE} caracteres.')
+    if errores:
+        raise CarritoInvalido(errores)
+    return cantidades
+
+
+def _venta_con_clave(usuario, clave):
+    """Venta registrada con la clave, o None; ClaveAjena si la registró otro usuario."""
+    venta = Venta.all_objects.filter(clave_idempotencia=clave).first()
+    if venta is not None and venta.usuario_id != usuario.pk:
+        raise ClaveAjena(f'La clave {clave} ya fue usada por otro usuario.')
+    return venta
+
+
+def registrar_venta(usuario, lineas, metodo_pago_id=None, canal_venta='Local', clave=None):
+    """
+    Registra una venta pagada desde la caja. lineas es [(producto_id, cantidad)].
+    Retorna (venta, creada): con una clave ya usada entrega la venta que se
+    registró con ella, sin tocar el stock de nuevo; si esa venta es de otro
+    usuario lanza ClaveAjena.
+
+    Los productos se leen en una consulta; en una transacción se inserta la
+    venta (la clave única resuelve reintentos simultáneos), se descuenta el
+    stock con UPDATEs condicionales y se insertan todas las líneas con
+    bulk_create. Lanza CarritoInvalido o StockInsuficiente sin dejar cambios.
+    """
+    cantidades = validar_carrito(lineas, metodo_pago_id, canal_venta, clave)
+    if clave is not None:
+        existente = _venta_con_clave(usuario, clave)
+        if existente is not None:
+            return existente, False
+    productos = Producto.objects.only('id', 'precio').in_bulk(list(cantidades))
+    faltantes = [pid for pid in cantidades if pid not in productos]
+    if faltantes:
+        raise CarritoInvalido([f'Producto {pid} inexistente.' for pid in faltantes])
+
+    def guardar():
+        with transaction.atomic():
+            venta = Venta.objects.create(
+                usuario=usuario, metodo_pago_id=metodo_pago_id, estado='Pagado',
+                canal_venta=canal_venta, clave_idempotencia=clave,
+            )
+            ajustar_stock(cantidades, venta_id=venta.pk)
+            lineas_venta = [
+                DetalleVenta(venta=venta, producto_id=pid, cantidad=cantidad, precio_unitario=productos[pid].precio)
+                for pid, cantidad in cantidades.items()
+            ]
+            # bulk_create suma las líneas a monto_total en la base (ver DetalleVentaQuerySet)
+            DetalleVenta.objects.bulk_create(lineas_venta)
+            venta.monto_total = sum(linea.subtotal for linea in lineas_venta)
+        return venta
+
+    try:
+        return escribir(guardar), True
+    except IntegrityError:
+        # Otro reintento con la misma clave se registró primero
+        if clave is None:
+            raise
+        existente = _venta_con_clave(usuario, clave)
+        if existente is None:
+            raise
+        return existente, False
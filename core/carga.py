@@ -0,0 +1,194 @@
+import asyncio
+import contextlib
+import http.client
+import queue
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+
+from .instrumentacion import percentil
+
+
+class ManejadorSilencioso(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ServidorPool(WSGIServer):
+    """
+    Servidor WSGI con un número fijo de hilos, como los workers con hilos de
+    gunicorn: cada hilo conserva su conexión a la base entre peticiones, así
+    CONN_MAX_AGE tiene efecto (runserver crea un hilo por petición).
+    """
+
+    def __init__(self, direccion, hilos):
+        super().__init__(direccion, ManejadorSilencioso)
+        self.set_app(WSGIHandler())
+        self._cola = queue.Queue()
+        self._hilos = [threading.Thread(target=self._atender, daemon=True) for _ in range(hilos)]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def _atender(self):
+        while (pendiente := self._cola.get()) is not None:
+            request, client_address = pendiente
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+        connections.close_all()
+
+    def process_request(self, request, client_address):
+        self._cola.put((request, client_address))
+
+    def server_close(self):
+        for _ in self._hilos:
+            self._cola.put(None)
+        for hilo in self._hilos:
+            hilo.join()
+        super().server_close()
+
+
+@contextlib.contextmanager
+def servidor(hilos):
+    """Levanta ServidorPool en un puerto libre de localhost y entrega (host, puerto)."""
+    servidor = ServidorPool(('127.0.0.1', 0), hilos)
+    hilo = threading.Thread(target=servidor.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    hilo.start()
+    try:
+        yield servidor.server_address
+    finally:
+        servidor.shutdown()
+        hilo.join()
+        servidor.server_close()
+
+
+def generar_carga(direccion, peticiones, clientes, segundos):
+    """
+    clientes hilos repiten peticiones (lista de (método, ruta, cuerpo, cabeceras))
+    durante segundos, cada uno desde un tramo distinto de la lista. Retorna totales, errores (estado >= 500 o sin respuesta),
+    peticiones por segundo y latencias en ms.
+    """
+    fin = time.perf_counter() + segundos
+    latencias = []
+    errores = []
+    estados = {}
+    lock = threading.Lock()
+
+    def cliente(desplazamiento):
+        propias, fallidas, vistos = [], [], {}
+        i = desplazamiento * len(peticiones) // clientes
+        while time.perf_counter() < fin:
+            metodo, ruta, cuerpo, cabeceras = peticiones[i % len(peticiones)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                conexion = http.client.HTTPConnection(*direccion, timeout=30)
+                conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                conexion.close()
+            except OSError as e:
+                fallidas.append(f'{ruta}: {e}')
+                continue
+            propias.append((time.perf_counter() - inicio) * 1000)
+            vistos[respuesta.status] = vistos.get(respuesta.status, 0) + 1
+            if respuesta.status >= 500:
+                fallidas.append(f'{ruta}: {respuesta.status}')
+        with lock:
+            latencias.extend(propias)
+            errores.extend(fallidas)
+            for estado, veces in vistos.items():
+                estados[estado] = estados.get(estado, 0) + veces
+
+    hilos = [threading.Thread(target=cliente, args=(n,)) for n in range(clientes)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return _resultado(latencias, errores, estados, time.perf_counter() - inicio)
+
+
+def _resultado(latencias, errores, estados, duracion):
+    return {
+        'peticiones': len(latencias),
+        'por_segundo': len(latencias) / duracion,
+        'errores': errores,
+        'estados': estados,
+        'p50_ms': percentil(latencias, 50) if latencias else None,
+        'p95_ms': percentil(latencias, 95) if latencias else None,
+        'p99_ms': percentil(latencias, 99) if latencias else None,
+    }
+
+
+async def _enviar(direccion, metodo, ruta, cuerpo, cabeceras):
+    """Una petición HTTP/1.1 con Connection: close; retorna el código de estado."""
+    cuerpo = cuerpo or b''
+    lector, escritor = await asyncio.open_connection(*direccion)
+    try:
+        lineas = [f'{metodo} {ruta} HTTP/1.1', 'Connection: close', f'Content-Length: {len(cuerpo)}']
+        lineas += [f'{nombre}: {valor}' for nombre, valor in cabeceras.items()]
+        escritor.write(('\r\n'.join(lineas) + '\r\n\r\n').encode('latin-1') + cuerpo)
+        await escritor.drain()
+        respuesta = await lector.read()
+    finally:
+        escritor.close()
+    return int(respuesta.split(b' ', 2)[1])
+
+
+def generar_carga_async(direccion, peticiones, clientes, segundos):
+    """
+    generar_carga() con clientes como tareas de asyncio en vez de hilos,
+    para concurrencias de cientos de conexiones a un servidor en otro proceso.
+    """
+    latencias, errores, estados = [], [], {}
+
+    async def cliente(desplazamiento, fin):
+        i = desplazamiento * len(peticiones) // clientes
+        while time.perf_counter() < fin:
+            metodo, ruta, cuerpo, cabeceras = peticiones[i % len(peticiones)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                estado = await _enviar(direccion, metodo, ruta, cuerpo, cabeceras)
+            except (OSError, IndexError, ValueError) as e:
+                errores.append(f'{ruta}: {e!r}')
+                continue
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            estados[estado] = estados.get(estado, 0) + 1
+            if estado >= 500:
+                errores.append(f'{ruta}: {estado}')
+
+    async def principal():
+        fin = time.perf_counter() + segundos
+        await asyncio.gather(*(cliente(n, fin) for n in range(clientes)))
+
+    inicio = time.perf_counter()
+    asyncio.run(principal())
+    return _resultado(latencias, errores, estados, time.perf_counter() - inicio)
+
+
+@contextlib.contextmanager
+def servidor_asgi(aplicacion):
+    """Sirve la aplicación ASGI con uvicorn en un hilo, en un puerto libre de localhost; entrega (host, puerto)."""
+    import uvicorn
+
+    config = uvicorn.Config(aplicacion, host='127.0.0.1', port=0, log_level='warning', access_log=False, lifespan='off')
+    servidor = uvicorn.Server(config)
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        if not hilo.is_alive():
+            raise RuntimeError('uvicorn no pudo iniciar')
+        time.sleep(0.05)
+    try:
+        yield servidor.servers[0].sockets[0].getsockname()[:2]
+    finally:
+        servidor.should_exit = True
+        hilo.join()
@@ -0,0 +1,208 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils.dateparse import parse_datetime
+
+from .models import CompraProducto, DetalleVenta, ResumenCliente, Venta, borrar_filas
+from .paginacion import filtro_seek
+
+# Productos que se muestran como favoritos de un cliente
+NUM_FAVORITOS = 5
+VENTAS_POR_PAGINA = 50
+# Las páginas en cache se descartan solas al cambiar la versión del resumen; esto solo acota su vida
+SEGUNDOS_CACHE_HISTORIAL = 600
+TAMANO_LOTE = 2000
+
+
+def _acumular(modelo, claves, sumas, maximos, filas):
+    """
+    INSERT con executemany de filas (claves, sumas, maximos) que, si la fila
+    de claves ya existe, le suma las columnas de sumas y conserva el mayor
+    valor de maximos, en una sola sentencia por lote.
+    """
+    qn = connection.ops.quote_name
+    tabla = qn(modelo._meta.db_table)
+    campos = [modelo._meta.get_field(c) for c in (*claves, *sumas, *maximos)]
+    columnas = [qn(f.column) for f in campos]
+    if connection.vendor == 'mysql':
+        conflicto, nuevo = 'ON DUPLICATE KEY UPDATE', 'VALUES({})'.format
+    else:
+        conflicto, nuevo = f'ON CONFLICT ({", ".join(columnas[:len(claves)])}) DO UPDATE SET', 'EXCLUDED.{}'.format
+    asignaciones = [f'{c} = {tabla}.{c} + {nuevo(c)}' for c in columnas[len(claves):len(claves) + len(sumas)]]
+    asignaciones += [
+        f'{c} = CASE WHEN {tabla}.{c} IS NULL OR {nuevo(c)} > {tabla}.{c} THEN {nuevo(c)} ELSE {tabla}.{c} END'
+        for c in columnas[len(claves) + len(sumas):]
+    ]
+    sql = (
+        f'INSERT INTO {tabla} ({", ".join(columnas)}) VALUES ({", ".join(["%s"] * len(campos))}) '
+        f'{conflicto} {", ".join(asignaciones)}'
+    )
+    conexion = connections[DEFAULT_DB_ALIAS]
+    preparar = [f.get_db_prep_save for f in campos]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [[prep(valor, conexion) for prep, valor in zip(preparar, fila)] for fila in filas])
+
+
+def acumular_compras(ventas, nuevas=True):
+    """
+    Suma ventas recién registradas al resumen de sus clientes. ventas es
+    [(usuario_id, fecha, monto_total, {producto_id: cantidad})]. Son dos
+    sentencias por llamada, sin importar cuántas compras previas tenga el
+    cliente; se llama dentro de la transacción que registra las ventas.
+    Con nuevas=False se suman montos y unidades a ventas ya contadas.
+    """
+    totales = defaultdict(lambda: [Decimal(0), 0, None])
+    unidades = Counter()
+    for usuario_id, fecha, monto, cantidades in ventas:
+        total = totales[usuario_id]
+        total[0] += monto
+        total[1] += 1 if nuevas else 0
+        total[2] = fecha if total[2] is None else max(total[2], fecha)
+        for producto_id, cantidad in cantidades.items():
+            unidades[usuario_id, producto_id] += cantidad
+    if not totales:
+        return
+    _acumular(
+        ResumenCliente, ('usuario',), ('total_gastado', 'num_ventas', 'version'), ('ultima_compra',),
+        [(usuario_id, monto, num, 1, fecha) for usuario_id, (monto, num, fecha) in totales.items()],
+    )
+    if unidades:
+        _acumular(
+            CompraProducto, ('usuario', 'producto'), ('unidades',), (),
+            [(usuario_id, producto_id, cantidad) for (usuario_id, producto_id), cantidad in unidades.items()],
+        )
+
+
+def sumar_lineas(lineas, signo=1):
+    """
+    Suma al resumen de sus clientes las líneas creadas en ventas ya
+    registradas, o las resta con signo=-1 si se borraron. Las ventas que
+    las líneas no traen cargadas se leen en una consulta; las líneas y
+    ventas eliminadas no cuentan.
+    """
+    lineas = [linea for linea in lineas if linea.deleted_at is None]
+    ventas = {linea.venta_id: linea.venta for linea in lineas if DetalleVenta.venta.is_cached(linea)}
+    faltan = {linea.venta_id for linea in lineas} - ventas.keys()
+    if faltan:
+        ventas.update(Venta.all_objects.only('usuario_id', 'fecha', 'deleted_at').in_bulk(faltan))
+    por_venta = defaultdict(lambda: [Decimal(0), Counter()])
+    for linea in lineas:
+        venta = ventas.get(linea.venta_id)
+        if venta is None or venta.deleted_at is not None:
+            continue
+        suma = por_venta[venta]
+        suma[0] += signo * linea.subtotal
+        suma[1][linea.producto_id] += signo * linea.cantidad
+    acumular_compras(
+        [(venta.usuario_id, venta.fecha, monto, cantidades) for venta, (monto, cantidades) in por_venta.items()],
+        nuevas=False,
+    )
+
+
+def recalcular_clientes(usuarios=None):
+    """
+    Rehace desde las ventas vigentes el resumen de los usuarios indicados
+    (ids o un queryset de ids), o de todos con None. Es para las escrituras que no suman una venta
+    nueva: ediciones desde el admin, ventas eliminadas o restauradas.
+    Retorna los resúmenes escritos.
+    """
+    ventas = Venta.objects.order_by()
+    lineas = DetalleVenta.objects.filter(venta__deleted_at__isnull=True).order_by()
+    resumenes = ResumenCliente.objects.all()
+    compras = CompraProducto.objects.all()
+    if usuarios is not None:
+        ventas = ventas.filter(usuario_id__in=usuarios)
+        lineas = lineas.filter(venta__usuario_id__in=usuarios)
+        resumenes = resumenes.filter(usuario_id__in=usuarios)
+        compras = compras.filter(usuario_id__in=usuarios)
+    with transaction.atomic():
+        versiones = dict(resumenes.values_list('usuario_id', 'version'))
+        nuevos = {
+            fila['usuario_id']: fila
+            for fila in ventas.values('usuario_id').annotate(total=Sum('monto_total'), num=Count('id'), ultima=Max('fecha'))
+        }
+        # Los usuarios que ya no tienen ventas quedan en cero; la versión sigue aumentando
+        for usuario_id in versiones.keys() - nuevos.keys():
+            nuevos[usuario_id] = {'total': 0, 'num': 0, 'ultima': None}
+        ResumenCliente.objects.bulk_create(
+            [
+                ResumenCliente(
+                    usuario_id=usuario_id, total_gastado=fila['total'] or 0, num_ventas=fila['num'],
+                    ultima_compra=fila['ultima'], version=versiones.get(usuario_id, 0) + 1,
+                )
+                for usuario_id, fila in nuevos.items()
+            ],
+            batch_size=TAMANO_LOTE, update_conflicts=True, unique_fields=['usuario'],
+            update_fields=['total_gastado', 'num_ventas', 'ultima_compra', 'version'],
+        )
+        borrar_filas(compras)
+        por_producto = lineas.values('venta__usuario_id', 'producto_id').annotate(unidades=Sum('cantidad'))
+        lote = []
+        for fila in por_producto.iterator(chunk_size=TAMANO_LOTE):
+            lote.append(CompraProducto(usuario_id=fila['venta__usuario_id'], producto_id=fila['producto_id'], unidades=fila['unidades']))
+            if len(lote) >= TAMANO_LOTE:
+                CompraProducto.objects.bulk_create(lote)
+                lote = []
+        CompraProducto.objects.bulk_create(lote)
+    return len(nuevos)
+
+
+def invalidar_historial(usuarios):
+    """Descarta el historial en cache de los usuarios sin cambiar sus totales."""
+    ResumenCliente.objects.filter(usuario_id__in=usuarios).update(version=F('version') + 1)
+
+
+def leer_cursor(texto):
+    """(fecha, id) de un cursor 'fecha|id' del historial, o None si no es válido."""
+    fecha, _, venta_id = (texto or '').partition('|')
+    fecha = parse_datetime(fecha)
+    if fecha is None or not venta_id.isdigit():
+        return None
+    return fecha, int(venta_id)
+
+
+def pagina_historial(usuario_id, cursor=None):
+    """
+    Una página de ventas del usuario, de la más reciente a la más antigua,
+    desde el cursor (fecha, id) de la página anterior; la primera página
+    trae además los productos favoritos. Consultas por índice que no
+    dependen de cuántas compras tenga el cliente.
+    """
+    ventas = Venta.objects.filter(usuario_id=usuario_id).order_by('-fecha', '-id')
+    if cursor is not None:
+        ventas = ventas.filter(filtro_seek(('fecha', 'id'), cursor))
+    ventas = list(ventas.values('id', 'fecha', 'monto_total', 'estado', 'canal_venta')[:VENTAS_POR_PAGINA + 1])
+    siguiente = None
+    if len(ventas) > VENTAS_POR_PAGINA:
+        ventas = ventas[:VENTAS_POR_PAGINA]
+        siguiente = f'{ventas[-1]["fecha"].isoformat()}|{ventas[-1]["id"]}'
+    favoritos = []
+    if cursor is None:
+        favoritos = list(
+            CompraProducto.objects.filter(usuario_id=usuario_id, unidades__gt=0).order_by('-unidades')
+            .values('producto_id', 'producto__nombre', 'unidades')[:NUM_FAVORITOS]
+        )
+    return {'ventas': ventas, 'siguiente': siguiente, 'favoritos': favoritos}
+
+
+def historial(usuario_id, cursor=None):
+    """
+    Resumen del usuario y una página de su historial. La página se guarda
+    en cache con la versión del resumen en la clave: una venta nueva o una
+    corrección cambia la versión y las páginas anteriores dejan de usarse.
+    Con la página en cache, la respuesta es una lectura del resumen por clave.
+    """
+    resumen = (
+        ResumenCliente.objects.filter(usuario_id=usuario_id)
+        .values('total_gastado', 'num_ventas', 'ultima_compra', 'version').first()
+    ) or {'total_gastado': Decimal(0), 'num_ventas': 0, 'ultima_compra': None, 'version': 0}
+    desde = f'{cursor[0].isoformat()}|{cursor[1]}' if cursor else ''
+    clave = f'historial:{usuario_id}:{resumen["version"]}:{desde}'
+    pagina = cache.get(clave)
+    if pagina is None:
+        pagina = pagina_historial(usuario_id, cursor)
+        cache.set(clave, pagina, SEGUNDOS_CACHE_HISTORIAL)
+    return resumen, pagina
@@ -0,0 +1,100 @@
+import concurrent.futures
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+
+# Mensajes de SQLite cuando otra conexión tiene el bloqueo de escritura
+MENSAJES_BLOQUEO = ('database is locked', 'database table is locked')
+
+
+def es_bloqueo(error):
+    return isinstance(error, OperationalError) and any(m in str(error) for m in MENSAJES_BLOQUEO)
+
+
+def espera(intento):
+    """Segundos antes del reintento n (desde 0): exponencial con jitter para que los hilos no choquen de nuevo."""
+    base = getattr(settings, 'SQLITE_ESPERA_REINTENTO', 0.05)
+    return base * 2 ** intento * random.uniform(0.5, 1.5)
+
+
+def con_reintentos(funcion, *args, **kwargs):
+    """
+    Ejecuta funcion y la repite si la base estaba bloqueada, hasta
+    settings.SQLITE_REINTENTOS intentos. funcion debe abrir su propia
+    transacción: dentro de un atomic() externo no se reintenta, porque lo ya
+    hecho en él se perdería; el error sube para que lo revierta quien lo abrió.
+    """
+    intentos = max(1, getattr(settings, 'SQLITE_REINTENTOS', 5))
+    for intento in range(intentos):
+        try:
+            return funcion(*args, **kwargs)
+        except OperationalError as e:
+            if not es_bloqueo(e) or intento == intentos - 1 or transaction.get_connection().in_atomic_block:
+                raise
+        time.sleep(espera(intento))
+
+
+class ColaEscritura:
+    """
+    Un solo hilo que ejecuta, en orden de llegada, las escrituras que se le
+    entregan: las conexiones de las peticiones no compiten por el bloqueo de
+    escritura de SQLite. Quien encola espera el resultado (o la excepción).
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def _registrar_hilo(self):
+        self._hilo = threading.current_thread()
+
+    def ejecutar(self, funcion, *args, **kwargs):
+        if threading.current_thread() is self._hilo:
+            return funcion(*args, **kwargs)
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='escritor-sqlite', initializer=self._registrar_hilo,
+                )
+        return self._executor.submit(funcion, *args, **kwargs).result()
+
+    def detener(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            # La conexión del hilo escritor se cierra en el mismo hilo
+            executor.submit(connections.close_all).result()
+            executor.shutdown()
+
+
+COLA = ColaEscritura()
+
+
+def escribir(funcion, *args, **kwargs):
+    """
+    Ejecuta una escritura corta con reintentos ante bloqueos y, en SQLite con
+    settings.SQLITE_COLA_ESCRITURA, en la cola de escritura. Dentro de un
+    atomic() corre en la misma conexión: la cola no puede ver la transacción
+    abierta y esperaría el bloqueo que ella misma tiene.
+    """
+    en_cola = (
+        getattr(settings, 'SQLITE_COLA_ESCRITURA', False)
+        and connection.vendor == 'sqlite'
+        and not transaction.get_connection().in_atomic_block
+    )
+    if en_cola:
+        return COLA.ejecutar(con_reintentos, funcion, *args, **kwargs)
+    return con_reintentos(funcion, *args, **kwargs)
+
+
+def escritura(funcion):
+    """Decorador: cada llamada a funcion pasa por escribir()."""
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        return escribir(funcion, *args, **kwargs)
+    return envoltura
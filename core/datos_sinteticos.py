@@ -0,0 +1,155 @@
+import bisect
+import datetime
+import itertools
+import random
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .clientes import acumular_compras
+from .models import Categoria, DetalleVenta, MetodoPago, Producto, Rol, Usuario, Venta, insertar_filas
+
+TAMANO_LOTE = 5000
+# Columnas que se insertan directamente en generar_ventas; created_at y updated_at las completa insertar_filas
+VENTA_CAMPOS = ('id', 'usuario', 'metodo_pago', 'monto_total', 'estado', 'canal_venta', 'fecha')
+DETALLE_CAMPOS = ('venta', 'producto', 'cantidad', 'precio_unitario')
+
+# Mezclas observadas en las ventas: valor -> peso relativo
+CANALES = {'Local': 55, 'Online': 20, 'WhatsApp': 15, 'Instagram': 10}
+METODOS_PAGO = {'Efectivo': 40, 'Tarjeta': 45, 'Transferencia': 15}
+ESTADOS = {'Entregado': 70, 'Pagado': 25, 'Pendiente': 5}
+CANTIDADES = {1: 50, 2: 25, 3: 12, 4: 8, 5: 5}
+# Ventas por hora del día (0 a 23): desayuno y once concentran la demanda
+PESO_HORA = [0, 0, 0, 0, 0, 1, 4, 10, 12, 8, 5, 4, 5, 4, 3, 3, 5, 9, 11, 8, 4, 2, 1, 0]
+# Ventas por día de la semana, de lunes a domingo
+PESO_DIA_SEMANA = [8, 8, 8, 9, 11, 14, 12]
+# Rango de precios por categoría, en pesos
+PRECIOS_CATEGORIA = {'Panadería': (500, 3000), 'Pastelería': (2000, 25000), 'Bebidas': (1000, 4000)}
+# Popularidad de productos y clientes según su posición: peso 1 / posición^s
+ZIPF_PRODUCTOS = 1.1
+ZIPF_USUARIOS = 0.7
+
+
+def _muestreador(rng, valores, pesos):
+    """Función que elige un elemento de valores con probabilidad proporcional a pesos."""
+    valores = list(valores)
+    acumulados = list(itertools.accumulate(pesos))
+    total = acumulados[-1]
+    return lambda: valores[bisect.bisect(acumulados, rng.random() * total)]
+
+
+def _zipf(rng, valores, exponente):
+    # La posición en el ranking no depende del id
+    valores = list(valores)
+    rng.shuffle(valores)
+    return _muestreador(rng, valores, [1 / (posicion + 1) ** exponente for posicion in range(len(valores))])
+
+
+def generar_maestros(num_productos, num_usuarios, semilla=1):
+    """
+    Crea los productos y clientes sintéticos que falten hasta num_productos y num_usuarios.
+
+    Retorna ([(id, precio)], [id de usuario], {nombre de método de pago: id}).
+    """
+    rng = random.Random(semilla)
+    rol, _ = Rol.objects.get_or_create(nombre='Cliente', defaults={'descripcion': 'Cliente de la fornería'})
+    categorias = [Categoria.objects.get_or_create(nombre=n)[0] for n in PRECIOS_CATEGORIA]
+    metodos = {n: MetodoPago.objects.get_or_create(nombre=n)[0].id for n in METODOS_PAGO}
+
+    existentes = Producto.objects.filter(nombre__startswith='Sintético ').count()
+    productos = []
+    for i in range(existentes, num_productos):
+        categoria = rng.choice(categorias)
+        minimo, maximo = PRECIOS_CATEGORIA[categoria.nombre]
+        productos.append(Producto(
+            nombre=f'Sintético {i:06d}', marca='La Fornería', tipo='Propia',
+            precio=Decimal(rng.randrange(minimo, maximo, 100)), categoria=categoria,
+            stock_actual=rng.randrange(0, 200),
+        ))
+    Producto.objects.bulk_create(productos, batch_size=TAMANO_LOTE)
+
+    existentes = Usuario.objects.filter(username__startswith='sintetico').count()
+    Usuario.objects.bulk_create([
+        Usuario(
+            username=f'sintetico{i:07d}', first_name=f'Cliente{i}', paterno='Sintético',
+            run=f'S{i:09d}', rol=rol, password='!',
+        )
+        for i in range(existentes, num_usuarios)
+    ], batch_size=TAMANO_LOTE)
+
+    productos = list(
+        Producto.objects.filter(nombre__startswith='Sintético ').order_by('id').values_list('id', 'precio')[:num_productos]
+    )
+    usuarios = list(
+        Usuario.objects.filter(username__startswith='sintetico').order_by('id').values_list('id', flat=True)[:num_usuarios]
+    )
+    return productos, usuarios, metodos
+
+
+def generar_ventas(num_ventas=None, num_lineas=None, lineas_por_venta=3, num_productos=200, num_usuarios=100,
+                   dias=365, semilla=1, progreso=None):
+    """
+    Crea ventas sintéticas por lotes hasta llegar a num_ventas ventas o
+    num_lineas líneas de detalle, lo que ocurra primero.
+
+    La popularidad de productos y clientes sigue una ley de Zipf, las fechas
+    se reparten en los últimos `dias` días según el día de la semana y la hora,
+    y canal, método de pago y estado siguen las mezclas de este módulo. Con la
+    misma semilla y los mismos maestros se generan las mismas ventas.
+
+    Ventas y líneas se insertan con executemany, sin instanciar modelos ni
+    pasar por DetalleVentaQuerySet: el monto_total de cada venta se calcula
+    antes de insertarla, lo que evita un UPDATE por venta; el resumen de
+    cada cliente se acumula por lote. El stock de los productos no se
+    descuenta. progreso(ventas, lineas) se llama después de
+    cada lote. Retorna (ventas, lineas) creadas.
+    """
+    productos, usuarios, metodos = generar_maestros(num_productos, num_usuarios, semilla)
+    rng = random.Random(semilla + 1)
+    producto = _zipf(rng, productos, ZIPF_PRODUCTOS)
+    usuario = _zipf(rng, usuarios, ZIPF_USUARIOS)
+    canal = _muestreador(rng, CANALES, CANALES.values())
+    metodo = _muestreador(rng, [metodos[n] for n in METODOS_PAGO], METODOS_PAGO.values())
+    estado = _muestreador(rng, ESTADOS, ESTADOS.values())
+    cantidad = _muestreador(rng, CANTIDADES, CANTIDADES.values())
+    hora = _muestreador(rng, range(24), PESO_HORA)
+    hoy = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+    inicios = [hoy - datetime.timedelta(days=d) for d in range(1, dias + 1)]
+    dia = _muestreador(rng, inicios, [PESO_DIA_SEMANA[inicio.weekday()] for inicio in inicios])
+
+    num_ventas = float('inf') if num_ventas is None else num_ventas
+    num_lineas = float('inf') if num_lineas is None else num_lineas
+    creadas_ventas = creadas_lineas = 0
+    while creadas_ventas < num_ventas and creadas_lineas < num_lineas:
+        with transaction.atomic():
+            # Los id de venta se asignan aquí para enlazar las líneas sin leerlos de vuelta
+            venta_id = (Venta.all_objects.aggregate(m=Max('id'))['m'] or 0) + 1
+            ventas, detalles, compras = [], [], []
+            while (len(detalles) < TAMANO_LOTE and creadas_ventas + len(ventas) < num_ventas
+                   and creadas_lineas + len(detalles) < num_lineas):
+                monto = 0
+                cantidades = Counter()
+                for _ in range(min(rng.randint(1, 2 * lineas_por_venta - 1), num_lineas - creadas_lineas - len(detalles))):
+                    producto_id, precio = producto()
+                    c = cantidad()
+                    monto += c * precio
+                    cantidades[producto_id] += c
+                    detalles.append((venta_id, producto_id, c, precio))
+                fecha = dia() + datetime.timedelta(hours=hora(), seconds=rng.randrange(3600))
+                cliente = usuario()
+                ventas.append((
+                    venta_id, cliente, metodo(), monto, estado(), canal(), fecha,
+                ))
+                compras.append((cliente, fecha, monto, cantidades))
+                venta_id += 1
+            insertar_filas(Venta, VENTA_CAMPOS, ventas)
+            insertar_filas(DetalleVenta, DETALLE_CAMPOS, detalles)
+            acumular_compras(compras)
+        creadas_ventas += len(ventas)
+        creadas_lineas += len(detalles)
+        if progreso:
+            progreso(creadas_ventas, creadas_lineas)
+    return creadas_ventas, creadas_lineas
@@ -0,0 +1,98 @@
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import DetalleVenta
+
+# Encabezado -> ruta desde DetalleVenta
+COLUMNAS = (
+    ('venta', 'venta_id'),
+    ('fecha', 'venta__fecha'),
+    ('estado', 'venta__estado'),
+    ('canal_venta', 'venta__canal_venta'),
+    ('metodo_pago', 'venta__metodo_pago__nombre'),
+    ('cliente', 'venta__usuario__username'),
+    ('cliente_nombre', 'venta__usuario__first_name'),
+    ('cliente_paterno', 'venta__usuario__paterno'),
+    ('monto_total', 'venta__monto_total'),
+    ('detalle', 'id'),
+    ('producto', 'producto_id'),
+    ('producto_nombre', 'producto__nombre'),
+    ('categoria', 'producto__categoria__nombre'),
+    ('cantidad', 'cantidad'),
+    ('precio_unitario', 'precio_unitario'),
+)
+# El subtotal se calcula en Python: así conserva los dos decimales del precio
+ENCABEZADOS = [encabezado for encabezado, _ in COLUMNAS] + ['subtotal']
+FORMATOS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+# Filas leídas por viaje a la base y filas por bloque escrito a la respuesta
+TAMANO_BLOQUE = 2000
+FILAS_POR_ESCRITURA = 500
+
+
+def inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def lineas_de_venta(ventas=None, desde=None, hasta=None):
+    """
+    DetalleVenta vigentes de las ventas dadas (queryset de Venta) y/o del rango
+    de fechas [desde, hasta], ambos inclusive, ordenados por fecha de venta.
+    """
+    qs = DetalleVenta.objects.all()
+    if ventas is not None:
+        qs = qs.filter(venta__in=ventas.values('pk'))
+    # Límites sobre la columna (no sobre su fecha) para usar el índice de fecha
+    if desde:
+        qs = qs.filter(venta__fecha__gte=inicio_dia(desde))
+    if hasta:
+        qs = qs.filter(venta__fecha__lt=inicio_dia(hasta + datetime.timedelta(days=1)))
+    return qs.order_by('venta__fecha', 'venta_id', 'id')
+
+
+def filas(lineas):
+    """Tuplas en el orden de ENCABEZADOS, leídas por bloques sin instanciar modelos."""
+    for fila in lineas.values_list(*[ruta for _, ruta in COLUMNAS]).iterator(chunk_size=TAMANO_BLOQUE):
+        yield fila + (fila[-2] * fila[-1],)
+
+
+class _Eco:
+    """Destino de csv.writer que retorna lo escrito en lugar de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def _por_bloques(textos):
+    bloque = []
+    for texto in textos:
+        bloque.append(texto)
+        if len(bloque) >= FILAS_POR_ESCRITURA:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def exportar_csv(lineas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(ENCABEZADOS)
+    yield from _por_bloques(
+        escritor.writerow([valor.isoformat() if isinstance(valor, datetime.datetime) else valor for valor in fila])
+        for fila in filas(lineas)
+    )
+
+
+def exportar_jsonl(lineas):
+    yield from _por_bloques(
+        json.dumps(dict(zip(ENCABEZADOS, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        for fila in filas(lineas)
+    )
+
+
+def exportar(lineas, formato):
+    """Generador de bloques de texto con las líneas en formato 'csv' o 'jsonl'."""
+    return exportar_csv(lineas) if formato == 'csv' else exportar_jsonl(lineas)
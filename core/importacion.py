@@ -0,0 +1,222 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .alertas import revisar_alertas
+from .models import Categoria, MovimientoStock, Nutricional, Producto, filas_modificadas
+from .stock import registrar_movimientos
+
+COLUMNAS_OBLIGATORIAS = ('codigo', 'nombre', 'tipo', 'precio', 'categoria')
+# Las columnas opcionales ausentes del archivo no se modifican en los productos existentes
+COLUMNAS_OPCIONALES = ('marca', 'stock_actual', 'stock_objetivo', 'umbral_alerta')
+COLUMNAS_NUTRICIONAL = ('ingredientes', 'tiempo_preparacion', 'proteinas', 'azucar', 'gluten')
+VERDADEROS = ('1', 'si', 'sí', 'true', 'x')
+TAMANO_LOTE = 1000
+
+
+class ArchivoInvalido(Exception):
+    pass
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.filas = 0
+        self.importadas = 0
+        # (número de línea, código, mensaje)
+        self.errores = []
+
+
+def _mensajes(error):
+    if hasattr(error, 'error_dict'):
+        return '; '.join(f'{campo}: {" ".join(m)}' for campo, m in error.message_dict.items())
+    return '; '.join(error.messages)
+
+
+def _celda(fila, columna):
+    """Texto de la celda sin espacios; vacío es None."""
+    return (fila[columna] or '').strip() or None
+
+
+def _validar(fila, opcionales, con_nutricional):
+    """
+    Producto (y Nutricional, si la fila trae ingredientes) validados; lanza ValidationError.
+
+    Las celdas se asignan como texto: clean_fields las convierte y valida
+    con las reglas de cada campo, solo sobre las columnas del archivo y sin
+    las consultas de validación de claves foráneas.
+    """
+    codigo = _celda(fila, 'codigo')
+    if not codigo:
+        raise ValidationError({'codigo': ['Falta el código.']})
+    categoria = _celda(fila, 'categoria')
+    if not categoria:
+        raise ValidationError({'categoria': ['Falta la categoría.']})
+    columnas = ['codigo', 'nombre', 'tipo', 'precio', *opcionales]
+    producto = Producto(**{columna: _celda(fila, columna) for columna in columnas})
+    producto.clean_fields(exclude=[f.name for f in Producto._meta.fields if f.name not in columnas])
+    producto.clean()
+
+    nutricional = None
+    if con_nutricional and _celda(fila, 'ingredientes'):
+        nutricional = Nutricional(
+            ingredientes=_celda(fila, 'ingredientes'),
+            tiempo_preparacion=_celda(fila, 'tiempo_preparacion'),
+            proteinas=_celda(fila, 'proteinas') or 0,
+            azucar=_celda(fila, 'azucar') or 0,
+            gluten=(_celda(fila, 'gluten') or '').lower() in VERDADEROS,
+        )
+        nutricional.clean_fields(exclude=['id', 'created_at', 'updated_at', 'deleted_at'])
+    return producto, categoria, nutricional
+
+
+def _ids_categorias(nombres, cache):
+    """Completa cache (nombre -> id) creando las categorías que no existan."""
+    faltan = set(nombres) - cache.keys()
+    if not faltan:
+        return
+    cache.update(Categoria.objects.filter(nombre__in=faltan).values_list('nombre', 'id'))
+    nuevas = faltan - cache.keys()
+    if nuevas:
+        Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in sorted(nuevas)])
+        cache.update(Categoria.objects.filter(nombre__in=nuevas).values_list('nombre', 'id'))
+
+
+def _upsert(modelo, objetos, clave, actualizar):
+    """
+    Inserta objetos con un INSERT ... ON CONFLICT (ON DUPLICATE KEY en MySQL)
+    ejecutado con executemany: las filas cuya `clave` ya existe actualizan
+    las columnas de `actualizar`. El SQL se arma una vez por lote y de cada
+    objeto solo se adaptan los valores.
+    """
+    ops = connection.ops
+    campos = [f for f in modelo._meta.concrete_fields if not f.primary_key or f.name == clave]
+    columnas = [f.column for f in campos]
+    # MySQL no admite indicar la columna del conflicto: usa cualquier índice único
+    sufijo = ops.on_conflict_suffix_sql(
+        campos, OnConflict.UPDATE, [modelo._meta.get_field(c).column for c in actualizar],
+        [modelo._meta.get_field(clave).column],
+    )
+    sql = (
+        f'INSERT INTO {ops.quote_name(modelo._meta.db_table)} ({", ".join(map(ops.quote_name, columnas))}) '
+        f'VALUES ({", ".join(["%s"] * len(campos))}) {sufijo}'
+    )
+    # La conexión real y no el proxy `connection`, que resuelve el hilo en cada acceso
+    conexion = connections[DEFAULT_DB_ALIAS]
+    # created_at y updated_at valen lo mismo en todo el lote: se adaptan una vez
+    ahora = timezone.now()
+    fijos = {
+        f.attname: f.get_db_prep_save(ahora, conexion)
+        for f in campos if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+    }
+    filas = [
+        [fijos[f.attname] if f.attname in fijos else f.get_db_prep_save(getattr(obj, f.attname), conexion) for f in campos]
+        for obj in objetos
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, filas)
+    filas_modificadas.send(sender=modelo)
+
+
+def _guardar_nutricionales(nutricionales):
+    existentes = [n for n in nutricionales if n.pk]
+    nuevos = [n for n in nutricionales if not n.pk]
+    if existentes:
+        _upsert(Nutricional, existentes, 'id', [*COLUMNAS_NUTRICIONAL, 'deleted_at', 'updated_at'])
+    if connection.features.can_return_rows_from_bulk_insert:
+        Nutricional.objects.bulk_create(nuevos)
+    else:
+        # Sin RETURNING no se conocen los id de un INSERT múltiple
+        for nutricional in nuevos:
+            nutricional.save()
+
+
+def _guardar_lote(lote, opcionales, con_nutricional, categorias):
+    with transaction.atomic():
+        _ids_categorias({categoria for _, categoria, _ in lote.values()}, categorias)
+        # Nutricional y stock actuales de los productos que ya existen, por código
+        existentes = Producto.all_objects.filter(codigo__in=lote).values_list('codigo', 'nutricional_id', 'stock_actual')
+        actuales, stock_anterior = {}, {}
+        for codigo, nutricional_id, stock in existentes:
+            actuales[codigo] = nutricional_id
+            stock_anterior[codigo] = stock
+        if con_nutricional:
+            nutricionales = []
+            for codigo, (_, _, nutricional) in lote.items():
+                if nutricional is not None:
+                    nutricional.pk = actuales.get(codigo)
+                    nutricionales.append(nutricional)
+            _guardar_nutricionales(nutricionales)
+
+        productos = []
+        for codigo, (producto, categoria, nutricional) in lote.items():
+            producto.categoria_id = categorias[categoria]
+            producto.nutricional_id = nutricional.pk if nutricional is not None else actuales.get(codigo)
+            # Un producto presente en el archivo vuelve a estar vigente
+            producto.deleted_at = None
+            productos.append(producto)
+        campos = ['nombre', 'tipo', 'precio', 'categoria', 'nutricional', 'deleted_at', 'updated_at', *opcionales]
+        _upsert(Producto, productos, 'codigo', campos)
+
+        if 'stock_actual' in opcionales:
+            # La diferencia con el stock anterior queda en el registro de movimientos
+            cambios = {
+                codigo: int(producto.stock_actual or 0) - stock_anterior.get(codigo, 0)
+                for codigo, (producto, _, _) in lote.items()
+            }
+            cambios = {codigo: cantidad for codigo, cantidad in cambios.items() if cantidad}
+            ids = dict(Producto.all_objects.filter(codigo__in=cambios).values_list('codigo', 'id')) if cambios else {}
+            registrar_movimientos([
+                (ids[codigo], cantidad, MovimientoStock.IMPORTACION, None) for codigo, cantidad in cambios.items()
+            ])
+        # Stock, umbral, categoría o vigencia pueden haber cambiado
+        revisar_alertas(Producto.all_objects.filter(codigo__in=lote).values('pk'))
+
+
+def importar_productos(lineas, tamano_lote=TAMANO_LOTE):
+    """
+    Importa productos desde un CSV, leído línea a línea desde `lineas`.
+
+    Cada fila se valida con las reglas de Producto (y Nutricional, si trae
+    ingredientes). Las válidas se insertan o actualizan por código en lotes
+    de tamano_lote con _upsert, un INSERT con executemany por tabla y por
+    lote, cada lote en su propia transacción; las categorías que no existan
+    se crean. Las filas con errores se omiten y se informan en el resultado.
+    Si un código se repite, prevalece la última fila.
+    """
+    lector = csv.DictReader(lineas)
+    lector.fieldnames = [c.strip().lower() for c in lector.fieldnames or []]
+    faltan = [c for c in COLUMNAS_OBLIGATORIAS if c not in lector.fieldnames]
+    if faltan:
+        raise ArchivoInvalido(f'Faltan columnas obligatorias: {", ".join(faltan)}')
+    opcionales = [c for c in COLUMNAS_OPCIONALES if c in lector.fieldnames]
+    con_nutricional = all(c in lector.fieldnames for c in COLUMNAS_NUTRICIONAL)
+
+    resultado = ResultadoImportacion()
+    categorias = {}
+    lote = {}
+    for fila in lector:
+        resultado.filas += 1
+        try:
+            producto, categoria, nutricional = _validar(fila, opcionales, con_nutricional)
+        except ValidationError as e:
+            resultado.errores.append((lector.line_num, (fila.get('codigo') or '').strip(), _mensajes(e)))
+            continue
+        lote[producto.codigo] = (producto, categoria, nutricional)
+        if len(lote) >= tamano_lote:
+            _guardar_lote(lote, opcionales, con_nutricional, categorias)
+            resultado.importadas += len(lote)
+            lote = {}
+    if lote:
+        _guardar_lote(lote, opcionales, con_nutricional, categorias)
+        resultado.importadas += len(lote)
+    return resultado
+
+
+def escribir_errores(resultado, destino):
+    """Escribe el reporte de errores por fila como CSV."""
+    escritor = csv.writer(destino)
+    escritor.writerow(['linea', 'codigo', 'error'])
+    escritor.writerows(resultado.errores)
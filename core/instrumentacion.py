@@ -0,0 +1,174 @@
+import collections
+import contextvars
+import heapq
+import json
+import logging
+import random
+import statistics
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+from .roles import aget_rol, get_rol
+
+logger = logging.getLogger('core.instrumentacion')
+
+# Últimas peticiones medidas de este proceso, para la página del admin
+_buffer = collections.deque(maxlen=getattr(settings, 'INSTRUMENTACION_BUFFER', 500))
+
+# Medición de la petición en curso. Las variables de contexto pasan a los hilos
+# de sync_to_async, así bajo ASGI también se ven las consultas de la petición
+_medicion = contextvars.ContextVar('medicion_consultas', default=None)
+
+
+class MedicionConsultas:
+    """execute_wrapper que acumula tiempo, cantidad, repetidas y las consultas más lentas."""
+
+    def __init__(self, num_lentas):
+        self.num_lentas = num_lentas
+        self.consultas = 0
+        self.segundos = 0.0
+        self.vistas = collections.Counter()
+        # Heap de (segundos, sql) con las num_lentas más lentas
+        self.lentas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.segundos += duracion
+            # Repetida: mismo SQL con los mismos parámetros en la misma petición
+            self.vistas[(sql, repr(params) if not many else None)] += 1
+            if len(self.lentas) < self.num_lentas:
+                heapq.heappush(self.lentas, (duracion, sql))
+            elif duracion > self.lentas[0][0]:
+                heapq.heapreplace(self.lentas, (duracion, sql))
+
+    @property
+    def repetidas(self):
+        return sum(veces - 1 for veces in self.vistas.values())
+
+
+def _modelo_admin(match):
+    """Modelo del admin que atiende la ruta, o ''."""
+    model_admin = getattr(match.func, 'model_admin', None)
+    if model_admin is not None:
+        return model_admin.model._meta.label_lower
+    # Vistas propias de un ModelAdmin (importar, exportar): nombre app_modelo_accion
+    if match.app_name == 'admin' and match.url_name and match.url_name.count('_') >= 2:
+        app_label, modelo, _ = match.url_name.split('_', 2)
+        try:
+            return apps.get_model(app_label, modelo)._meta.label_lower
+        except LookupError:
+            pass
+    return ''
+
+
+def registrar(request, response, segundos, medicion, rol):
+    match = getattr(request, 'resolver_match', None)
+    registro = {
+        'fecha': timezone.now().isoformat(),
+        'metodo': request.method,
+        'ruta': request.path,
+        'url_name': match.view_name if match else '',
+        'modelo': _modelo_admin(match) if match else '',
+        'rol': rol,
+        'estado': response.status_code,
+        'ms': round(segundos * 1000, 2),
+        'ms_db': round(medicion.segundos * 1000, 2),
+        'consultas': medicion.consultas,
+        'repetidas': medicion.repetidas,
+        'sql_lentas': [
+            {'ms': round(duracion * 1000, 2), 'sql': sql[:500]} for duracion, sql in sorted(medicion.lentas, reverse=True)
+        ],
+    }
+    _buffer.append(registro)
+    logger.info(json.dumps(registro, ensure_ascii=False))
+    return registro
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """execute_wrapper de todas las conexiones (ver core/signals.py); solo mide si la petición se está midiendo."""
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    return medicion(execute, sql, params, many, context)
+
+
+def medir(request, get_response):
+    """Atiende la petición midiendo tiempo total y de base de datos."""
+    medicion = MedicionConsultas(getattr(settings, 'INSTRUMENTACION_SQL_LENTAS', 5))
+    token = _medicion.set(medicion)
+    inicio = time.perf_counter()
+    try:
+        response = get_response(request)
+    finally:
+        _medicion.reset(token)
+    segundos = time.perf_counter() - inicio
+    # En respuestas en streaming el cuerpo se genera después: no se incluye
+    user = getattr(request, 'user', None)
+    rol = get_rol(request).nombre if user is not None and user.is_authenticated else ''
+    registrar(request, response, segundos, medicion, rol)
+    return response
+
+
+async def amedir(request, get_response):
+    """medir() para el middleware en modo async."""
+    medicion = MedicionConsultas(getattr(settings, 'INSTRUMENTACION_SQL_LENTAS', 5))
+    token = _medicion.set(medicion)
+    inicio = time.perf_counter()
+    try:
+        response = await get_response(request)
+    finally:
+        _medicion.reset(token)
+    segundos = time.perf_counter() - inicio
+    rol = ''
+    if hasattr(request, 'auser'):
+        user = await request.auser()
+        rol = (await aget_rol(request)).nombre if user.is_authenticated else ''
+    registrar(request, response, segundos, medicion, rol)
+    return response
+
+
+def muestrear():
+    return random.random() < getattr(settings, 'INSTRUMENTACION_MUESTREO', 1.0)
+
+
+def recientes():
+    """Peticiones del buffer, la más reciente primero."""
+    return list(reversed(_buffer))
+
+
+def limpiar():
+    _buffer.clear()
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def resumen_por_ruta(registros):
+    """Por url_name: peticiones, mediana y p95 de ms, ms de base de datos y consultas promedio."""
+    grupos = collections.defaultdict(list)
+    for registro in registros:
+        grupos[(registro['url_name'], registro['modelo'])].append(registro)
+    filas = []
+    for (url_name, modelo), grupo in grupos.items():
+        tiempos = [r['ms'] for r in grupo]
+        filas.append({
+            'url_name': url_name,
+            'modelo': modelo,
+            'peticiones': len(grupo),
+            'mediana_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': percentil(tiempos, 95),
+            'db_ms': round(statistics.mean(r['ms_db'] for r in grupo), 2),
+            'consultas': round(statistics.mean(r['consultas'] for r in grupo), 1),
+            'repetidas': max(r['repetidas'] for r in grupo),
+        })
+    return sorted(filas, key=lambda fila: fila['p95_ms'], reverse=True)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.alertas import DIAS_VELOCIDAD, candidatos_reposicion, reconstruir_alertas
+
+
+class Command(BaseCommand):
+    help = 'Lista los productos con stock bajo su umbral, con su velocidad de venta reciente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=50, help='Máximo de productos a listar (0: todos)')
+        parser.add_argument(
+            '--dias', type=int, default=DIAS_VELOCIDAD,
+            help='Días de ventas con que se calcula la velocidad de venta',
+        )
+        parser.add_argument(
+            '--reconstruir', action='store_true',
+            help='Revisa el catálogo completo antes de listar, p. ej. tras modificar el stock con SQL directo',
+        )
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            escritas, resueltas = reconstruir_alertas()
+            self.stdout.write(self.style.SUCCESS(f'{escritas} alertas escritas y {resueltas} resueltas.'))
+        candidatos = candidatos_reposicion(limite=options['limite'] or None, dias=options['dias'])
+        if not candidatos:
+            self.stdout.write('No hay productos con stock bajo su umbral.')
+            return
+        self.stdout.write(f'{"id":>8}  {"producto":<40} {"stock":>6} {"umbral":>6} {"vendidas":>8} {"por día":>8} {"días":>6}')
+        for c in candidatos:
+            dias = f'{c["dias_restantes"]:6.1f}' if c['dias_restantes'] is not None else f'{"-":>6}'
+            self.stdout.write(
+                f'{c["producto_id"]:>8}  {c["nombre"][:40]:<40} {c["stock"]:>6} {c["umbral"]:>6} '
+                f'{c["vendidas"]:>8} {c["por_dia"]:>8.1f} {dias}'
+            )
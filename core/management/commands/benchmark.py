@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import ESCENARIOS
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta un escenario de benchmark sobre la base de datos configurada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('escenario', choices=sorted(ESCENARIOS))
+        parser.add_argument(
+            '--lineas', type=int, default=1_000_000,
+            help='Líneas de DetalleVenta que debe tener la base; se generan las que falten',
+        )
+        parser.add_argument('--filas', type=int, default=100_000, help='Filas del CSV del escenario importacion')
+        parser.add_argument('--ventas', type=int, default=50_000, help='Ventas del backlog del escenario sincronizacion')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos concurrentes de los escenarios carga, concurrencia y caja')
+        parser.add_argument('--segundos', type=float, default=10, help='Duración de cada variante de los escenarios carga, concurrencia y caja')
+        parser.add_argument(
+            '--guardar', action='store_true',
+            help='Guarda los resultados como línea base (escenarios que la usan, como admin)',
+        )
+
+    def handle(self, *args, **options):
+        ESCENARIOS[options['escenario']](self.stdout.write, options)
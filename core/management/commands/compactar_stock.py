@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.stock import compactar_stock
+
+
+class Command(BaseCommand):
+    help = 'Lleva los cortes de stock hasta el último movimiento registrado'
+
+    def handle(self, *args, **options):
+        cortes = compactar_stock()
+        self.stdout.write(self.style.SUCCESS(f'{cortes} cortes de stock escritos.'))
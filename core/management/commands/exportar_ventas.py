@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exportacion import FORMATOS, exportar, lineas_de_venta
+
+
+def _fecha(texto):
+    try:
+        return datetime.date.fromisoformat(texto)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {texto} (use AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Exporta las líneas de venta con su venta, producto, categoría y método de pago'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help='Primer día incluido (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, help='Último día incluido (AAAA-MM-DD)')
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+        parser.add_argument('--salida', help='Archivo de destino; por defecto la salida estándar')
+
+    def handle(self, *args, **options):
+        lineas = lineas_de_venta(desde=options['desde'], hasta=options['hasta'])
+        destino = open(options['salida'], 'w', encoding='utf-8', newline='') if options['salida'] else self.stdout
+        try:
+            for bloque in exportar(lineas, options['formato']):
+                destino.write(bloque)
+        finally:
+            if options['salida']:
+                destino.close()
+        if options['salida']:
+            self.stderr.write(self.style.SUCCESS(f'Exportación escrita en {options["salida"]}'))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importacion import TAMANO_LOTE, ArchivoInvalido, escribir_errores, importar_productos
+
+
+class Command(BaseCommand):
+    help = 'Importa o actualiza productos, categorías y fichas nutricionales desde un CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV en UTF-8 con encabezados; ver core/importacion.py')
+        parser.add_argument('--errores', help='Escribe aquí el reporte de filas rechazadas (CSV)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por transacción')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                resultado = importar_productos(archivo, options['lote'])
+        except (OSError, ArchivoInvalido) as e:
+            raise CommandError(str(e))
+        segundos = time.perf_counter() - inicio
+
+        if options['errores']:
+            with open(options['errores'], 'w', encoding='utf-8', newline='') as destino:
+                escribir_errores(resultado, destino)
+        else:
+            for linea, codigo, mensaje in resultado.errores:
+                self.stderr.write(f'Línea {linea} ({codigo or "sin código"}): {mensaje}')
+        estilo = self.style.SUCCESS if not resultado.errores else self.style.WARNING
+        self.stdout.write(estilo(
+            f'{resultado.importadas} de {resultado.filas} filas importadas, {len(resultado.errores)} con errores '
+            f'en {segundos:.2f} s ({resultado.importadas / max(segundos, 1e-9):,.0f} filas/s)'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.clientes import recalcular_clientes
+
+
+class Command(BaseCommand):
+    help = 'Rehace los resúmenes de compras de los clientes desde las ventas vigentes'
+
+    def handle(self, *args, **options):
+        escritos = recalcular_clientes()
+        self.stdout.write(self.style.SUCCESS(f'{escritos} resúmenes de clientes escritos.'))
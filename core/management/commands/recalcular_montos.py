@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.totales import recalcular_montos, ventas_descuadradas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Venta.monto_total desde DetalleVenta o verifica que esté cuadrado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Solo reporta las ventas descuadradas, sin modificarlas',
+        )
+
+    def handle(self, *args, **options):
+        if options['verificar']:
+            descuadradas = list(ventas_descuadradas().values_list('id', flat=True)[:20])
+            total = ventas_descuadradas().count()
+            if total:
+                ids = ', '.join(str(i) for i in descuadradas)
+                raise CommandError(f'{total} ventas con monto_total descuadrado (ej: {ids}).')
+            self.stdout.write(self.style.SUCCESS('Todos los montos están cuadrados.'))
+            return
+
+        actualizadas = recalcular_montos()
+        self.stdout.write(self.style.SUCCESS(f'Monto total recalculado para {actualizadas} ventas.'))
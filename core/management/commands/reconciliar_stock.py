@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.stock import reconciliar_stock
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye Producto.stock_actual desde el registro de movimientos de stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Suma el registro entero en lugar de partir de los cortes de stock',
+        )
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Solo reporta los productos con stock distinto al de los movimientos, sin modificarlos',
+        )
+
+    def handle(self, *args, **options):
+        diferencias = reconciliar_stock(completo=options['completo'], aplicar=not options['verificar'])
+        ejemplos = ', '.join(f'{pid}: {actual} -> {esperado}' for pid, actual, esperado in diferencias[:20])
+        negativos = sum(1 for _, _, esperado in diferencias if esperado < 0)
+        if options['verificar']:
+            if diferencias:
+                raise CommandError(f'{len(diferencias)} productos con stock distinto al de los movimientos ({ejemplos}).')
+            self.stdout.write(self.style.SUCCESS('El stock de todos los productos coincide con los movimientos.'))
+            return
+        if negativos:
+            self.stdout.write(self.style.WARNING(f'{negativos} productos quedarían con stock negativo y no se modificaron.'))
+        self.stdout.write(self.style.SUCCESS(f'Stock corregido para {len(diferencias) - negativos} productos.'))
+        if diferencias:
+            self.stdout.write(f'Ejemplos: {ejemplos}')
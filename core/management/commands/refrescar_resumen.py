@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.resumen import refrescar_resumen
+
+
+class Command(BaseCommand):
+    help = 'Incorpora a los resúmenes diarios las ventas nuevas y los días con ventas modificadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Reconstruye todos los resúmenes en lugar de procesar solo lo nuevo',
+        )
+
+    def handle(self, *args, **options):
+        escritas = refrescar_resumen(completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(f'{escritas} filas de resumen escritas.'))
@@ -1,4 +1,7 @@
+import time
+
 from django.core.management.base import BaseCommand
+from core.datos_sinteticos import generar_ventas
 from core.models import Categoria, Rol, Usuario, Direccion, Producto, Nutricional, MetodoPago, Venta, DetalleVenta
 from django.contrib.auth.hashers import make_password
 from decimal import Decimal
@@ -6,6 +9,17 @@ from decimal import Decimal
 class Command(BaseCommand):
     help = 'Seed database with initial data'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, default=0,
+            help='Además de los datos base, genera esta cantidad de ventas sintéticas',
+        )
+        parser.add_argument('--productos', type=int, default=2000, help='Productos sintéticos (con --scale)')
+        parser.add_argument('--usuarios', type=int, help='Clientes sintéticos (con --scale); por defecto scale/10')
+        parser.add_argument('--lineas-por-venta', type=int, default=3, help='Promedio de líneas por venta')
+        parser.add_argument('--dias', type=int, default=365, help='Días hacia atrás en que se reparten las ventas')
+        parser.add_argument('--semilla', type=int, default=1)
+
     def handle(self, *args, **kwargs):
         # Roles
         admin_rol, _ = Rol.objects.get_or_create(nombre='Admin', descripcion='Administrador del sistema')
@@ -121,7 +135,6 @@ class Command(BaseCommand):
         venta1, _ = Venta.objects.get_or_create(
             usuario=cliente_user,
             metodo_pago=tarjeta,
-            monto_total=Decimal('1200.00'),
             estado='Pagado',
             canal_venta='Local'
         )
@@ -129,7 +142,6 @@ class Command(BaseCommand):
         venta2, _ = Venta.objects.get_or_create(
             usuario=cliente_user,
             metodo_pago=efectivo,
-            monto_total=Decimal('8500.00'),
             estado='Pendiente',
             canal_venta='Instagram'
         )
@@ -153,3 +165,29 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('Users created:'))
         self.stdout.write(f'  - Admin: admin@forneria.cl / admin123')
         self.stdout.write(f'  - Cliente: cliente@forneria.cl / cliente123')
+
+        if kwargs['scale']:
+            self.generar_escala(kwargs)
+
+    def generar_escala(self, opciones):
+        num_usuarios = opciones['usuarios'] or max(100, opciones['scale'] // 10)
+        inicio = time.perf_counter()
+
+        def progreso(ventas, lineas):
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(f'  {ventas} ventas, {lineas} líneas ({(ventas + lineas) / segundos:,.0f} filas/s)')
+
+        ventas, lineas = generar_ventas(
+            num_ventas=opciones['scale'],
+            lineas_por_venta=opciones['lineas_por_venta'],
+            num_productos=opciones['productos'],
+            num_usuarios=num_usuarios,
+            dias=opciones['dias'],
+            semilla=opciones['semilla'],
+            progreso=progreso,
+        )
+        segundos = time.perf_counter() - inicio
+        filas = ventas + lineas
+        self.stdout.write(self.style.SUCCESS(
+            f'{ventas} ventas y {lineas} líneas creadas en {segundos:.1f} s ({filas / segundos:,.0f} filas/s)'
+        ))
@@ -1,29 +1,76 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.urls import reverse
 from django.http import HttpResponseForbidden
 
+from . import instrumentacion, politica
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide una muestra de las peticiones (settings.INSTRUMENTACION_MUESTREO):
+    tiempo total y de base de datos, consultas, repetidas y las más lentas.
+    Ver core/instrumentacion.py. Va antes que el resto para incluirlos.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Bajo ASGI atiende en el loop: un middleware solo síncrono obligaría a
+        # pasar cada petición por un hilo
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        if not instrumentacion.muestrear():
+            return self.get_response(request)
+        return instrumentacion.medir(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not instrumentacion.muestrear():
+            return await self.get_response(request)
+        return await instrumentacion.amedir(request, self.get_response)
+
+
 class RoleBasedAccessMiddleware:
+    """
+    Aplica core/politica.py a las vistas del admin. Decide sobre la vista ya
+    resuelta (app, modelo y vista), con un dict compilado una vez. En modo
+    async process_view es una corrutina que obtiene el usuario con
+    request.auser(), sin pasar por un hilo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+            # El handler adapta process_view según sea o no corrutina
+            self.process_view = self.aprocess_view
 
     def __call__(self, request):
-        # Solo aplicar en rutas de admin
-        if request.path.startswith('/admin/'):
-            if request.user.is_authenticated and hasattr(request.user, 'rol'):
-                # Si el usuario tiene rol de Cliente, restringir acceso
-                if request.user.rol and request.user.rol.nombre == 'Cliente':
-                    # Permitir solo ver sus propios datos
-                    if request.path.endswith('/change/') and 'usuario' in request.path:
-                        # Verificar que esté editando su propio perfil
-                        if str(request.user.id) not in request.path:
-                            return HttpResponseForbidden("No tienes permisos para acceder a este recurso.")
-                    
-                    # Bloquear acceso a ciertos modelos
-                    restricted_models = ['venta', 'detalleventa', 'producto', 'categoria', 'nutricional']
-                    for model in restricted_models:
-                        if f'/{model}/' in request.path and not request.user.is_staff:
-                            return HttpResponseForbidden("No tienes permisos para acceder a este módulo.")
-
-        response = self.get_response(request)
-        return response
+        if self.asincrono:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if politica.acceso_vista(request, view_kwargs) is politica.Acceso.DENEGADO:
+            return HttpResponseForbidden("No tienes permisos para acceder a este recurso.")
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if await politica.aacceso_vista(request, view_kwargs) is politica.Acceso.DENEGADO:
+            return HttpResponseForbidden("No tienes permisos para acceder a este recurso.")
+        return None
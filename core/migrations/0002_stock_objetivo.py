@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='stock_objetivo',
+            field=models.PositiveIntegerField(blank=True, help_text='Stock al que se reponen los productos de la categoría', null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='stock_objetivo',
+            field=models.PositiveIntegerField(blank=True, help_text='Stock al que se repone; si está vacío se usa el de la categoría', null=True),
+        ),
+    ]
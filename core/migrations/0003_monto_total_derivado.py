@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 14:20
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Round
+
+
+def recalcular_montos(apps, schema_editor):
+    Venta = apps.get_model('core', 'Venta')
+    DetalleVenta = apps.get_model('core', 'DetalleVenta')
+    campo = models.DecimalField(max_digits=10, decimal_places=2)
+    suma = (
+        DetalleVenta.objects.filter(venta=models.OuterRef('pk'))
+        .order_by()
+        .values('venta')
+        .annotate(total=models.Sum(models.F('cantidad') * models.F('precio_unitario')))
+        .values('total')
+    )
+    Venta.objects.update(monto_total=Round(
+        Coalesce(models.Subquery(suma, output_field=campo), models.Value(Decimal('0')), output_field=campo), 2,
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_stock_objetivo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='venta',
+            name='monto_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(recalcular_montos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-17 14:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_monto_total_derivado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultimo_detalle_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ResumenVentaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('canal_venta', models.CharField(max_length=50)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num_ventas', models.PositiveIntegerField(default=0)),
+                ('metodo_pago', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.metodopago')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.producto')),
+            ],
+            options={
+                'verbose_name': 'resumen de venta diario',
+                'verbose_name_plural': 'resumen de ventas diario',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto', 'canal_venta', 'metodo_pago'), name='resumen_venta_diario_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-17 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0004_resumen_ventas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['nombre'], name='categoria_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre'], name='producto_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['tipo', 'nombre'], name='producto_tipo_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'nombre'], name='producto_categoria_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['created_at'], name='producto_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['first_name'], name='usuario_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha'], name='venta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['canal_venta', 'fecha'], name='venta_canal_fecha_idx'),
+        ),
+    ]
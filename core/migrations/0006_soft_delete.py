@@ -0,0 +1,97 @@
+# Generated by Django 5.2.7 on 2026-10-17 14:28
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0005_indices_admin'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='usuario',
+            managers=[
+                ('objects', core.models.UsuarioManager()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='categoria',
+            name='categoria_nombre_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='producto_nombre_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='producto_tipo_nombre_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='producto_categoria_nombre_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='producto_created_at_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='usuario',
+            name='usuario_first_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='venta',
+            name='venta_fecha_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='venta',
+            name='venta_estado_fecha_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='venta',
+            name='venta_canal_fecha_idx',
+        ),
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['nombre'], name='categoria_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detalleventa',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['venta'], name='detalleventa_venta_vig_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['nombre'], name='producto_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['tipo', 'nombre'], name='producto_tipo_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['categoria', 'nombre'], name='producto_categoria_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='producto_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['first_name'], name='usuario_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['fecha'], name='venta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['canal_venta', 'fecha'], name='venta_canal_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:10
+
+from django.db import migrations
+
+from core.busqueda import crear_indices, eliminar_indices
+
+
+def crear(apps, schema_editor):
+    crear_indices(schema_editor)
+
+
+def eliminar(apps, schema_editor):
+    eliminar_indices(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, eliminar),
+    ]
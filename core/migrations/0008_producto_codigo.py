@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:03
+
+from django.db import migrations, models
+
+from core.busqueda import PRODUCTOS, crear_indices, eliminar_indices
+
+
+# SQLite rehace core_producto al agregar una columna única: el índice de
+# texto se elimina antes y se crea de nuevo después (ver core/busqueda.py)
+def crear(apps, schema_editor):
+    crear_indices(schema_editor, [PRODUCTOS])
+
+
+def eliminar(apps, schema_editor):
+    eliminar_indices(schema_editor, [PRODUCTOS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar, crear),
+        migrations.AddField(
+            model_name='producto',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.RunPython(crear, eliminar),
+    ]
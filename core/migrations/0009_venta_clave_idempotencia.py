@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_producto_codigo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
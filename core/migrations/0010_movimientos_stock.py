@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def stock_inicial(apps, schema_editor):
+    # El stock actual de cada producto es el primer movimiento del registro
+    Producto = apps.get_model('core', 'Producto')
+    MovimientoStock = apps.get_model('core', 'MovimientoStock')
+    lote = []
+    for producto_id, stock in Producto.objects.filter(stock_actual__gt=0).values_list('id', 'stock_actual').iterator(chunk_size=2000):
+        lote.append(MovimientoStock(producto_id=producto_id, cantidad=stock, tipo='inicial'))
+        if len(lote) >= 2000:
+            MovimientoStock.objects.bulk_create(lote)
+            lote = []
+    MovimientoStock.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField()),
+                ('ultimo_movimiento_id', models.BigIntegerField()),
+                ('fecha', models.DateTimeField(auto_now=True)),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='core.producto')),
+            ],
+            options={
+                'verbose_name': 'corte de stock',
+                'verbose_name_plural': 'cortes de stock',
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField(help_text='Unidades que entran (positivo) o salen (negativo)')),
+                ('tipo', models.CharField(choices=[('venta', 'Venta'), ('reposicion', 'Reposición'), ('ajuste', 'Ajuste manual'), ('agotado', 'Marcado agotado'), ('importacion', 'Importación'), ('inicial', 'Stock inicial')], max_length=20)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.producto')),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.venta')),
+            ],
+            options={
+                'verbose_name': 'movimiento de stock',
+                'verbose_name_plural': 'movimientos de stock',
+                'indexes': [models.Index(fields=['producto', 'id'], name='movimiento_producto_idx')],
+            },
+        ),
+        migrations.RunPython(stock_inicial, migrations.RunPython.noop),
+    ]
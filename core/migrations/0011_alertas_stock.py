@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def alertas_iniciales(apps, schema_editor):
+    # Aún no hay umbrales definidos: todos usan el valor por defecto de core/alertas.py
+    Producto = apps.get_model('core', 'Producto')
+    AlertaStock = apps.get_model('core', 'AlertaStock')
+    bajos = Producto.objects.filter(deleted_at__isnull=True, stock_actual__lt=10).values_list('id', 'stock_actual')
+    lote = []
+    for producto_id, stock in bajos.iterator(chunk_size=2000):
+        lote.append(AlertaStock(producto_id=producto_id, umbral=10, faltante=10 - stock))
+        if len(lote) >= 2000:
+            AlertaStock.objects.bulk_create(lote)
+            lote = []
+    AlertaStock.objects.bulk_create(lote)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_movimientos_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='umbral_alerta',
+            field=models.PositiveIntegerField(blank=True, help_text='Bajo este stock sus productos quedan en alerta de reposición', null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='umbral_alerta',
+            field=models.PositiveIntegerField(blank=True, help_text='Bajo este stock queda en alerta de reposición; si está vacío se usa el de la categoría', null=True),
+        ),
+        migrations.CreateModel(
+            name='AlertaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('umbral', models.PositiveIntegerField()),
+                ('faltante', models.PositiveIntegerField()),
+                ('desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alerta', to='core.producto')),
+            ],
+            options={
+                'verbose_name': 'alerta de stock',
+                'verbose_name_plural': 'alertas de stock',
+                'indexes': [models.Index(fields=['faltante', 'id'], name='alerta_faltante_idx')],
+            },
+        ),
+        migrations.RunPython(alertas_iniciales, migrations.RunPython.noop),
+    ]
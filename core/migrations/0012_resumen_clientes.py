@@ -0,0 +1,96 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def resumir_clientes(apps, schema_editor):
+    # Punto de partida desde las ventas vigentes; luego se acumula con cada venta (core/clientes.py)
+    Venta = apps.get_model('core', 'Venta')
+    DetalleVenta = apps.get_model('core', 'DetalleVenta')
+    ResumenCliente = apps.get_model('core', 'ResumenCliente')
+    CompraProducto = apps.get_model('core', 'CompraProducto')
+    totales = (
+        Venta.objects.filter(deleted_at__isnull=True).order_by().values('usuario_id')
+        .annotate(total=Sum('monto_total'), num=Count('id'), ultima=Max('fecha'))
+    )
+    ResumenCliente.objects.bulk_create([
+        ResumenCliente(usuario_id=f['usuario_id'], total_gastado=f['total'], num_ventas=f['num'], ultima_compra=f['ultima'], version=1)
+        for f in totales
+    ], batch_size=2000)
+    por_producto = (
+        DetalleVenta.objects.filter(deleted_at__isnull=True, venta__deleted_at__isnull=True).order_by()
+        .values('venta__usuario_id', 'producto_id').annotate(unidades=Sum('cantidad'))
+    )
+    lote = []
+    for f in por_producto.iterator(chunk_size=2000):
+        lote.append(CompraProducto(usuario_id=f['venta__usuario_id'], producto_id=f['producto_id'], unidades=f['unidades']))
+        if len(lote) >= 2000:
+            CompraProducto.objects.bulk_create(lote)
+            lote = []
+    CompraProducto.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_alertas_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompraProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unidades', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'compra por producto',
+                'verbose_name_plural': 'compras por producto',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_gastado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num_ventas', models.PositiveIntegerField(default=0)),
+                ('ultima_compra', models.DateTimeField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'resumen de cliente',
+                'verbose_name_plural': 'resúmenes de clientes',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['usuario', 'fecha', 'id'], name='venta_usuario_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='compraproducto',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.producto'),
+        ),
+        migrations.AddField(
+            model_name='compraproducto',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='resumencliente',
+            name='usuario',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_compras', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='compraproducto',
+            index=models.Index(fields=['usuario', '-unidades'], name='compra_producto_favoritos_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='compraproducto',
+            constraint=models.UniqueConstraint(fields=('usuario', 'producto'), name='compra_producto_unica'),
+        ),
+        migrations.RunPython(resumir_clientes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_resumen_clientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaPendienteResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+            ],
+        ),
+    ]
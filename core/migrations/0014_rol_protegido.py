@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_dias_pendientes_resumen'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usuario',
+            name='rol',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.rol'),
+        ),
+    ]
@@ -1,19 +1,211 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
-from django.core.exceptions import ValidationError
+from collections import defaultdict
+from decimal import Decimal
 
-class Categoria(models.Model):
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.dispatch import Signal
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.utils import timezone
+
+# Condición de las filas vigentes, usada por los managers y los índices parciales
+VIGENTE = models.Q(deleted_at__isnull=True)
+
+# Cambios por lote que no emiten post_save ni post_delete (update, soft delete,
+# bulk_create y bulk_update, SQL directo de las importaciones y borrar_filas). sender es el modelo.
+filas_modificadas = Signal()
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        filas = super().update(**kwargs)
+        filas_modificadas.send(sender=self.model)
+        return filas
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        creados = super().bulk_create(objs, *args, **kwargs)
+        filas_modificadas.send(sender=self.model)
+        return creados
+
+    bulk_create.alters_data = True
+
+    def soft_delete(self, momento=None):
+        """
+        Marca las filas como eliminadas en un solo UPDATE. Como PROTECT en
+        el borrado real, falla con ProtectedError si otras filas aún las
+        referencian por una clave foránea protegida.
+        """
+        self._verificar_protegidas()
+        return self.update(deleted_at=momento or timezone.now())
+
+    def _verificar_protegidas(self):
+        for relacion in self.model._meta.related_objects:
+            if relacion.on_delete is not models.PROTECT:
+                continue
+            # El mismo manager que usa Collector: también cuentan las filas eliminadas
+            referencias = relacion.related_model._base_manager.filter(**{f'{relacion.field.name}__in': self})
+            # Una muestra basta para el mensaje; una sola consulta aunque sean miles
+            muestra = set(referencias[:20])
+            if muestra:
+                raise models.ProtectedError(
+                    f'No se puede eliminar {self.model._meta.verbose_name}: la referencian '
+                    f'{relacion.related_model._meta.verbose_name_plural} ({relacion.field.name}).',
+                    muestra,
+                )
+
+    def restore(self):
+        return self.update(deleted_at=None)
+
+    def delete(self):
+        # Eliminar desde el admin o el ORM no borra filas; hard_delete() sí lo hace
+        count = self.soft_delete()
+        return count, {self.model._meta.label: count}
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def hard_delete(self):
+        return super().delete()
+
+    hard_delete.alters_data = True
+    hard_delete.queryset_only = True
+
+
+def insertar_filas(modelo, campos, filas):
+    """
+    INSERT con executemany de filas con los valores de campos; los campos
+    auto_now y auto_now_add toman la hora actual. bulk_create compilaría cada
+    valor de cada objeto en el SQL; aquí solo se adaptan los valores.
+    """
+    qn = connection.ops.quote_name
+    campos = [modelo._meta.get_field(campo) for campo in campos]
+    automaticos = [
+        f for f in modelo._meta.concrete_fields
+        if (getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)) and f not in campos
+    ]
+    columnas = ', '.join(qn(f.column) for f in campos + automaticos)
+    sql = f'INSERT INTO {qn(modelo._meta.db_table)} ({columnas}) VALUES ({", ".join(["%s"] * (len(campos) + len(automaticos)))})'
+    # La conexión real y no el proxy `connection`, que resuelve el hilo en cada acceso
+    conexion = connections[DEFAULT_DB_ALIAS]
+    momento = timezone.now()
+    ahora = [f.get_db_prep_save(momento, conexion) for f in automaticos]
+    preparar = [f.get_db_prep_save for f in campos]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [*(prep(valor, conexion) for prep, valor in zip(preparar, fila)), *ahora]
+            for fila in filas
+        ])
+    filas_modificadas.send(sender=modelo)
+
+
+def borrar_filas(queryset):
+    """
+    DELETE directo de las filas del queryset en una sentencia. delete()
+    leería antes las filas para las señales y las cascadas; aquí no se leen,
+    así que es solo para tablas derivadas sin FK que apunten a ellas.
+    Retorna las filas borradas.
+    """
+    modelo = queryset.model
+    conexion = connections[queryset.db]
+    qn = conexion.ops.quote_name
+    select, params = queryset.order_by().values('pk').query.get_compiler(connection=conexion).as_sql()
+    if conexion.vendor == 'mysql':
+        # MySQL no permite leer en una subconsulta la tabla que se borra, salvo en una tabla derivada
+        select = f'SELECT * FROM ({select}) AS borrar'
+    sql = f'DELETE FROM {qn(modelo._meta.db_table)} WHERE {qn(modelo._meta.pk.column)} IN ({select})'
+    with conexion.cursor() as cursor:
+        cursor.execute(sql, params)
+        filas = cursor.rowcount
+    filas_modificadas.send(sender=modelo)
+    return filas
+
+
+class VigentesMixin:
+    def get_queryset(self):
+        return super().get_queryset().filter(VIGENTE)
+
+
+class SoftDeleteManager(VigentesMixin, models.Manager.from_queryset(SoftDeleteQuerySet)):
+    pass
+
+
+class SoftDeleteModel(models.Model):
+    """
+    Base para modelos con deleted_at: objects excluye las filas eliminadas y
+    all_objects las incluye. delete() marca deleted_at en lugar de borrar.
+    """
+    objects = SoftDeleteManager()
+    all_objects = models.Manager.from_queryset(SoftDeleteQuerySet)()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, using=None, keep_parents=False):
+        momento = timezone.now()
+        count = type(self).all_objects.using(using).filter(pk=self.pk).soft_delete(momento)
+        self.deleted_at = momento
+        return count, {self._meta.label: count}
+
+    def hard_delete(self, using=None, keep_parents=False):
+        return super().delete(using=using, keep_parents=keep_parents)
+
+    def _perform_unique_checks(self, unique_checks):
+        # Como en Django, pero contra all_objects: la restricción UNIQUE de la
+        # base también cubre las filas eliminadas, que objects no ve
+        errors = {}
+        for model_class, unique_check in unique_checks:
+            lookup = {}
+            for field_name in unique_check:
+                f = self._meta.get_field(field_name)
+                valor = getattr(self, f.attname)
+                if valor is None or (valor == '' and connection.features.interprets_empty_strings_as_nulls):
+                    continue
+                if f in model_class._meta.pk_fields and not self._state.adding:
+                    continue
+                lookup[str(field_name)] = valor
+            if len(unique_check) != len(lookup):
+                continue
+            qs = getattr(model_class, 'all_objects', model_class._default_manager).filter(**lookup)
+            if not self._state.adding and self._is_pk_set(model_class._meta):
+                qs = qs.exclude(pk=self._get_pk_val(model_class._meta))
+            if qs.exists():
+                key = unique_check[0] if len(unique_check) == 1 else NON_FIELD_ERRORS
+                errors.setdefault(key, []).append(self.unique_error_message(model_class, unique_check))
+        return errors
+
+
+class Categoria(SoftDeleteModel):
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True, null=True)
+    stock_objetivo = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Stock al que se reponen los productos de la categoría"
+    )
+    umbral_alerta = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Bajo este stock sus productos quedan en alerta de reposición"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['nombre'], condition=VIGENTE, name='categoria_nombre_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Umbral con que se leyó la fila: si cambia, se revisan las alertas de sus productos
+        if 'umbral_alerta' in instance.__dict__:
+            instance._umbral_original = instance.umbral_alerta
+        return instance
 
-class Nutricional(models.Model):
+
+class Nutricional(SoftDeleteModel):
     ingredientes = models.TextField()
     tiempo_preparacion = models.PositiveIntegerField(help_text="Tiempo en minutos")
     proteinas = models.FloatField(default=0)
@@ -27,7 +219,7 @@ class Nutricional(models.Model):
         return f"Nutricional #{self.id}"
 
 
-class Rol(models.Model):
+class Rol(SoftDeleteModel):
     nombre = models.CharField(max_length=50)
     descripcion = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -38,7 +230,7 @@ class Rol(models.Model):
         return self.nombre
 
 
-class Direccion(models.Model):
+class Direccion(SoftDeleteModel):
     calle = models.CharField(max_length=150)
     numero = models.CharField(max_length=10)
     comuna = models.CharField(max_length=100)
@@ -51,18 +243,31 @@ class Direccion(models.Model):
         return f"{self.calle} {self.numero}, {self.comuna}"
 
 
-class Usuario(AbstractUser):
+class UsuarioManager(VigentesMixin, UserManager.from_queryset(SoftDeleteQuerySet)):
+    pass
+
+
+class Usuario(SoftDeleteModel, AbstractUser):
     # Campos adicionales para el usuario personalizado
     paterno = models.CharField(max_length=100)
     materno = models.CharField(max_length=100, blank=True, null=True)
     run = models.CharField(max_length=12, unique=True)
     fono = models.CharField(max_length=20, blank=True, null=True)
-    rol = models.ForeignKey(Rol, on_delete=models.CASCADE, null=True, blank=True)
+    rol = models.ForeignKey(Rol, on_delete=models.PROTECT, null=True, blank=True)
     direccion = models.ForeignKey(Direccion, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(blank=True, null=True)
 
+    objects = UsuarioManager()
+
+    class Meta(AbstractUser.Meta):
+        swappable = 'AUTH_USER_MODEL'
+        indexes = [
+            # Orden por defecto del changelist de usuarios
+            models.Index(fields=['first_name'], condition=VIGENTE, name='usuario_first_name_idx'),
+        ]
+
     # Usar username como campo de login (más simple)
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email', 'first_name', 'paterno', 'run']
@@ -76,21 +281,75 @@ class Usuario(AbstractUser):
             raise ValidationError("Los clientes no pueden tener permisos de staff.")
 
 
-class Producto(models.Model):
+class ProductoQuerySet(SoftDeleteQuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            # Sin RETURNING (MySQL) no hay id: reconciliar_stock omite los productos sin movimientos
+            insertar_filas(MovimientoStock, ('producto', 'cantidad', 'tipo'), [
+                (obj.pk, obj.stock_actual, MovimientoStock.INICIAL)
+                for obj in objs if obj.pk is not None and obj.stock_actual
+            ])
+            from .alertas import revisar_alertas
+            revisar_alertas([obj.pk for obj in objs if obj.pk is not None])
+        return objs
+
+    bulk_create.alters_data = True
+
+
+class Producto(SoftDeleteModel):
+    # Código del catálogo o del proveedor; identifica al producto en las importaciones
+    codigo = models.CharField(max_length=50, unique=True, blank=True, null=True)
     nombre = models.CharField(max_length=150)
     marca = models.CharField(max_length=100, blank=True, null=True)
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     tipo = models.CharField(max_length=50)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
     stock_actual = models.PositiveIntegerField(default=0)
+    stock_objetivo = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Stock al que se repone; si está vacío se usa el de la categoría"
+    )
+    umbral_alerta = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Bajo este stock queda en alerta de reposición; si está vacío se usa el de la categoría"
+    )
     nutricional = models.ForeignKey(Nutricional, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(blank=True, null=True)
 
+    objects = SoftDeleteManager.from_queryset(ProductoQuerySet)()
+    all_objects = models.Manager.from_queryset(ProductoQuerySet)()
+
+    class Meta:
+        indexes = [
+            # Orden y filtros de ProductoAdmin: ordering nombre, list_filter tipo/categoria/created_at
+            models.Index(fields=['nombre'], condition=VIGENTE, name='producto_nombre_idx'),
+            models.Index(fields=['tipo', 'nombre'], condition=VIGENTE, name='producto_tipo_nombre_idx'),
+            models.Index(fields=['categoria', 'nombre'], condition=VIGENTE, name='producto_categoria_nombre_idx'),
+            models.Index(fields=['created_at'], condition=VIGENTE, name='producto_created_at_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stock con que se leyó la fila: al guardar, la diferencia queda como movimiento de ajuste
+        if 'stock_actual' in instance.__dict__:
+            instance._stock_original = instance.stock_actual
+        return instance
+
+    def save(self, *args, **kwargs):
+        original = getattr(self, '_stock_original', None)
+        sin_cambio = original is not None and original == self.__dict__.get('stock_actual')
+        if sin_cambio and not self._state.adding and kwargs.get('update_fields') is None:
+            # Sin cambios de stock no se escribe stock_actual: pisaría los descuentos hechos desde la lectura
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'stock_actual'
+            ]
+        super().save(*args, **kwargs)
+
     def clean(self):
         if self.precio <= 0:
             raise ValidationError("El precio debe ser mayor a 0.")
@@ -98,7 +357,7 @@ class Producto(models.Model):
             raise ValidationError("El stock no puede ser negativo.")
 
 
-class MetodoPago(models.Model):
+class MetodoPago(SoftDeleteModel):
     nombre = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -108,26 +367,211 @@ class MetodoPago(models.Model):
         return self.nombre
 
 
-class Venta(models.Model):
+# Campos de Venta que cambian el resumen de compras de sus clientes
+CAMPOS_RESUMEN_CLIENTE = {'usuario', 'usuario_id', 'deleted_at', 'fecha'}
+# Los mismos, con monto_total, como atributos de una instancia: save() los compara con los leídos
+ATRIBUTOS_RESUMEN_CLIENTE = ('usuario_id', 'fecha', 'deleted_at', 'monto_total')
+# Campos de Venta que cambian su día en ResumenVentaDiario
+CAMPOS_RESUMEN_DIARIO = {'canal_venta', 'metodo_pago', 'metodo_pago_id', 'fecha', 'deleted_at'}
+
+
+class VentaQuerySet(SoftDeleteQuerySet):
+    # Una venta eliminada conserva su monto_total; sus líneas se eliminan y restauran con
+    # ella sin ajustarlo, así que la cascada es un UPDATE por tabla
+
+    def soft_delete(self, momento=None):
+        """Elimina las ventas y sus líneas vigentes."""
+        momento = momento or timezone.now()
+        with transaction.atomic(using=self.db):
+            DetalleVenta.objects.filter(venta__in=self).update_sin_ajustar_monto(deleted_at=momento)
+            return super().soft_delete(momento)
+
+    def restore(self):
+        """Restaura las ventas y las líneas que se eliminaron junto con ellas."""
+        with transaction.atomic(using=self.db):
+            DetalleVenta.all_objects.filter(
+                venta__in=self, deleted_at=models.F('venta__deleted_at'),
+            ).update_sin_ajustar_monto(deleted_at=None)
+            return super().restore()
+
+    def update(self, **kwargs):
+        # Los deltas de monto_total llegan junto con la suma al resumen del cliente (ver core/clientes.py)
+        if set(kwargs) <= {'monto_total'}:
+            return super().update(**kwargs)
+        from .clientes import invalidar_historial, recalcular_clientes
+        from .resumen import marcar_ventas
+
+        with transaction.atomic(using=self.db):
+            ventas = list(self.values_list('pk', 'usuario_id'))
+            usuarios = {usuario_id for _, usuario_id in ventas}
+            ventas = [pk for pk, _ in ventas]
+            if CAMPOS_RESUMEN_DIARIO.intersection(kwargs):
+                marcar_ventas(ventas)
+            filas = super().update(**kwargs)
+            if 'fecha' in kwargs:
+                # También el día al que se movieron
+                marcar_ventas(ventas)
+            nuevo = kwargs.get('usuario_id', kwargs.get('usuario'))
+            if nuevo is not None:
+                usuarios.add(getattr(nuevo, 'pk', nuevo))
+            # Eliminar, restaurar o reasignar cambia los totales; otros campos solo lo que muestra el historial
+            if CAMPOS_RESUMEN_CLIENTE.intersection(kwargs):
+                recalcular_clientes(usuarios)
+            else:
+                invalidar_historial(usuarios)
+        return filas
+
+    update.alters_data = True
+
+    def hard_delete(self):
+        # Los receptores de post_delete omiten los borrados por queryset: el resumen se rehace una vez
+        from .clientes import recalcular_clientes
+
+        with transaction.atomic(using=self.db):
+            usuarios = set(self.values_list('usuario_id', flat=True))
+            resultado = super().hard_delete()
+            recalcular_clientes(usuarios)
+        return resultado
+
+    hard_delete.alters_data = True
+    hard_delete.queryset_only = True
+
+
+class Venta(SoftDeleteModel):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     metodo_pago = models.ForeignKey(MetodoPago, on_delete=models.SET_NULL, null=True)
-    monto_total = models.DecimalField(max_digits=10, decimal_places=2)
+    # Derivado de las líneas de DetalleVenta; se mantiene con deltas en cada escritura
+    monto_total = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
     estado = models.CharField(max_length=50, default="Pendiente")
     canal_venta = models.CharField(max_length=50, default="Online")
-    fecha = models.DateTimeField(auto_now_add=True)
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
+    # Clave que envía la caja con cada venta: un reintento con la misma clave no la duplica
+    clave_idempotencia = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(blank=True, null=True)
 
+    objects = SoftDeleteManager.from_queryset(VentaQuerySet)()
+    all_objects = models.Manager.from_queryset(VentaQuerySet)()
+
+    class Meta:
+        # Índices parciales sobre las filas vigentes: no crecen con el historial eliminado
+        indexes = [
+            # Orden por -fecha de VentaAdmin; los compuestos sirven a los filtros estado/canal_venta
+            # manteniendo el orden, y a las consultas DISTINCT de list_filter como índice cubriente
+            models.Index(fields=['fecha'], condition=VIGENTE, name='venta_fecha_idx'),
+            models.Index(fields=['estado', 'fecha'], condition=VIGENTE, name='venta_estado_fecha_idx'),
+            models.Index(fields=['canal_venta', 'fecha'], condition=VIGENTE, name='venta_canal_fecha_idx'),
+            # Historial de compras de un cliente, paginado por (fecha, id)
+            models.Index(fields=['usuario', 'fecha', 'id'], condition=VIGENTE, name='venta_usuario_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Venta #{self.id} - {self.usuario}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.recordar_originales()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.recordar_originales()
+
+    def recordar_originales(self):
+        # Valores con que se leyó la fila: si save() cambia la fecha, también se
+        # recalcula el día anterior; si cambia el cliente, también su resumen
+        if 'fecha' in self.__dict__:
+            self._fecha_original = self.fecha
+        if all(atributo in self.__dict__ for atributo in ATRIBUTOS_RESUMEN_CLIENTE):
+            self._cliente_original = tuple(getattr(self, atributo) for atributo in ATRIBUTOS_RESUMEN_CLIENTE)
+
     def clean(self):
-        if self.monto_total <= 0:
-            raise ValidationError("El monto total debe ser mayor a 0.")
+        if self.monto_total < 0:
+            raise ValidationError("El monto total no puede ser negativo.")
+
+
+def aplicar_deltas_monto(deltas):
+    """Suma a Venta.monto_total las variaciones {venta_id: delta} con UPDATEs relativos."""
+    for venta_id, delta in deltas.items():
+        if venta_id is not None and delta:
+            Venta.all_objects.filter(pk=venta_id).update(monto_total=models.F('monto_total') + delta)
+
+
+def _subtotales(filas):
+    deltas = defaultdict(Decimal)
+    for venta_id, monto in filas:
+        deltas[venta_id] += monto
+    return deltas
 
 
-class DetalleVenta(models.Model):
+def _restar(despues, antes):
+    deltas = defaultdict(Decimal, despues)
+    for venta_id, subtotal in antes.items():
+        deltas[venta_id] -= subtotal
+    return deltas
+
+
+# deleted_at cuenta porque monto_total solo suma las líneas vigentes
+CAMPOS_MONTO = {'venta', 'venta_id', 'cantidad', 'precio_unitario', 'deleted_at'}
+# Campos de DetalleVenta que cambian su día en ResumenVentaDiario
+CAMPOS_RESUMEN_DIARIO_DETALLE = CAMPOS_MONTO | {'producto', 'producto_id'}
+
+
+class DetalleVentaQuerySet(SoftDeleteQuerySet):
+    # Las rutas masivas no emiten señales, así que ajustan monto_total aquí.
+    # bulk_update, soft_delete y restore pasan por update(), por lo que quedan cubiertos.
+
+    def _filas_monto(self, pks):
+        filas = self.model._base_manager.filter(VIGENTE, pk__in=pks).values_list('venta_id', 'cantidad', 'precio_unitario')
+        return ((venta_id, cantidad * precio) for venta_id, cantidad, precio in filas)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .clientes import sumar_lineas
+
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            aplicar_deltas_monto(_subtotales((o.venta_id, o.aporte_monto) for o in objs))
+            sumar_lineas(objs)
+        for obj in objs:
+            obj._monto_original = (obj.venta_id, obj.aporte_monto)
+            obj._venta_original = obj.venta_id
+        return objs
+
+    def update(self, **kwargs):
+        if not CAMPOS_RESUMEN_DIARIO_DETALLE.intersection(kwargs):
+            return super().update(**kwargs)
+        from .clientes import recalcular_clientes
+        from .resumen import marcar_ventas
+
+        with transaction.atomic(using=self.db):
+            lineas = list(self.values_list('pk', 'venta_id'))
+            pks = [pk for pk, _ in lineas]
+            # Los días ya resumidos de estas ventas, y el de la venta a la que se muevan, se recalculan
+            ventas = {venta_id for _, venta_id in lineas}
+            nueva = kwargs.get('venta_id', kwargs.get('venta'))
+            if nueva is not None:
+                ventas.add(getattr(nueva, 'pk', nueva))
+            marcar_ventas(ventas)
+            if CAMPOS_MONTO.intersection(kwargs):
+                antes = _subtotales(self._filas_monto(pks))
+                filas = super().update(**kwargs)
+                aplicar_deltas_monto(_restar(_subtotales(self._filas_monto(pks)), antes))
+            else:
+                filas = super().update(**kwargs)
+            # Como en monto_total, pero por cliente y producto: se rehace el resumen de sus clientes
+            recalcular_clientes(Venta.all_objects.filter(pk__in=ventas).values('usuario_id'))
+        return filas
+
+    def update_sin_ajustar_monto(self, **kwargs):
+        return super().update(**kwargs)
+
+    update_sin_ajustar_monto.alters_data = True
+    update_sin_ajustar_monto.queryset_only = True
+
+
+class DetalleVenta(SoftDeleteModel):
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE)
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField()
@@ -136,11 +580,193 @@ class DetalleVenta(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(blank=True, null=True)
 
+    objects = SoftDeleteManager.from_queryset(DetalleVentaQuerySet)()
+    all_objects = models.Manager.from_queryset(DetalleVentaQuerySet)()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['venta'], condition=VIGENTE, name='detalleventa_venta_vig_idx'),
+        ]
+
     def __str__(self):
-        return f"Detalle {self.id} de Venta {self.venta.id}"
+        # venta_id evita cargar la venta solo para mostrar su número
+        return f"Detalle {self.id} de Venta {self.venta_id}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores con que se leyó la fila, para calcular el delta de monto_total al guardar
+        if {'venta_id', 'cantidad', 'precio_unitario', 'deleted_at'}.issubset(instance.__dict__):
+            instance._monto_original = (instance.venta_id, instance.aporte_monto)
+        if 'venta_id' in instance.__dict__:
+            instance._venta_original = instance.venta_id
+        return instance
+
+    @property
+    def subtotal(self):
+        return (self.cantidad or 0) * (self.precio_unitario or 0)
+
+    @property
+    def aporte_monto(self):
+        # Lo que la línea suma a monto_total de su venta
+        return 0 if self.deleted_at else self.subtotal
+
+    def delete(self, using=None, keep_parents=False):
+        resultado = super().delete(using, keep_parents)
+        self._monto_original = (self.venta_id, 0)
+        return resultado
 
     def clean(self):
         if self.cantidad <= 0:
             raise ValidationError("La cantidad debe ser mayor a 0.")
         if self.precio_unitario <= 0:
             raise ValidationError("El precio unitario debe ser mayor a 0.")
+
+
+class MovimientoStock(models.Model):
+    # Registro de solo inserción de los cambios de stock; Producto.stock_actual es su proyección
+    VENTA = 'venta'
+    REPOSICION = 'reposicion'
+    AJUSTE = 'ajuste'
+    AGOTADO = 'agotado'
+    IMPORTACION = 'importacion'
+    INICIAL = 'inicial'
+    TIPOS = [
+        (VENTA, 'Venta'),
+        (REPOSICION, 'Reposición'),
+        (AJUSTE, 'Ajuste manual'),
+        (AGOTADO, 'Marcado agotado'),
+        (IMPORTACION, 'Importación'),
+        (INICIAL, 'Stock inicial'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    cantidad = models.IntegerField(help_text="Unidades que entran (positivo) o salen (negativo)")
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    venta = models.ForeignKey(Venta, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'movimiento de stock'
+        verbose_name_plural = 'movimientos de stock'
+        indexes = [
+            # Historial de un producto en orden de registro
+            models.Index(fields=['producto', 'id'], name='movimiento_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} de {self.producto_id}"
+
+
+class CorteStock(models.Model):
+    # Stock de un producto según los movimientos hasta ultimo_movimiento_id; ver core/stock.py
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE)
+    stock = models.IntegerField()
+    ultimo_movimiento_id = models.BigIntegerField()
+    fecha = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'corte de stock'
+        verbose_name_plural = 'cortes de stock'
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.stock} ({self.ultimo_movimiento_id})"
+
+
+class AlertaStock(models.Model):
+    # Productos vigentes con stock bajo su umbral; se mantiene con cada cambio de stock (ver core/alertas.py)
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name='alerta')
+    umbral = models.PositiveIntegerField()
+    # umbral - stock_actual: siempre positivo mientras la alerta exista
+    faltante = models.PositiveIntegerField()
+    desde = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'alerta de stock'
+        verbose_name_plural = 'alertas de stock'
+        indexes = [
+            # Orden del panel de reposición: mayor faltante primero
+            models.Index(fields=['faltante', 'id'], name='alerta_faltante_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id}: faltan {self.faltante} para {self.umbral}"
+
+
+class ResumenCliente(models.Model):
+    # Totales de las ventas vigentes de un usuario; se acumulan al registrar cada venta (ver core/clientes.py)
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name='resumen_compras')
+    total_gastado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num_ventas = models.PositiveIntegerField(default=0)
+    ultima_compra = models.DateTimeField(blank=True, null=True)
+    # Aumenta con cada cambio; es parte de la clave del historial en cache
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'resumen de cliente'
+        verbose_name_plural = 'resúmenes de clientes'
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.num_ventas} ventas, ${self.total_gastado}"
+
+
+class CompraProducto(models.Model):
+    # Unidades de un producto compradas por un usuario; de aquí salen sus productos favoritos
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    unidades = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'compra por producto'
+        verbose_name_plural = 'compras por producto'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'producto'], name='compra_producto_unica'),
+        ]
+        indexes = [
+            # Favoritos de un usuario: los productos con más unidades
+            models.Index(fields=['usuario', '-unidades'], name='compra_producto_favoritos_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.unidades} de {self.producto_id}"
+
+
+class ResumenVentaDiario(models.Model):
+    # Agregado precalculado de DetalleVenta por día, producto, canal y método de pago
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    canal_venta = models.CharField(max_length=50)
+    metodo_pago = models.ForeignKey(MetodoPago, on_delete=models.SET_NULL, null=True, blank=True)
+    cantidad = models.PositiveIntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num_ventas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'resumen de venta diario'
+        verbose_name_plural = 'resumen de ventas diario'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'producto', 'canal_venta', 'metodo_pago'], name='resumen_venta_diario_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_id} - {self.canal_venta}"
+
+
+class MarcaResumen(models.Model):
+    # Último DetalleVenta ya incorporado a los resúmenes
+    nombre = models.CharField(max_length=50, unique=True)
+    ultimo_detalle_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.ultimo_detalle_id})"
+
+
+class DiaPendienteResumen(models.Model):
+    # Días ya resumidos cuyas ventas o líneas cambiaron; el próximo refresco los recalcula
+    fecha = models.DateField(unique=True)
+
+    def __str__(self):
+        return str(self.fecha)
@@ -0,0 +1,138 @@
+import datetime
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_VAR = '_cursor'
+DIRECCION_VAR = '_dir'
+CONTAR_VAR = '_contar'
+PARAMETROS_KEYSET = (CURSOR_VAR, DIRECCION_VAR, CONTAR_VAR)
+
+# Sin conteo exacto se cuenta a lo más este número de filas
+LIMITE_CONTEO = 1000
+
+
+def _codificar(valor):
+    if isinstance(valor, datetime.datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _decodificar(campo, texto):
+    if campo.get_internal_type() == 'DateTimeField':
+        valor = parse_datetime(texto)
+        if valor is None:
+            raise ValueError(texto)
+        return valor
+    return campo.to_python(texto)
+
+
+def filtro_seek(campos, valores, siguiente=True):
+    """
+    Condición para las filas después (o antes) de `valores` en el orden
+    descendente de `campos`. Se antepone una cota sobre el primer campo para
+    que la base pueda recorrer el índice por rango.
+    """
+    op, op_igual = ('lt', 'lte') if siguiente else ('gt', 'gte')
+    condicion = Q(**{f'{campos[-1]}__{op}': valores[-1]})
+    for campo, valor in zip(reversed(campos[:-1]), reversed(valores[:-1])):
+        condicion = Q(**{f'{campo}__{op}': valor}) | (Q(**{campo: valor}) & condicion)
+    return Q(**{f'{campos[0]}__{op_igual}': valores[0]}) & condicion
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paginado por búsqueda de clave (seek) en vez de OFFSET.
+
+    El admin define keyset_fields con el orden descendente por defecto, p. ej.
+    ('fecha', 'id'). Cuando el usuario ordena por otra columna se usa la
+    paginación estándar. El total exacto se calcula solo si se pide con
+    _contar=1; si no, se cuenta hasta LIMITE_CONTEO filas.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for param in PARAMETROS_KEYSET:
+            lookup_params.pop(param, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Los enlaces de filtros y orden parten siempre desde la primera página
+        new_params = new_params or {}
+        remove = list(remove or []) + [p for p in PARAMETROS_KEYSET if p not in new_params]
+        return super().get_query_string(new_params, remove)
+
+    @property
+    def keyset_fields(self):
+        return self.model_admin.keyset_fields
+
+    def _orden_keyset(self):
+        return ['-' + campo for campo in self.keyset_fields]
+
+    def keyset_aplicable(self):
+        # El orden final del queryset debe ser un prefijo del orden de la clave
+        orden = []
+        for campo in self.queryset.query.order_by:
+            if campo not in ('-pk', 'pk') and campo not in orden:
+                orden.append(campo)
+        return bool(orden) and orden == self._orden_keyset()[:len(orden)] and not self.show_all
+
+    def get_results(self, request):
+        if not self.keyset_aplicable():
+            self.keyset_activo = False
+            return super().get_results(request)
+        self.keyset_activo = True
+        campos = self.keyset_fields
+        qs = self.queryset.order_by(*self._orden_keyset())
+
+        cursor = request.GET.get(CURSOR_VAR)
+        anterior = request.GET.get(DIRECCION_VAR) == 'ant'
+        if cursor:
+            try:
+                valores = [
+                    _decodificar(self.opts.get_field(campo), texto)
+                    for campo, texto in zip(campos, cursor.split('|'), strict=True)
+                ]
+            except (ValueError, TypeError, ValidationError):
+                # Como un filtro inválido: el admin vuelve a la primera página
+                raise IncorrectLookupParameters
+            qs = qs.filter(filtro_seek(campos, valores, siguiente=not anterior))
+            if anterior:
+                qs = qs.reverse()
+
+        filas = list(qs[:self.list_per_page + 1])
+        hay_mas = len(filas) > self.list_per_page
+        filas = filas[:self.list_per_page]
+        if anterior:
+            filas.reverse()
+
+        hay_siguiente = hay_mas if not anterior else True
+        hay_anterior = bool(cursor) and (hay_mas if anterior else True)
+        self.url_siguiente = self._url_cursor(filas[-1], 'sig') if filas and hay_siguiente else None
+        self.url_anterior = self._url_cursor(filas[0], 'ant') if filas and hay_anterior else None
+
+        if request.GET.get(CONTAR_VAR):
+            result_count = self.queryset.count()
+            self.conteo_aproximado = False
+        else:
+            result_count = self.queryset.order_by()[:LIMITE_CONTEO + 1].count()
+            self.conteo_aproximado = result_count > LIMITE_CONTEO
+            result_count = min(result_count, LIMITE_CONTEO)
+        self.url_contar = self.get_query_string({CONTAR_VAR: 1})
+
+        self.result_count = result_count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = filas
+        self.can_show_all = False
+        self.multi_page = bool(self.url_siguiente or self.url_anterior)
+        self.paginator = Paginator(filas, self.list_per_page)
+
+    def _url_cursor(self, obj, direccion):
+        cursor = '|'.join(_codificar(getattr(obj, campo)) for campo in self.keyset_fields)
+        return self.get_query_string({CURSOR_VAR: cursor, DIRECCION_VAR: direccion})
@@ -0,0 +1,132 @@
+import enum
+import functools
+
+from .roles import TipoRol, aget_rol, get_rol
+
+
+class Acceso(enum.Enum):
+    PERMITIDO = 'permitido'
+    DENEGADO = 'denegado'
+    # Solo el objeto del propio usuario (el id de la URL es el del usuario)
+    PROPIO = 'propio'
+
+
+# Política de acceso al admin por rol: modelo -> Acceso para todas sus vistas,
+# o {vista: Acceso} con '*' para las vistas no listadas. Las vistas son las
+# del ModelAdmin (changelist, add, change, delete, history y las propias como
+# importar). Lo no listado queda PERMITIDO y sujeto a los permisos de Django.
+# TipoRol.DESCONOCIDO (rol eliminado o no encontrado) no accede a ninguna vista.
+# La aplican RoleBasedAccessMiddleware y PoliticaAccesoMixin en los ModelAdmin.
+POLITICA = {
+    TipoRol.CLIENTE: {
+        'core.categoria': Acceso.DENEGADO,
+        'core.producto': Acceso.DENEGADO,
+        'core.nutricional': Acceso.DENEGADO,
+        'core.detalleventa': Acceso.DENEGADO,
+        'core.movimientostock': Acceso.DENEGADO,
+        'core.alertastock': Acceso.DENEGADO,
+        'core.resumenventadiario': Acceso.DENEGADO,
+        'core.usuario': {
+            'changelist': Acceso.PERMITIDO,
+            'change': Acceso.PROPIO,
+            'history': Acceso.PROPIO,
+            'password_change': Acceso.PROPIO,
+            '*': Acceso.DENEGADO,
+        },
+    },
+}
+
+
+def acceso(tipo, modelo, vista):
+    """Acceso de un rol (TipoRol) a una vista de un modelo ('app.modelo')."""
+    if tipo is TipoRol.DESCONOCIDO:
+        return Acceso.DENEGADO
+    regla = POLITICA.get(tipo, {}).get(modelo, Acceso.PERMITIDO)
+    if isinstance(regla, dict):
+        return regla.get(vista, regla.get('*', Acceso.PERMITIDO))
+    return regla
+
+
+@functools.cache
+def compilar():
+    """
+    {TipoRol: {url_name: Acceso}} de todas las vistas con nombre de los
+    ModelAdmin registrados, para resolver cada petición con un dict. Solo
+    incluye las vistas que no quedan PERMITIDAS.
+    """
+    from django.contrib.admin.sites import site
+
+    vistas = {}
+    for modelo, model_admin in site._registry.items():
+        prefijo = f'{modelo._meta.app_label}_{modelo._meta.model_name}_'
+        for patron in model_admin.get_urls():
+            nombre = getattr(patron, 'name', None)
+            if nombre:
+                # UserAdmin nombra password_change con auth_user_ aunque el modelo sea otro
+                vista = nombre.removeprefix(prefijo) if nombre.startswith(prefijo) else nombre.split('_', 2)[-1]
+                vistas[nombre] = (modelo._meta.label_lower, vista)
+    compilada = {}
+    for tipo in (*POLITICA, TipoRol.DESCONOCIDO):
+        reglas = {nombre: acceso(tipo, modelo, vista) for nombre, (modelo, vista) in vistas.items()}
+        compilada[tipo] = {nombre: regla for nombre, regla in reglas.items() if regla is not Acceso.PERMITIDO}
+    return compilada
+
+
+def _es_admin(request):
+    match = request.resolver_match
+    return match is not None and match.app_name == 'admin'
+
+
+def _acceso_resuelto(request, view_kwargs, user, tipo):
+    reglas = compilar()
+    if tipo not in reglas:
+        return Acceso.PERMITIDO
+    regla = reglas[tipo].get(request.resolver_match.url_name, Acceso.PERMITIDO)
+    if regla is Acceso.PROPIO:
+        object_id = view_kwargs.get('object_id', view_kwargs.get('id'))
+        return Acceso.PERMITIDO if object_id == str(user.pk) else Acceso.DENEGADO
+    return regla
+
+
+def acceso_vista(request, view_kwargs):
+    """Acceso del usuario de la petición a la vista resuelta del admin."""
+    if not _es_admin(request) or not request.user.is_authenticated:
+        return Acceso.PERMITIDO
+    return _acceso_resuelto(request, view_kwargs, request.user, get_rol(request).tipo)
+
+
+async def aacceso_vista(request, view_kwargs):
+    """acceso_vista() sin accesos síncronos a la base, para el middleware en modo async."""
+    if not _es_admin(request):
+        return Acceso.PERMITIDO
+    user = await request.auser()
+    if not user.is_authenticated:
+        return Acceso.PERMITIDO
+    return _acceso_resuelto(request, view_kwargs, user, (await aget_rol(request)).tipo)
+
+
+class PoliticaAccesoMixin:
+    """Permisos del ModelAdmin restringidos por POLITICA, además de los de Django."""
+
+    def _acceso(self, request, vista, obj=None):
+        regla = acceso(get_rol(request).tipo, self.model._meta.label_lower, vista)
+        if regla is Acceso.PROPIO:
+            # Sin objeto (listado, formularios) el queryset del admin acota lo visible
+            return obj is None or obj.pk == request.user.pk
+        return regla is Acceso.PERMITIDO
+
+    def has_module_permission(self, request):
+        return self._acceso(request, 'changelist') and super().has_module_permission(request)
+
+    def has_view_permission(self, request, obj=None):
+        vista = 'changelist' if obj is None else 'change'
+        return self._acceso(request, vista, obj) and super().has_view_permission(request, obj)
+
+    def has_change_permission(self, request, obj=None):
+        return self._acceso(request, 'change', obj) and super().has_change_permission(request, obj)
+
+    def has_add_permission(self, request, *args, **kwargs):
+        return self._acceso(request, 'add') and super().has_add_permission(request, *args, **kwargs)
+
+    def has_delete_permission(self, request, obj=None):
+        return self._acceso(request, 'delete', obj) and super().has_delete_permission(request, obj)
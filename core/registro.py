@@ -0,0 +1,14 @@
+import os
+from logging.handlers import RotatingFileHandler
+
+
+class ArchivoRotativo(RotatingFileHandler):
+    """
+    RotatingFileHandler que crea el directorio del archivo al abrirlo. Con
+    delay=True eso ocurre en el primer registro y no al cargar los settings
+    en cada comando de manage.py.
+    """
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
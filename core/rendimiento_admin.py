@@ -0,0 +1,146 @@
+import json
+import logging
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.contrib.admin.sites import site
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Líneas base por conjunto de datos: {conjunto: {página: medición}}
+ARCHIVO_PRESUPUESTOS = Path(__file__).with_name('presupuestos_admin.json')
+TERMINO_BUSQUEDA = 'Sint'
+# Una página excede su presupuesto si supera la línea base en más de esto.
+# Las consultas no tienen holgura: cualquier consulta extra es una regresión.
+HOLGURA_TIEMPO = 3.0
+HOLGURA_TIEMPO_MS = 50
+HOLGURA_MEMORIA = 1.5
+HOLGURA_MEMORIA_KB = 256
+
+
+def _primer_filtro(client, changelist):
+    """Query string de la primera opción del primer filtro lateral, o None."""
+    response = client.get(changelist)
+    if response.status_code != 200:
+        return None
+    cl = response.context['cl']
+    for spec in cl.filter_specs:
+        for opcion in list(spec.choices(cl))[1:]:
+            return opcion['query_string']
+    return None
+
+
+def paginas(client, usuario):
+    """Páginas de cada ModelAdmin de core a medir para el usuario: [(clave, url)]."""
+    request = RequestFactory().get('/')
+    request.user = usuario
+    resultado = []
+    modelos = sorted(
+        (m for m in site._registry if m._meta.app_label == 'core'), key=lambda m: m._meta.model_name,
+    )
+    for modelo in modelos:
+        modelo_admin = site._registry[modelo]
+        nombre = modelo._meta.model_name
+        changelist = reverse(f'admin:core_{nombre}_changelist')
+        resultado.append((f'{nombre}:lista', changelist))
+        if modelo_admin.search_fields:
+            resultado.append((f'{nombre}:busqueda', f'{changelist}?q={TERMINO_BUSQUEDA}'))
+        filtro = _primer_filtro(client, changelist)
+        if filtro:
+            resultado.append((f'{nombre}:filtro', changelist + filtro))
+        # El formulario de un objeto que el usuario puede ver (Venta incluye DetalleVentaInline)
+        obj = modelo_admin.get_queryset(request).order_by('pk').first()
+        if obj is not None:
+            resultado.append((f'{nombre}:formulario', reverse(f'admin:core_{nombre}_change', args=[obj.pk])))
+    return resultado
+
+
+def medir_pagina(client, url, repeticiones=3):
+    """
+    Estado, consultas, tiempo (ms) y pico de memoria asignada (KB) de un GET.
+
+    Se registra el menor tiempo de las repeticiones: es el más estable entre
+    corridas y el que mejor refleja el costo propio de la página.
+    """
+    client.get(url)
+    tiempos = []
+    consultas = 0
+    for _ in range(repeticiones):
+        with CaptureQueriesContext(connection) as ctx:
+            inicio = time.perf_counter()
+            response = client.get(url)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas = max(consultas, len(ctx))
+    # tracemalloc encarece la petición, por eso se mide aparte del tiempo
+    tracemalloc.start()
+    try:
+        client.get(url)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'estado': response.status_code,
+        'consultas': consultas,
+        'ms': round(min(tiempos), 2),
+        'kb': round(pico / 1024),
+    }
+
+
+def ejecutar_suite(usuarios, repeticiones=3):
+    """Mide todas las páginas para cada rol. usuarios: {rol: usuario}. Retorna {rol:página: medición}."""
+    resultados = {}
+    # Las respuestas 403 esperadas para el Cliente no deben llenar la salida de trazas
+    logger = logging.getLogger('django.request')
+    nivel = logger.level
+    logger.setLevel(logging.ERROR)
+    try:
+        for rol, usuario in usuarios.items():
+            client = Client()
+            client.force_login(usuario)
+            for clave, url in paginas(client, usuario):
+                resultados[f'{rol}:{clave}'] = medir_pagina(client, url, repeticiones)
+    finally:
+        logger.setLevel(nivel)
+    return resultados
+
+
+def cargar_presupuestos(conjunto):
+    if not ARCHIVO_PRESUPUESTOS.exists():
+        return {}
+    return json.loads(ARCHIVO_PRESUPUESTOS.read_text()).get(conjunto, {})
+
+
+def guardar_presupuestos(conjunto, resultados):
+    datos = json.loads(ARCHIVO_PRESUPUESTOS.read_text()) if ARCHIVO_PRESUPUESTOS.exists() else {}
+    datos[conjunto] = resultados
+    ARCHIVO_PRESUPUESTOS.write_text(json.dumps(datos, indent=2, sort_keys=True, ensure_ascii=False) + '\n')
+
+
+def excesos(resultados, presupuestos, recursos=True):
+    """
+    Descripción de cada página que excede su presupuesto o no tiene línea
+    base. Con recursos=False solo se comparan el estado y las consultas, que
+    no dependen de la máquina.
+    """
+    problemas = []
+    for clave, medicion in resultados.items():
+        base = presupuestos.get(clave)
+        if base is None:
+            problemas.append(f'{clave}: sin línea base')
+            continue
+        if medicion['estado'] != base['estado']:
+            problemas.append(f'{clave}: estado {medicion["estado"]}, se esperaba {base["estado"]}')
+        if medicion['consultas'] > base['consultas']:
+            problemas.append(f'{clave}: {medicion["consultas"]} consultas, presupuesto {base["consultas"]}')
+        if not recursos:
+            continue
+        tope_ms = base['ms'] * HOLGURA_TIEMPO + HOLGURA_TIEMPO_MS
+        if medicion['ms'] > tope_ms:
+            problemas.append(f'{clave}: {medicion["ms"]} ms, presupuesto {tope_ms:.0f} ms')
+        tope_kb = base['kb'] * HOLGURA_MEMORIA + HOLGURA_MEMORIA_KB
+        if medicion['kb'] > tope_kb:
+            problemas.append(f'{clave}: {medicion["kb"]} KB, presupuesto {tope_kb:.0f} KB')
+    return problemas
@@ -0,0 +1,102 @@
+import threading
+import uuid
+
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .alertas import revisar_alertas
+from .concurrencia import escritura
+from .models import Categoria, MovimientoStock, Producto
+from .stock import registrar_movimientos_de
+
+# Productos con stock bajo este valor se consideran para reponer
+UMBRAL_REPOSICION = 5
+# Nivel usado cuando ni el producto ni su categoría definen stock_objetivo
+STOCK_OBJETIVO_DEFECTO = 50
+# Sobre este número de productos seleccionados la reposición corre en segundo plano
+LIMITE_SINCRONO = 5000
+TAMANO_LOTE = 1000
+
+
+def stock_objetivo():
+    """Expresión SQL con el stock objetivo: producto, luego categoría, luego el valor por defecto."""
+    objetivo_categoria = Categoria.objects.filter(pk=OuterRef('categoria_id')).values('stock_objetivo')[:1]
+    return Coalesce(F('stock_objetivo'), Subquery(objetivo_categoria), Value(STOCK_OBJETIVO_DEFECTO))
+
+
+@escritura
+def reponer_stock(queryset):
+    """
+    Repone en un solo UPDATE los productos del queryset con stock bajo, tras
+    registrar lo repuesto con un INSERT ... SELECT, y revisa sus alertas de
+    stock. Retorna cuántos cambiaron.
+    """
+    por_reponer = (
+        queryset.filter(stock_actual__lt=UMBRAL_REPOSICION)
+        .alias(objetivo=stock_objetivo())
+        .filter(stock_actual__lt=F('objetivo'))
+    )
+    with transaction.atomic():
+        registrar_movimientos_de(por_reponer, F('objetivo') - F('stock_actual'), MovimientoStock.REPOSICION)
+        actualizados = por_reponer.update(stock_actual=stock_objetivo(), updated_at=timezone.now())
+        revisar_alertas(queryset.values('pk'))
+    return actualizados
+
+
+class TareaReposicion:
+    def __init__(self, usuario_id, total):
+        self.id = uuid.uuid4().hex
+        self.usuario_id = usuario_id
+        self.total = total
+        self.procesados = 0
+        self.actualizados = 0
+        self.terminada = False
+        self.error = None
+        self.hilo = None
+
+    @property
+    def porcentaje(self):
+        if not self.total:
+            return 100
+        return int(self.procesados * 100 / self.total)
+
+
+# Tareas en curso o terminadas y aún no informadas al usuario, por id
+_tareas = {}
+_lock = threading.Lock()
+
+
+def _ejecutar(tarea, ids):
+    try:
+        for inicio in range(0, len(ids), TAMANO_LOTE):
+            lote = ids[inicio:inicio + TAMANO_LOTE]
+            tarea.actualizados += reponer_stock(Producto.objects.filter(pk__in=lote))
+            tarea.procesados += len(lote)
+    except Exception as e:
+        tarea.error = str(e)
+    finally:
+        tarea.terminada = True
+        connection.close()
+
+
+def reponer_en_segundo_plano(queryset, usuario_id):
+    """Repone por lotes en un hilo aparte; el avance se consulta con tareas_de_usuario."""
+    ids = list(queryset.filter(stock_actual__lt=UMBRAL_REPOSICION).values_list('pk', flat=True))
+    tarea = TareaReposicion(usuario_id, len(ids))
+    with _lock:
+        _tareas[tarea.id] = tarea
+    tarea.hilo = threading.Thread(target=_ejecutar, args=(tarea, ids), daemon=True)
+    tarea.hilo.start()
+    return tarea
+
+
+def tareas_de_usuario(usuario_id):
+    """Tareas del usuario; las terminadas se entregan una sola vez y luego se descartan."""
+    with _lock:
+        tareas = [t for t in _tareas.values() if t.usuario_id == usuario_id]
+        for tarea in tareas:
+            if tarea.terminada:
+                del _tareas[tarea.id]
+    return tareas
@@ -0,0 +1,200 @@
+import datetime
+import operator
+from functools import reduce
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from .models import DetalleVenta, DiaPendienteResumen, MarcaResumen, ResumenVentaDiario, Venta
+
+MARCA_VENTAS_DIARIAS = 'ventas_diarias'
+TAMANO_LOTE = 2000
+# El panel del admin refresca los resúmenes como mucho una vez por este intervalo
+SEGUNDOS_ENTRE_REFRESCOS_PANEL = 60
+
+# Dimensiones por las que se puede agrupar, relativas a ResumenVentaDiario
+DIMENSIONES = {
+    'producto': 'producto__nombre',
+    'categoria': 'producto__categoria__nombre',
+    'canal': 'canal_venta',
+    'metodo_pago': 'metodo_pago__nombre',
+}
+# Las mismas dimensiones, relativas a DetalleVenta
+DIMENSIONES_DETALLE = {
+    'producto': 'producto__nombre',
+    'categoria': 'producto__categoria__nombre',
+    'canal': 'venta__canal_venta',
+    'metodo_pago': 'venta__metodo_pago__nombre',
+}
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def marcar_ventas(ventas):
+    """
+    Marca para el próximo refresco los días de las ventas indicadas (ids o
+    un queryset de ids), tras cambiar sus líneas o los campos de la venta
+    que usa el resumen. Una consulta de los días y un INSERT que ignora los
+    ya marcados; se llama dentro de la transacción de la escritura.
+    """
+    dias = set(
+        Venta.all_objects.filter(pk__in=ventas).order_by()
+        .values_list(TruncDate('fecha'), flat=True).distinct()
+    )
+    marcar_dias(dias)
+
+
+def marcar_dias(dias):
+    dias = {dia for dia in dias if dia is not None}
+    if dias:
+        DiaPendienteResumen.objects.bulk_create(
+            [DiaPendienteResumen(fecha=dia) for dia in dias], ignore_conflicts=True,
+        )
+
+
+def _unir(rangos):
+    """Rangos [desde, hasta) ordenados, con los que se tocan o se solapan unidos."""
+    unidos = []
+    for desde, hasta in sorted(rangos):
+        if unidos and desde <= unidos[-1][1]:
+            unidos[-1][1] = max(unidos[-1][1], hasta)
+        else:
+            unidos.append([desde, hasta])
+    return unidos
+
+
+def hay_pendientes():
+    """Si hay líneas nuevas o días marcados que refrescar_resumen() deba incorporar."""
+    ultimo = MarcaResumen.objects.filter(nombre=MARCA_VENTAS_DIARIAS).values_list('ultimo_detalle_id', flat=True).first()
+    return (
+        DiaPendienteResumen.objects.exists()
+        or DetalleVenta.objects.filter(id__gt=ultimo or 0).exists()
+    )
+
+
+def _agregar_detalles(detalles):
+    return (
+        detalles.order_by()
+        .values(
+            dia=TruncDate('venta__fecha'),
+            producto_ref=F('producto_id'),
+            canal=F('venta__canal_venta'),
+            metodo_pago_ref=F('venta__metodo_pago_id'),
+        )
+        .annotate(
+            total_cantidad=Sum('cantidad'),
+            total_monto=Sum(F('cantidad') * F('precio_unitario')),
+            total_ventas=Count('venta_id', distinct=True),
+        )
+    )
+
+
+def refrescar_resumen(completo=False):
+    """
+    Incorpora a ResumenVentaDiario los DetalleVenta posteriores a la marca
+    y los días marcados por marcar_ventas().
+
+    Solo se recalculan los días tocados por las líneas nuevas y los
+    marcados; con completo=True se reconstruye toda la tabla. Sin nada
+    pendiente solo lee, sin abrir una transacción de escritura. Retorna la
+    cantidad de filas de resumen escritas.
+    """
+    if not completo and not hay_pendientes():
+        return 0
+    un_dia = datetime.timedelta(days=1)
+    with transaction.atomic():
+        marca, _ = MarcaResumen.objects.select_for_update().get_or_create(nombre=MARCA_VENTAS_DIARIAS)
+        tope = DetalleVenta.objects.aggregate(m=Max('id'))['m'] or 0
+        marcados = list(DiaPendienteResumen.objects.values_list('fecha', flat=True))
+        detalles = DetalleVenta.objects.filter(id__lte=tope)
+        resumen = ResumenVentaDiario.objects.all()
+
+        if not completo:
+            rangos = [(dia, dia + un_dia) for dia in marcados]
+            if tope > marca.ultimo_detalle_id:
+                rango = DetalleVenta.objects.filter(id__gt=marca.ultimo_detalle_id, id__lte=tope).aggregate(
+                    desde=Min(TruncDate('venta__fecha')), hasta=Max(TruncDate('venta__fecha')),
+                )
+                # Se recalculan días completos para absorber líneas tardías de esos días
+                rangos.append((rango['desde'], rango['hasta'] + un_dia))
+            if not rangos:
+                return 0
+            rangos = _unir(rangos)
+            detalles = detalles.filter(reduce(operator.or_, (
+                Q(venta__fecha__gte=_inicio_dia(desde), venta__fecha__lt=_inicio_dia(hasta)) for desde, hasta in rangos
+            )))
+            resumen = resumen.filter(reduce(operator.or_, (
+                Q(fecha__gte=desde, fecha__lt=hasta) for desde, hasta in rangos
+            )))
+
+        resumen.delete()
+        DiaPendienteResumen.objects.filter(fecha__in=marcados).delete()
+        escritas = 0
+        lote = []
+        for fila in _agregar_detalles(detalles).iterator(chunk_size=TAMANO_LOTE):
+            lote.append(ResumenVentaDiario(
+                fecha=fila['dia'],
+                producto_id=fila['producto_ref'],
+                canal_venta=fila['canal'],
+                metodo_pago_id=fila['metodo_pago_ref'],
+                cantidad=fila['total_cantidad'],
+                monto=fila['total_monto'],
+                num_ventas=fila['total_ventas'],
+            ))
+            if len(lote) >= TAMANO_LOTE:
+                escritas += len(ResumenVentaDiario.objects.bulk_create(lote))
+                lote = []
+        escritas += len(ResumenVentaDiario.objects.bulk_create(lote))
+
+        marca.ultimo_detalle_id = tope
+        marca.save()
+    return escritas
+
+
+def refrescar_para_panel():
+    """
+    refrescar_resumen() al abrir el panel del admin, como mucho una vez cada
+    SEGUNDOS_ENTRE_REFRESCOS_PANEL entre los procesos que comparten el cache;
+    el comando refrescar_resumen no tiene ese límite.
+    """
+    if cache.add('resumen_ventas:refresco_panel', True, SEGUNDOS_ENTRE_REFRESCOS_PANEL):
+        return refrescar_resumen()
+    return 0
+
+
+def _filtrar_periodo(qs, campo_fecha, desde, hasta):
+    if desde:
+        qs = qs.filter(**{f'{campo_fecha}__gte': desde})
+    if hasta:
+        qs = qs.filter(**{f'{campo_fecha}__lte': hasta})
+    return qs
+
+
+def ingresos(por='producto', periodo='dia', desde=None, hasta=None):
+    """Unidades y total vendido por período ('dia' o 'semana') y dimensión, leídos desde los resúmenes."""
+    qs = _filtrar_periodo(ResumenVentaDiario.objects.all(), 'fecha', desde, hasta)
+    inicio = F('fecha') if periodo == 'dia' else TruncWeek('fecha')
+    return (
+        qs.order_by()
+        .values(periodo=inicio, clave=F(DIMENSIONES[por]))
+        .annotate(unidades=Sum('cantidad'), total=Sum('monto'))
+        .order_by('periodo', 'clave')
+    )
+
+
+def ingresos_sin_resumen(por='producto', periodo='dia', desde=None, hasta=None):
+    """Mismo resultado que ingresos(), agregando DetalleVenta directamente."""
+    qs = _filtrar_periodo(DetalleVenta.objects.all(), 'venta__fecha__date', desde, hasta)
+    dia = TruncDate('venta__fecha')
+    inicio = dia if periodo == 'dia' else TruncWeek(dia)
+    return (
+        qs.order_by()
+        .values(periodo=inicio, clave=F(DIMENSIONES_DETALLE[por]))
+        .annotate(unidades=Sum('cantidad'), total=Sum(F('cantidad') * F('precio_unitario')))
+        .order_by('periodo', 'clave')
+    )
@@ -0,0 +1,95 @@
+import enum
+from dataclasses import dataclass
+
+from .cache_maestros import ROLES
+
+
+class TipoRol(enum.Enum):
+    ADMIN = 'Admin'
+    CLIENTE = 'Cliente'
+    OTRO = 'Otro'
+    SIN_ROL = ''
+    # rol_id de un rol eliminado o que no se encontró: no se concede nada
+    DESCONOCIDO = None
+
+    @classmethod
+    def desde_nombre(cls, nombre):
+        for tipo in (cls.ADMIN, cls.CLIENTE):
+            if tipo.value == nombre:
+                return tipo
+        return cls.OTRO
+
+
+@dataclass(frozen=True)
+class RolResuelto:
+    id: int | None
+    nombre: str
+    tipo: TipoRol
+
+    @property
+    def es_cliente(self):
+        # Un rol desconocido recibe al menos las restricciones del cliente
+        return self.tipo in (TipoRol.CLIENTE, TipoRol.DESCONOCIDO)
+
+    @property
+    def es_admin(self):
+        return self.tipo is TipoRol.ADMIN
+
+
+SIN_ROL = RolResuelto(id=None, nombre='', tipo=TipoRol.SIN_ROL)
+
+ATRIBUTO_REQUEST = '_rol_resuelto'
+
+
+def invalidar_cache_roles(**kwargs):
+    ROLES.invalidar()
+
+
+def _rol_resuelto(rol_id, rol):
+    if rol is None:
+        # El usuario tiene un rol, pero no está entre los vigentes: se niega, no se trata como sin rol
+        return RolResuelto(id=rol_id, nombre='', tipo=TipoRol.DESCONOCIDO)
+    return RolResuelto(id=rol_id, nombre=rol.nombre, tipo=TipoRol.desde_nombre(rol.nombre))
+
+
+def resolver_rol(user):
+    # Usa rol_id para no cargar el objeto Rol completo desde el usuario
+    rol_id = getattr(user, 'rol_id', None)
+    if not rol_id:
+        return SIN_ROL
+    # Los roles se leen del cache de tablas maestras, que se invalida con sus señales
+    return _rol_resuelto(rol_id, ROLES.obtener(rol_id))
+
+
+async def aresolver_rol(user):
+    rol_id = getattr(user, 'rol_id', None)
+    if not rol_id:
+        return SIN_ROL
+    return _rol_resuelto(rol_id, await ROLES.aobtener(rol_id))
+
+
+def get_rol(request):
+    """Rol del usuario de la petición, resuelto una sola vez por request."""
+    # Se guarda junto al pk del usuario por si cambia durante la petición (login/logout)
+    user = request.user
+    cacheado = getattr(request, ATRIBUTO_REQUEST, None)
+    if cacheado is not None and cacheado[0] == user.pk:
+        return cacheado[1]
+    rol = resolver_rol(user)
+    setattr(request, ATRIBUTO_REQUEST, (user.pk, rol))
+    return rol
+
+
+async def aget_rol(request):
+    """get_rol() para middleware y vistas async: el usuario se obtiene con request.auser()."""
+    user = await request.auser()
+    cacheado = getattr(request, ATRIBUTO_REQUEST, None)
+    if cacheado is not None and cacheado[0] == user.pk:
+        return cacheado[1]
+    rol = await aresolver_rol(user)
+    setattr(request, ATRIBUTO_REQUEST, (user.pk, rol))
+    return rol
+
+
+def es_cliente(request):
+    return get_rol(request).es_cliente
@@ -0,0 +1,180 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache_maestros, instrumentacion
+from .alertas import revisar_alertas
+from .clientes import acumular_compras, invalidar_historial, recalcular_clientes, sumar_lineas
+from .models import (
+    ATRIBUTOS_RESUMEN_CLIENTE, CAMPOS_RESUMEN_DIARIO, Categoria, DetalleVenta, MovimientoStock, Producto, Usuario,
+    Venta, aplicar_deltas_monto, filas_modificadas,
+)
+from .resumen import marcar_dias, marcar_ventas
+from .totales import recalcular_montos
+
+
+@receiver(connection_created, dispatch_uid='pragmas_sqlite')
+def conexion_creada(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Directo sobre la conexión de sqlite3: no cuenta como consulta de la petición
+    for pragma, valor in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {pragma} = {valor}')
+
+
+@receiver(connection_created, dispatch_uid='instalar_medicion_consultas')
+def instalar_medicion(sender, connection, **kwargs):
+    # Las peticiones muestreadas miden sus consultas con este wrapper (core/instrumentacion.py)
+    if instrumentacion.medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(instrumentacion.medir_consulta)
+
+
+@receiver([post_save, post_delete, filas_modificadas], dispatch_uid='invalidar_cache_maestros')
+def maestro_modificado(sender, **kwargs):
+    # Cualquier cambio en una tabla maestra descarta su cache (ver core/cache_maestros.py)
+    cache_maestros.invalidar(sender)
+
+
+@receiver(post_save, sender=DetalleVenta, dispatch_uid='detalle_guardado_monto')
+def detalle_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    original = getattr(instance, '_monto_original', None)
+    if not created and original is None:
+        # Instancia sin valores originales (campos diferidos): recalcular la venta completa
+        recalcular_montos(Venta.objects.filter(pk=instance.venta_id))
+    else:
+        deltas = defaultdict(Decimal)
+        if original is not None:
+            deltas[original[0]] -= original[1]
+        deltas[instance.venta_id] += instance.aporte_monto
+        aplicar_deltas_monto(deltas)
+    instance._monto_original = (instance.venta_id, instance.aporte_monto)
+
+
+@receiver(post_delete, sender=DetalleVenta, dispatch_uid='detalle_eliminado_monto')
+def detalle_eliminado(sender, instance, **kwargs):
+    venta_id, aporte = getattr(instance, '_monto_original', (instance.venta_id, instance.aporte_monto))
+    aplicar_deltas_monto({venta_id: -aporte})
+
+
+@receiver(post_save, sender=DetalleVenta, dispatch_uid='detalle_guardado_resumen')
+def detalle_guardado_resumen(sender, instance, created, raw=False, **kwargs):
+    # Las líneas nuevas las toma la marca de refrescar_resumen; una editada cambia días ya resumidos
+    if not raw and not created:
+        marcar_ventas([instance.venta_id])
+
+
+@receiver(post_delete, sender=DetalleVenta, dispatch_uid='detalle_eliminado_resumen')
+def detalle_eliminado_resumen(sender, instance, **kwargs):
+    marcar_ventas([instance.venta_id])
+
+
+def _dias_venta(venta):
+    fechas = {venta.fecha, getattr(venta, '_fecha_original', None)}
+    return {timezone.localdate(fecha) for fecha in fechas if fecha is not None}
+
+
+@receiver(post_save, sender=Venta, dispatch_uid='venta_guardada_resumen')
+def venta_guardada_resumen(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Una venta nueva aún no tiene líneas resumidas
+    if raw or created or (update_fields is not None and not CAMPOS_RESUMEN_DIARIO.intersection(update_fields)):
+        return
+    if 'fecha' in instance.__dict__:
+        marcar_dias(_dias_venta(instance))
+        instance._fecha_original = instance.fecha
+    else:
+        marcar_ventas([instance.pk])
+
+
+@receiver(post_delete, sender=Venta, dispatch_uid='venta_eliminada_resumen')
+def venta_eliminada_resumen(sender, instance, **kwargs):
+    marcar_dias(_dias_venta(instance))
+
+
+@receiver(post_save, sender=Producto, dispatch_uid='producto_guardado_stock')
+def producto_guardado(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Los cambios de stock_actual con save() quedan en el registro de movimientos
+    if raw or (update_fields is not None and 'stock_actual' not in update_fields):
+        return
+    if 'stock_actual' not in instance.__dict__:
+        return
+    if created:
+        cantidad, tipo = instance.stock_actual, MovimientoStock.INICIAL
+    else:
+        original = getattr(instance, '_stock_original', None)
+        if original is None:
+            return
+        cantidad, tipo = instance.stock_actual - original, MovimientoStock.AJUSTE
+    if cantidad:
+        MovimientoStock.objects.create(producto=instance, cantidad=cantidad, tipo=tipo)
+    instance._stock_original = instance.stock_actual
+
+
+@receiver(post_save, sender=Producto, dispatch_uid='producto_guardado_alerta')
+def producto_guardado_alerta(sender, instance, raw=False, **kwargs):
+    # Stock, umbral o categoría pueden haber cambiado: se revisa solo este producto
+    if not raw:
+        revisar_alertas([instance.pk])
+
+
+@receiver(post_save, sender=Categoria, dispatch_uid='categoria_guardada_alerta')
+def categoria_guardada(sender, instance, created, raw=False, **kwargs):
+    original = getattr(instance, '_umbral_original', None)
+    if not raw and not created and original != instance.umbral_alerta:
+        revisar_alertas(Producto.all_objects.filter(categoria=instance).values('pk'))
+    instance._umbral_original = instance.umbral_alerta
+
+
+def _borra_ventas(origin):
+    # Borrar ventas por queryset (VentaQuerySet.hard_delete) o a su cliente ya deja el resumen al día
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return modelo is Usuario or (modelo is Venta and isinstance(origin, QuerySet))
+
+
+@receiver(post_save, sender=Venta, dispatch_uid='venta_guardada_cliente')
+def venta_guardada_cliente(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    original = getattr(instance, '_cliente_original', None)
+    if created:
+        if instance.deleted_at is None:
+            acumular_compras([(instance.usuario_id, instance.fecha, instance.monto_total, {})])
+    elif original is None or original != tuple(getattr(instance, a) for a in ATRIBUTOS_RESUMEN_CLIENTE):
+        # Cliente, fecha, eliminación o monto distintos de los leídos: se rehacen los resúmenes afectados
+        recalcular_clientes({instance.usuario_id, original and original[0]} - {None})
+    else:
+        # Estado, canal...: los totales no cambian, pero sí el historial que se muestra
+        invalidar_historial([instance.usuario_id])
+    instance.recordar_originales()
+
+
+@receiver(post_delete, sender=Venta, dispatch_uid='venta_eliminada_cliente')
+def venta_eliminada_cliente(sender, instance, origin=None, **kwargs):
+    if not _borra_ventas(origin):
+        recalcular_clientes([instance.usuario_id])
+
+
+@receiver(post_save, sender=DetalleVenta, dispatch_uid='detalle_guardado_cliente')
+def detalle_guardado_cliente(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        sumar_lineas([instance])
+    else:
+        # Una línea editada puede cambiar de venta, producto o cantidad: se rehacen sus clientes
+        ventas = {instance.venta_id, getattr(instance, '_venta_original', None)} - {None}
+        recalcular_clientes(Venta.all_objects.filter(pk__in=ventas).values('usuario_id'))
+    instance._venta_original = instance.venta_id
+
+
+@receiver(post_delete, sender=DetalleVenta, dispatch_uid='detalle_eliminado_cliente')
+def detalle_eliminado_cliente(sender, instance, origin=None, **kwargs):
+    if not _borra_ventas(origin) and not isinstance(origin, Venta):
+        sumar_lineas([instance], signo=-1)
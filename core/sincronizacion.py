@@ -0,0 +1,241 @@
+import gzip
+import json
+import zlib
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caja import CarritoInvalido, validar_carrito
+from .clientes import acumular_compras
+from .concurrencia import escribir
+from .models import DetalleVenta, Producto, Venta, insertar_filas
+from .stock import ajustar_stock
+
+# Ventas por transacción al escribir un lote
+TAMANO_TRAMO = 500
+MAX_VENTAS_LOTE = 10_000
+# Bytes de una línea del JSONL, ya descomprimida
+LARGO_MAX_LINEA = 64 * 1024
+
+ACEPTADA = 'aceptada'
+DUPLICADA = 'duplicada'
+RECHAZADA = 'rechazada'
+
+# Columnas que se insertan directamente; created_at y updated_at las completa insertar_filas
+VENTA_CAMPOS = ('usuario', 'metodo_pago', 'monto_total', 'estado', 'canal_venta', 'fecha', 'clave_idempotencia')
+DETALLE_CAMPOS = ('venta', 'producto', 'cantidad', 'precio_unitario')
+
+
+class LoteInvalido(Exception):
+    pass
+
+
+def leer_jsonl(archivo, comprimido=False):
+    """
+    Líneas no vacías del JSONL como (número de línea, texto), comprimido con
+    gzip o no. Lanza LoteInvalido si el gzip está dañado, si una línea supera
+    LARGO_MAX_LINEA o si hay más de MAX_VENTAS_LOTE ventas.
+    """
+    if comprimido:
+        archivo = gzip.GzipFile(fileobj=archivo, mode='rb')
+    lineas = []
+    numero = 0
+    try:
+        while linea := archivo.readline(LARGO_MAX_LINEA + 1):
+            numero += 1
+            if len(linea) > LARGO_MAX_LINEA:
+                raise LoteInvalido(f'La línea {numero} supera {LARGO_MAX_LINEA} bytes.')
+            if linea.strip():
+                lineas.append((numero, linea))
+                if len(lineas) > MAX_VENTAS_LOTE:
+                    raise LoteInvalido(f'El lote tiene más de {MAX_VENTAS_LOTE} ventas.')
+    except (OSError, EOFError, zlib.error) as e:
+        raise LoteInvalido(f'El lote no es un gzip válido: {e}')
+    return lineas
+
+
+class VentaPendiente:
+    def __init__(self, numero_linea):
+        self.linea = numero_linea
+        self.clave = None
+        self.fecha = None
+        self.metodo_pago_id = None
+        self.canal_venta = 'Local'
+        # (producto_id, cantidad, precio informado por la terminal o None)
+        self.lineas = []
+        self.cantidades = Counter()
+        self.estado = None
+        self.venta_id = None
+        self.errores = []
+
+    def rechazar(self, *errores):
+        self.estado = RECHAZADA
+        self.errores.extend(errores)
+
+    def resultado(self):
+        resultado = {'linea': self.linea, 'id': self.clave, 'estado': self.estado, 'venta': self.venta_id}
+        if self.errores:
+            resultado['errores'] = self.errores
+        return resultado
+
+
+def _interpretar(numero, texto):
+    """VentaPendiente a partir de una línea del JSONL; queda rechazada si la línea no es válida."""
+    pendiente = VentaPendiente(numero)
+    try:
+        datos = json.loads(texto, parse_float=Decimal)
+    except ValueError:
+        pendiente.rechazar('La línea no es JSON.')
+        return pendiente
+    if not isinstance(datos, dict):
+        pendiente.rechazar('La línea debe ser un objeto JSON.')
+        return pendiente
+    pendiente.clave = datos.get('id')
+    if not isinstance(pendiente.clave, str) or not pendiente.clave:
+        pendiente.clave = None
+        pendiente.rechazar('Falta el id de la venta.')
+    pendiente.metodo_pago_id = datos.get('metodo_pago')
+    pendiente.canal_venta = datos.get('canal_venta', 'Local')
+    if 'fecha' in datos:
+        fecha = parse_datetime(datos['fecha']) if isinstance(datos['fecha'], str) else None
+        if fecha is None:
+            pendiente.rechazar('Fecha inválida.')
+        else:
+            pendiente.fecha = fecha if timezone.is_aware(fecha) else timezone.make_aware(fecha)
+    lineas = datos.get('lineas')
+    if not isinstance(lineas, list):
+        pendiente.rechazar('Falta la lista de líneas.')
+        return pendiente
+    for linea in lineas:
+        if isinstance(linea, dict):
+            pendiente.lineas.append((linea.get('producto'), linea.get('cantidad'), linea.get('precio')))
+        else:
+            pendiente.lineas.append((None, None, None))
+    try:
+        pendiente.cantidades = validar_carrito(
+            [(pid, cantidad) for pid, cantidad, _ in pendiente.lineas],
+            pendiente.metodo_pago_id, pendiente.canal_venta, pendiente.clave,
+        )
+    except CarritoInvalido as e:
+        pendiente.rechazar(*e.errores)
+    return pendiente
+
+
+def _validar_precios(pendiente, precios):
+    """Rechaza la venta si nombra productos inexistentes o un precio distinto del vigente."""
+    for i, (producto_id, _, precio) in enumerate(pendiente.lineas, start=1):
+        if producto_id not in precios:
+            pendiente.rechazar(f'Producto {producto_id} inexistente.')
+            continue
+        if precio is None:
+            continue
+        try:
+            precio = Decimal(str(precio))
+        except InvalidOperation:
+            pendiente.rechazar(f'Línea {i}: precio inválido.')
+            continue
+        if precio != precios[producto_id]:
+            pendiente.rechazar(f'Línea {i}: el precio cambió a {precios[producto_id]}.')
+
+
+def _guardar_tramo(usuario, tramo, precios):
+    """
+    Escribe en una transacción las ventas del tramo que no estén registradas
+    y tengan stock, en el orden del lote. Retorna {clave: (estado, venta_id,
+    errores)}; no modifica tramo, así un reintento por bloqueo parte de cero.
+    """
+    resultados = {}
+    with transaction.atomic():
+        registradas = {
+            clave: (venta_id, usuario_id)
+            for clave, venta_id, usuario_id in Venta.all_objects.filter(clave_idempotencia__in=[p.clave for p in tramo])
+            .values_list('clave_idempotencia', 'id', 'usuario_id')
+        }
+        productos = {pid for p in tramo for pid in p.cantidades}
+        # select_for_update bloquea las filas en MySQL; en SQLite la transacción ya tiene el bloqueo de escritura
+        stock = dict(Producto.objects.select_for_update().filter(pk__in=productos).values_list('id', 'stock_actual'))
+        descuentos = Counter()
+        aceptadas = []
+        for pendiente in tramo:
+            if pendiente.clave in registradas:
+                venta_id, dueno = registradas[pendiente.clave]
+                if dueno == usuario.pk:
+                    resultados[pendiente.clave] = (DUPLICADA, venta_id, [])
+                else:
+                    # No se informa la venta de otro usuario
+                    resultados[pendiente.clave] = (RECHAZADA, None, ['El id ya fue usado por otro usuario.'])
+                continue
+            faltan = [pid for pid, cantidad in pendiente.cantidades.items() if stock.get(pid, 0) - descuentos[pid] < cantidad]
+            if faltan:
+                resultados[pendiente.clave] = (RECHAZADA, None, [f'No hay suficiente stock del producto {pid}.' for pid in faltan])
+                continue
+            descuentos.update(pendiente.cantidades)
+            aceptadas.append(pendiente)
+        if not aceptadas:
+            return resultados
+
+        ahora = timezone.now()
+        # monto_total se calcula aquí: las líneas se insertan sin pasar por DetalleVentaQuerySet
+        montos = {p.clave: sum(cantidad * precios[pid] for pid, cantidad in p.cantidades.items()) for p in aceptadas}
+        insertar_filas(Venta, VENTA_CAMPOS, [
+            (usuario.pk, p.metodo_pago_id, montos[p.clave], 'Pagado', p.canal_venta, p.fecha or ahora, p.clave)
+            for p in aceptadas
+        ])
+        # Los id se leen por la clave de cada venta, con o sin RETURNING en la base
+        ids = dict(
+            Venta.all_objects.filter(clave_idempotencia__in=[p.clave for p in aceptadas])
+            .values_list('clave_idempotencia', 'id')
+        )
+        # Un movimiento de stock por venta y producto, con un solo UPDATE de stock_actual
+        ajustar_stock(descuentos, movimientos=[
+            (pid, cantidad, ids[p.clave]) for p in aceptadas for pid, cantidad in p.cantidades.items()
+        ])
+        insertar_filas(DetalleVenta, DETALLE_CAMPOS, [
+            (ids[p.clave], pid, cantidad, precios[pid])
+            for p in aceptadas
+            for pid, cantidad in p.cantidades.items()
+        ])
+        acumular_compras([(usuario.pk, p.fecha or ahora, montos[p.clave], p.cantidades) for p in aceptadas])
+    for pendiente in aceptadas:
+        resultados[pendiente.clave] = (ACEPTADA, ids[pendiente.clave], [])
+    return resultados
+
+
+def sincronizar_ventas(usuario, lineas, tamano_tramo=TAMANO_TRAMO):
+    """
+    Registra las ventas que una terminal acumuló sin conexión. lineas es
+    [(número de línea, JSON de una venta)], como las entrega leer_jsonl();
+    cada venta trae un id propio de la terminal, que queda como su clave de
+    idempotencia: una venta ya subida se informa como duplicada, y una
+    con el id de una venta de otro usuario se rechaza.
+
+    Los precios de todos los productos del lote se leen en una consulta y
+    cada venta se valida contra ellos antes de escribir. Las válidas se
+    guardan en tramos de tamano_tramo ventas, cada uno en su transacción con
+    un INSERT por tabla, un UPDATE de stock y la suma al resumen del
+    cliente; las que no alcanzan stock se rechazan. Retorna un resultado por venta, en el orden del lote.
+    """
+    pendientes = [_interpretar(numero, texto) for numero, texto in lineas]
+    vistas = set()
+    for pendiente in pendientes:
+        if pendiente.clave is not None:
+            if pendiente.clave in vistas:
+                pendiente.rechazar('El id se repite en el lote.')
+            vistas.add(pendiente.clave)
+    productos = {pid for p in pendientes if p.estado is None for pid in p.cantidades}
+    precios = dict(Producto.objects.filter(pk__in=productos).values_list('id', 'precio'))
+    for pendiente in pendientes:
+        if pendiente.estado is None:
+            _validar_precios(pendiente, precios)
+
+    validas = [p for p in pendientes if p.estado is None]
+    for inicio in range(0, len(validas), tamano_tramo):
+        tramo = validas[inicio:inicio + tamano_tramo]
+        resultados = escribir(_guardar_tramo, usuario, tramo, precios)
+        for pendiente in tramo:
+            pendiente.estado, pendiente.venta_id, errores = resultados[pendiente.clave]
+            pendiente.errores.extend(errores)
+    return [pendiente.resultado() for pendiente in pendientes]
@@ -0,0 +1,218 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, F, IntegerField, Max, Sum, Value, When
+from django.utils import timezone
+
+from .alertas import revisar_alertas
+from .concurrencia import escritura
+from .models import CorteStock, DetalleVenta, MovimientoStock, Producto, insertar_filas
+
+TAMANO_LOTE = 2000
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, fallidos):
+        # fallidos: lista de (producto_id, cantidad solicitada)
+        self.fallidos = fallidos
+        nombres = dict(
+            Producto.objects.filter(pk__in=[pid for pid, _ in fallidos]).values_list('id', 'nombre')
+        )
+        detalle = ', '.join(f'{nombres.get(pid, pid)} (solicitado: {cantidad})' for pid, cantidad in fallidos)
+        super().__init__(f'No hay suficiente stock para: {detalle}')
+
+
+def _agrupar(lineas):
+    totales = Counter()
+    for producto_id, cantidad in lineas:
+        totales[producto_id] += cantidad
+    return totales
+
+
+def _por_producto(valores):
+    """Case() con el valor de valores para cada producto, para un solo UPDATE."""
+    return Case(*(When(pk=pid, then=Value(valor)) for pid, valor in valores.items()), output_field=IntegerField())
+
+
+def registrar_movimientos(movimientos):
+    """Inserta en MovimientoStock los movimientos (producto_id, cantidad, tipo, venta_id) con un executemany."""
+    if movimientos:
+        insertar_filas(MovimientoStock, ('producto', 'cantidad', 'tipo', 'venta'), movimientos)
+
+
+def registrar_movimientos_de(queryset, cantidad, tipo):
+    """
+    Un movimiento por producto del queryset con un solo INSERT ... SELECT.
+    cantidad es una expresión sobre las columnas del producto; debe
+    ejecutarse antes del UPDATE que cambie esas columnas.
+    """
+    seleccion = queryset.order_by().annotate(
+        movimiento_cantidad=cantidad,
+        movimiento_tipo=Value(tipo),
+        movimiento_fecha=Value(timezone.now(), output_field=DateTimeField()),
+    ).values_list('pk', 'movimiento_cantidad', 'movimiento_tipo', 'movimiento_fecha')
+    select, params = seleccion.query.get_compiler(using=seleccion.db).as_sql()
+    qn = connection.ops.quote_name
+    columnas = ', '.join(qn(MovimientoStock._meta.get_field(c).column) for c in ('producto', 'cantidad', 'tipo', 'fecha'))
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {qn(MovimientoStock._meta.db_table)} ({columnas}) {select}', params)
+
+
+@escritura
+def ajustar_stock(deltas, tipo=MovimientoStock.VENTA, venta_id=None, movimientos=None):
+    """
+    Aplica variaciones de stock por producto dentro de una sola transacción.
+
+    Los descuentos (delta positivo) van en un solo UPDATE condicional
+    (stock_actual >= delta de cada fila) y las devoluciones en otro. Si algún
+    descuento no alcanza, se revierte todo y se lanza StockInsuficiente con
+    los productos que fallaron. Fuera de un atomic() externo se reintenta si
+    la base está bloqueada (ver core/concurrencia.py).
+
+    Cada variación queda en MovimientoStock con tipo y venta_id; movimientos
+    [(producto_id, cantidad, venta_id)] las detalla por venta cuando deltas
+    agrupa varias (las cantidades son descuentos, como en deltas). Las
+    alertas de stock bajo de esos productos se revisan en la misma transacción.
+    """
+    descuentos = {pid: delta for pid, delta in deltas.items() if delta > 0}
+    devoluciones = {pid: delta for pid, delta in deltas.items() if delta < 0}
+    completo = True
+    with transaction.atomic():
+        if descuentos:
+            delta = _por_producto(descuentos)
+            actualizados = Producto.objects.filter(
+                pk__in=descuentos, stock_actual__gte=delta,
+            ).update(stock_actual=F('stock_actual') - delta)
+            completo = actualizados == len(descuentos)
+        if not completo:
+            # Revierte el savepoint antes de consultar cuáles no alcanzaron
+            transaction.set_rollback(True)
+        else:
+            if devoluciones:
+                Producto.objects.filter(pk__in=devoluciones).update(stock_actual=F('stock_actual') - _por_producto(devoluciones))
+            if movimientos is None:
+                movimientos = [(pid, delta, venta_id) for pid, delta in deltas.items() if delta]
+            registrar_movimientos([(pid, -cantidad, tipo, vid) for pid, cantidad, vid in movimientos if cantidad])
+            revisar_alertas(list(deltas))
+    if not completo:
+        disponibles = dict(Producto.objects.filter(pk__in=descuentos).values_list('id', 'stock_actual'))
+        raise StockInsuficiente([
+            (pid, delta) for pid, delta in sorted(descuentos.items())
+            if disponibles.get(pid, 0) < delta
+        ])
+
+
+@escritura
+def agotar_stock(queryset):
+    """Deja en 0 el stock de los productos del queryset; los que tenían stock registran el movimiento."""
+    with transaction.atomic():
+        registrar_movimientos_de(queryset.filter(stock_actual__gt=0), -F('stock_actual'), MovimientoStock.AGOTADO)
+        actualizados = queryset.update(stock_actual=0)
+        revisar_alertas(queryset.values('pk'))
+    return actualizados
+
+
+def reservar_stock(lineas):
+    """Descuenta el stock de las líneas (producto_id, cantidad) de una venta."""
+    ajustar_stock(_agrupar(lineas))
+
+
+def devolver_stock(ventas):
+    """
+    Devuelve al stock las unidades de las líneas vigentes de las ventas (un
+    queryset), con un movimiento por venta y producto, antes de eliminarlas.
+    Como al crearlas, el ORM no toca el stock: lo llama quien elimina ventas
+    ya descontadas (el admin).
+    """
+    filas = list(
+        DetalleVenta.objects.filter(venta__in=ventas)
+        .order_by().values('venta_id', 'producto_id').annotate(total=Sum('cantidad'))
+        .values_list('venta_id', 'producto_id', 'total')
+    )
+    deltas = Counter()
+    for _, producto_id, total in filas:
+        deltas[producto_id] -= total
+    ajustar_stock(deltas, movimientos=[(producto_id, -total, venta_id) for venta_id, producto_id, total in filas])
+
+
+def cantidades_por_producto(venta):
+    return Counter(dict(
+        DetalleVenta.objects.filter(venta=venta)
+        .values('producto_id')
+        .annotate(total=Sum('cantidad'))
+        .values_list('producto_id', 'total')
+    ))
+
+
+def diferencia_stock(antes, despues):
+    deltas = {}
+    for producto_id in set(antes) | set(despues):
+        delta = despues.get(producto_id, 0) - antes.get(producto_id, 0)
+        if delta:
+            deltas[producto_id] = delta
+    return deltas
+
+
+def stock_segun_movimientos(completo=False):
+    """
+    Stock de cada producto según MovimientoStock, en una sola pasada por los
+    movimientos: {producto_id: stock} y el id del último movimiento leído.
+
+    Parte de CorteStock y solo suma los movimientos posteriores al corte de
+    cada producto; con completo=True suma el registro entero desde cero.
+    Los productos sin corte ni movimientos no aparecen.
+    """
+    tope = MovimientoStock.objects.aggregate(m=Max('id'))['m'] or 0
+    stock, marcas = {}, {}
+    if not completo:
+        cortes = CorteStock.objects.values_list('producto_id', 'stock', 'ultimo_movimiento_id')
+        for producto_id, corte, marca in cortes.iterator(chunk_size=TAMANO_LOTE):
+            stock[producto_id] = corte
+            marcas[producto_id] = marca
+    movimientos = (
+        MovimientoStock.objects.filter(id__gt=min(marcas.values(), default=0), id__lte=tope)
+        .order_by().values_list('id', 'producto_id', 'cantidad')
+    )
+    for movimiento_id, producto_id, cantidad in movimientos.iterator(chunk_size=TAMANO_LOTE):
+        if movimiento_id > marcas.get(producto_id, 0):
+            stock[producto_id] = stock.get(producto_id, 0) + cantidad
+    return stock, tope
+
+
+def compactar_stock():
+    """
+    Lleva los cortes de stock hasta el último movimiento: desde ahí,
+    stock_segun_movimientos() solo lee lo registrado después. Los
+    movimientos se conservan como historial. Retorna los cortes escritos.
+    """
+    with transaction.atomic():
+        stock, tope = stock_segun_movimientos()
+        CorteStock.objects.bulk_create(
+            [CorteStock(producto_id=pid, stock=valor, ultimo_movimiento_id=tope) for pid, valor in stock.items()],
+            batch_size=TAMANO_LOTE, update_conflicts=True, unique_fields=['producto'],
+            update_fields=['stock', 'ultimo_movimiento_id', 'fecha'],
+        )
+    return len(stock)
+
+
+def reconciliar_stock(completo=False, aplicar=True):
+    """
+    Compara stock_actual con el stock según los movimientos y, con aplicar,
+    corrige los productos que difieren con UPDATEs por lote. Retorna
+    [(producto_id, stock_actual, según movimientos)] de los que diferían;
+    un stock negativo según los movimientos se informa pero no se aplica.
+    """
+    with transaction.atomic():
+        esperado, _ = stock_segun_movimientos(completo)
+        diferencias = []
+        productos = Producto.all_objects.order_by().values_list('id', 'stock_actual')
+        for producto_id, actual in productos.iterator(chunk_size=TAMANO_LOTE):
+            if producto_id in esperado and esperado[producto_id] != actual:
+                diferencias.append((producto_id, actual, esperado[producto_id]))
+        if aplicar:
+            corregibles = [(pid, valor) for pid, _, valor in diferencias if valor >= 0]
+            for inicio in range(0, len(corregibles), TAMANO_LOTE):
+                lote = dict(corregibles[inicio:inicio + TAMANO_LOTE])
+                Producto.all_objects.filter(pk__in=lote).update(stock_actual=_por_producto(lote))
+                revisar_alertas(list(lote))
+    return diferencias
@@ -1,3 +1,1907 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import tracemalloc
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.models import ProtectedError
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from unittest import mock, skipUnless
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .cache_maestros import CATEGORIAS, NUTRICIONALES, ROLES, CacheMaestro
+from .caja import CarritoInvalido, registrar_venta
+from .carga import generar_carga, servidor
+from . import alertas, clientes, concurrencia
+from .datos_sinteticos import generar_ventas
+from .exportacion import ENCABEZADOS, exportar, lineas_de_venta
+from .importacion import ArchivoInvalido, importar_productos
+from . import instrumentacion, politica
+from .models import (
+    AlertaStock, Categoria, CompraProducto, CorteStock, DetalleVenta, DiaPendienteResumen, Direccion, MetodoPago, MovimientoStock, Nutricional,
+    Producto, ResumenCliente, ResumenVentaDiario, Rol, Usuario, Venta,
+)
+from . import reposicion
+from .registro import ArchivoRotativo
+from .rendimiento_admin import cargar_presupuestos, ejecutar_suite, excesos, guardar_presupuestos, paginas
+from .resumen import DIMENSIONES, ingresos, ingresos_sin_resumen, refrescar_resumen
+from .roles import TipoRol, get_rol, invalidar_cache_roles, resolver_rol
+from .sincronizacion import sincronizar_ventas
+from .stock import StockInsuficiente, ajustar_stock, compactar_stock, reconciliar_stock, reservar_stock
+from .totales import ventas_descuadradas
+
+
+def crear_datos_base(test):
+    test.rol_admin = Rol.objects.create(nombre='Admin')
+    test.rol_cliente = Rol.objects.create(nombre='Cliente')
+    test.admin = Usuario.objects.create_superuser(
+        username='admin', email='admin@forneria.cl', password='admin123',
+        first_name='Admin', paterno='Sistema', run='11111111-1', rol=test.rol_admin,
+    )
+    test.cliente = Usuario.objects.create_user(
+        username='cliente', email='cliente@forneria.cl', password='cliente123',
+        first_name='Juan', paterno='Pérez', run='22222222-2', rol=test.rol_cliente, is_staff=True,
+    )
+    test.cliente.user_permissions.set(Permission.objects.filter(
+        codename__in=['view_venta', 'view_usuario', 'change_usuario'],
+    ))
+    test.categoria = Categoria.objects.create(nombre='Panadería')
+    test.efectivo = MetodoPago.objects.create(nombre='Efectivo')
+    test.producto = Producto.objects.create(
+        nombre='Marraqueta', precio=Decimal('1200.00'), tipo='Propia',
+        categoria=test.categoria, stock_actual=50,
+    )
+
+
+def consultas_de_rol(queries):
+    # Por id o la carga completa del cache de maestros
+    return [q['sql'] for q in queries if 'FROM "core_rol"' in q['sql']]
+
+
+class ResolucionRolTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        invalidar_cache_roles()
+
+    def test_tipo_rol(self):
+        self.assertIs(resolver_rol(self.cliente).tipo, TipoRol.CLIENTE)
+        self.assertIs(resolver_rol(self.admin).tipo, TipoRol.ADMIN)
+        self.assertIs(resolver_rol(Usuario(username='x')).tipo, TipoRol.SIN_ROL)
+
+    def test_cache_de_proceso(self):
+        resolver_rol(self.cliente)
+        with self.assertNumQueries(0):
+            resolver_rol(self.cliente)
+
+    def test_invalidacion_al_guardar_rol(self):
+        resolver_rol(self.cliente)
+        self.rol_cliente.nombre = 'Admin'
+        self.rol_cliente.save()
+        self.assertIs(resolver_rol(self.cliente).tipo, TipoRol.ADMIN)
+
+    def test_invalidacion_durante_la_carga(self):
+        filas = list(Rol.objects.order_by('pk'))
+
+        def cargar(*args):
+            # Otro hilo invalida mientras este lee la tabla: no se guarda, pero se usa
+            ROLES._descartar()
+            return filas
+
+        with mock.patch.object(Rol.objects, 'order_by', side_effect=cargar):
+            self.assertIs(resolver_rol(self.cliente).tipo, TipoRol.CLIENTE)
+
+    def test_cache_por_request(self):
+        class Req:
+            user = self.cliente
+        request = Req()
+        rol = get_rol(request)
+        invalidar_cache_roles()
+        with self.assertNumQueries(0):
+            self.assertIs(get_rol(request), rol)
+
+    def test_paginas_admin_una_consulta_de_rol(self):
+        paginas = [
+            '/admin/',
+            '/admin/core/venta/',
+            '/admin/core/usuario/',
+            f'/admin/core/usuario/{self.cliente.id}/change/',
+        ]
+        for usuario in (self.admin, self.cliente):
+            self.client.force_login(usuario)
+            for url in paginas:
+                invalidar_cache_roles()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, url)
+                self.assertEqual(len(consultas_de_rol(ctx.captured_queries)), 1, url)
+                # Con el cache de roles cargado no se vuelve a leer la tabla
+                with CaptureQueriesContext(connection) as ctx:
+                    self.client.get(url)
+                self.assertEqual(consultas_de_rol(ctx.captured_queries), [], url)
+
+    def test_cliente_solo_ve_sus_ventas(self):
+        Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo, monto_total=Decimal('1200.00'))
+        Venta.objects.create(usuario=self.admin, metodo_pago=self.efectivo, monto_total=Decimal('900.00'))
+        self.client.force_login(self.cliente)
+        response = self.client.get('/admin/core/venta/')
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class ReservaStockTests(TransactionTestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        invalidar_cache_roles()
+
+    def test_reserva_descuenta_por_producto(self):
+        otro = Producto.objects.create(
+            nombre='Torta', precio=Decimal('8500.00'), tipo='Propia', categoria=self.categoria, stock_actual=5,
+        )
+        reservar_stock([(self.producto.id, 3), (otro.id, 2), (self.producto.id, 4)])
+        self.producto.refresh_from_db()
+        otro.refresh_from_db()
+        self.assertEqual((self.producto.stock_actual, otro.stock_actual), (43, 3))
+
+    def test_reserva_fallida_no_descuenta_nada(self):
+        otro = Producto.objects.create(
+            nombre='Torta', precio=Decimal('8500.00'), tipo='Propia', categoria=self.categoria, stock_actual=1,
+        )
+        with self.assertRaises(StockInsuficiente) as ctx:
+            reservar_stock([(self.producto.id, 3), (otro.id, 2)])
+        self.assertEqual(ctx.exception.fallidos, [(otro.id, 2)])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 50)
+
+    def test_reserva_concurrente_sin_sobreventa(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock_actual=20)
+        resultados = []
+
+        def comprar():
+            try:
+                reservar_stock([(self.producto.id, 1)])
+                resultados.append(True)
+            except StockInsuficiente:
+                resultados.append(False)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar) for _ in range(40)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.producto.refresh_from_db()
+        self.assertEqual(resultados.count(True), 20)
+        self.assertEqual(self.producto.stock_actual, 0)
+
+    def _datos_venta(self, cantidad, detalle_id='', venta_id=''):
+        return {
+            'usuario': self.cliente.id,
+            'metodo_pago': self.efectivo.id,
+            'monto_total': '1200.00',
+            'estado': 'Pendiente',
+            'canal_venta': 'Local',
+            'detalleventa_set-TOTAL_FORMS': '1',
+            'detalleventa_set-INITIAL_FORMS': '1' if detalle_id else '0',
+            'detalleventa_set-0-id': detalle_id,
+            'detalleventa_set-0-venta': venta_id,
+            'detalleventa_set-0-producto': self.producto.id,
+            'detalleventa_set-0-cantidad': str(cantidad),
+            'detalleventa_set-0-precio_unitario': '1200.00',
+        }
+
+    def test_admin_descuenta_stock_al_guardar_venta(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/core/venta/add/', self._datos_venta(4))
+        self.assertEqual(response.status_code, 302)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 46)
+
+        venta = Venta.objects.get()
+        detalle = venta.detalleventa_set.get()
+        response = self.client.post(
+            f'/admin/core/venta/{venta.id}/change/', self._datos_venta(6, detalle.id, venta.id),
+        )
+        self.assertEqual(response.status_code, 302)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 44)
+        venta.refresh_from_db()
+        self.assertEqual(venta.monto_total, Decimal('7200.00'))
+
+
+class ReposicionStockTests(TransactionTestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.pasteleria = Categoria.objects.create(nombre='Pastelería', stock_objetivo=20)
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Producto {i}', precio=Decimal('1000.00'), tipo='Propia',
+                categoria=self.pasteleria if i % 2 else self.categoria, stock_actual=i,
+            )
+            for i in range(8)
+        ]
+        self.productos[0].stock_objetivo = 80
+        self.productos[0].save()
+
+    def stocks(self):
+        return list(Producto.objects.filter(
+            pk__in=[p.pk for p in self.productos]).order_by('nombre').values_list('stock_actual', flat=True))
+
+    def test_reposicion_en_un_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            actualizados = reposicion.reponer_stock(Producto.objects.all())
+        # Un INSERT ... SELECT de movimientos y un UPDATE, en su transacción; las alertas de stock se revisan aparte
+        sentencias = [q['sql'].split()[0] for q in ctx.captured_queries if 'core_alertastock' not in q['sql']]
+        self.assertEqual([s for s in sentencias if s not in ('BEGIN', 'COMMIT')], ['INSERT', 'UPDATE'])
+        self.assertEqual(actualizados, 5)
+        # Producto propio > categoría > valor por defecto; los con stock >= 5 no cambian
+        self.assertEqual(self.stocks(), [80, 20, 50, 20, 50, 5, 6, 7])
+
+    def test_reposicion_en_segundo_plano(self):
+        with mock.patch.object(reposicion, 'TAMANO_LOTE', 2):
+            tarea = reposicion.reponer_en_segundo_plano(Producto.objects.all(), self.admin.pk)
+            tarea.hilo.join()
+        self.assertEqual((tarea.procesados, tarea.actualizados, tarea.porcentaje), (5, 5, 100))
+        self.assertEqual(self.stocks(), [80, 20, 50, 20, 50, 5, 6, 7])
+        self.assertEqual(reposicion.tareas_de_usuario(self.admin.pk), [tarea])
+        self.assertEqual(reposicion.tareas_de_usuario(self.admin.pk), [])
+
+    def test_accion_admin_en_segundo_plano_informa_avance(self):
+        self.client.force_login(self.admin)
+        with mock.patch('core.admin.LIMITE_SINCRONO', 3):
+            self.client.post('/admin/core/producto/', {
+                'action': 'actualizar_stock',
+                '_selected_action': [p.pk for p in self.productos],
+            })
+        for hilo in [t.hilo for t in reposicion._tareas.values()]:
+            hilo.join()
+        response = self.client.get('/admin/core/producto/')
+        mensajes = [str(m) for m in response.context['messages']]
+        self.assertEqual(mensajes, [
+            'Reposición de 5 productos iniciada en segundo plano.',
+            'Reposición terminada: stock actualizado para 5 productos.',
+        ])
+
+
+class MontoTotalTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.venta = Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo)
+        self.otra = Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo)
+
+    def linea(self, cantidad, precio, venta=None):
+        return DetalleVenta(venta=venta or self.venta, producto=self.producto, cantidad=cantidad, precio_unitario=Decimal(precio))
+
+    def montos(self):
+        return [v.monto_total for v in Venta.objects.filter(pk__in=[self.venta.pk, self.otra.pk]).order_by('pk')]
+
+    def test_deltas_en_save_y_delete(self):
+        detalle = self.linea(2, '1200.00')
+        detalle.save()
+        self.linea(1, '500.50').save()
+        self.assertEqual(self.montos(), [Decimal('2900.50'), 0])
+
+        detalle = DetalleVenta.objects.get(pk=detalle.pk)
+        detalle.cantidad = 3
+        detalle.save()
+        self.assertEqual(self.montos(), [Decimal('4100.50'), 0])
+
+        detalle.venta = self.otra
+        detalle.save()
+        self.assertEqual(self.montos(), [Decimal('500.50'), Decimal('3600.00')])
+
+        detalle.delete()
+        DetalleVenta.objects.filter(venta=self.venta).delete()
+        self.assertEqual(self.montos(), [0, 0])
+
+    def test_deltas_en_rutas_masivas(self):
+        lineas = DetalleVenta.objects.bulk_create([
+            self.linea(1, '100.00'), self.linea(2, '100.00'), self.linea(5, '10.00', self.otra),
+        ])
+        self.assertEqual(self.montos(), [Decimal('300.00'), Decimal('50.00')])
+
+        DetalleVenta.objects.filter(venta=self.venta).update(precio_unitario=Decimal('200.00'))
+        self.assertEqual(self.montos(), [Decimal('600.00'), Decimal('50.00')])
+
+        lineas[2].cantidad = 1
+        DetalleVenta.objects.bulk_update([lineas[2]], ['cantidad'])
+        self.assertEqual(self.montos(), [Decimal('600.00'), Decimal('10.00')])
+
+    def test_comando_recalcula_y_verifica(self):
+        self.linea(2, '1200.00').save()
+        Venta.objects.filter(pk=self.venta.pk).update(monto_total=Decimal('1.00'))
+        # El resumen del cliente rehecho con el monto descuadrado
+        clientes.recalcular_clientes([self.cliente.pk])
+        with self.assertRaises(CommandError):
+            call_command('recalcular_montos', '--verificar', stdout=io.StringIO())
+        call_command('recalcular_montos', stdout=io.StringIO())
+        call_command('recalcular_montos', '--verificar', stdout=io.StringIO())
+        self.assertEqual(self.montos(), [Decimal('2400.00'), 0])
+        # El resumen del cliente también vuelve a cuadrar
+        self.assertEqual(ResumenCliente.objects.get(usuario=self.cliente).total_gastado, Decimal('2400.00'))
+
+
+class ResumenVentasTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.tarjeta = MetodoPago.objects.create(nombre='Tarjeta')
+        ahora = timezone.now()
+        for dias, canal, metodo, cantidad in [
+            (0, 'Local', self.efectivo, 2), (0, 'Local', self.efectivo, 1),
+            (1, 'Online', self.tarjeta, 3), (9, 'Local', self.tarjeta, 1),
+        ]:
+            venta = Venta.objects.create(
+                usuario=self.cliente, metodo_pago=metodo, canal_venta=canal,
+                fecha=ahora - datetime.timedelta(days=dias),
+            )
+            DetalleVenta.objects.create(
+                venta=venta, producto=self.producto, cantidad=cantidad, precio_unitario=Decimal('1200.00'),
+            )
+
+    def test_resumen_coincide_con_agregacion_directa(self):
+        refrescar_resumen()
+        for por in DIMENSIONES:
+            for periodo in ('dia', 'semana'):
+                self.assertEqual(list(ingresos(por, periodo)), list(ingresos_sin_resumen(por, periodo)))
+
+    def test_refresco_incremental(self):
+        self.assertEqual(refrescar_resumen(), 3)
+        self.assertEqual(refrescar_resumen(), 0)
+        venta = Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo, canal_venta='Local')
+        DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=4, precio_unitario=Decimal('1000.00'))
+        # Solo se reescribe el día de la línea nueva
+        self.assertEqual(refrescar_resumen(), 1)
+        fila = ResumenVentaDiario.objects.get(fecha=timezone.now().date(), canal_venta='Local')
+        self.assertEqual((fila.cantidad, fila.monto, fila.num_ventas), (7, Decimal('7600.00'), 3))
+
+    def assertCuadra(self):
+        refrescar_resumen()
+        for por in DIMENSIONES:
+            self.assertEqual(list(ingresos(por, 'dia')), list(ingresos_sin_resumen(por, 'dia')), por)
+
+    def test_ediciones_recalculan_sus_dias(self):
+        refrescar_resumen()
+        linea = DetalleVenta.objects.get(cantidad=3)
+        linea.cantidad = 5
+        linea.save()
+        self.assertCuadra()
+        DetalleVenta.objects.filter(cantidad=1).update(precio_unitario=Decimal('900.00'))
+        self.assertCuadra()
+        antigua = Venta.objects.earliest('fecha')
+        antigua.canal_venta = 'WhatsApp'
+        antigua.save()
+        self.assertCuadra()
+        # Mover la venta recalcula el día que deja y el que recibe
+        Venta.objects.filter(pk=antigua.pk).update(fecha=antigua.fecha + datetime.timedelta(days=5))
+        self.assertCuadra()
+        antigua.refresh_from_db()
+        antigua.fecha -= datetime.timedelta(days=2)
+        antigua.save()
+        self.assertCuadra()
+        linea.delete()
+        self.assertCuadra()
+        venta = Venta.objects.filter(canal_venta='Local').first()
+        venta.delete()
+        self.assertCuadra()
+        Venta.all_objects.filter(pk=venta.pk).restore()
+        self.assertCuadra()
+        venta.hard_delete()
+        self.assertCuadra()
+        self.assertFalse(DiaPendienteResumen.objects.exists())
+
+    def test_refresco_sin_pendientes_solo_lee(self):
+        refrescar_resumen()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(refrescar_resumen(), 0)
+        self.assertTrue(all(q['sql'].startswith('SELECT') for q in ctx.captured_queries))
+
+    def test_panel_admin(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        with mock.patch('core.resumen.refrescar_resumen') as refrescar:
+            response = self.client.get('/admin/core/resumenventadiario/')
+            self.client.get('/admin/core/resumenventadiario/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Totales por canal')
+        # Mirar el panel no refresca en cada visita
+        self.assertEqual(refrescar.call_count, 1)
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get('/admin/core/resumenventadiario/').status_code, 403)
+
+
+# Tablas con volumen. Las maestras (roles, categorías, métodos de pago...) y los resúmenes diarios,
+# que el panel totaliza completos dentro del filtro actual, se leen enteros a propósito
+TABLAS_VOLUMINOSAS = ('core_venta', 'core_detalleventa', 'core_producto', 'core_usuario')
+
+
+def planes_con_escaneo(queries):
+    """Consultas cuyo plan SQLite recorre una tabla voluminosa completa u ordena todas sus filas."""
+    problemas = []
+    with connection.cursor() as cursor:
+        for sql in (q['sql'] for q in queries):
+            if not sql.startswith('SELECT'):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            for detalle in (fila[3] for fila in cursor.fetchall()):
+                escaneo_completo = any(
+                    detalle == f'SCAN {tabla}' for tabla in TABLAS_VOLUMINOSAS
+                ) and ' LIMIT ' not in sql
+                orden_completo = 'TEMP B-TREE FOR ORDER BY' in detalle and ' LIMIT ' in sql and ' GROUP BY ' not in sql
+                if escaneo_completo or orden_completo:
+                    problemas.append(f'{detalle}: {sql}')
+    return problemas
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es específico de SQLite')
+class PlanesConsultaAdminTests(TestCase):
+    paginas = [
+        '/admin/core/venta/',
+        '/admin/core/venta/?estado__exact=Pagado',
+        '/admin/core/venta/?canal_venta__exact=Local',
+        '/admin/core/venta/?estado__exact=Pagado&canal_venta__exact=Local',
+        '/admin/core/detalleventa/',
+        '/admin/core/producto/',
+        '/admin/core/producto/?tipo__exact=Propia',
+        '/admin/core/producto/?categoria__id__exact=1',
+        '/admin/core/usuario/',
+        '/admin/core/resumenventadiario/',
+    ]
+
+    def setUp(self):
+        crear_datos_base(self)
+        # Más filas que list_per_page para que los changelists paginen como en producción
+        ventas = Venta.objects.bulk_create([
+            Venta(usuario=self.cliente, metodo_pago=self.efectivo, estado='Pagado', canal_venta='Local')
+            for _ in range(120)
+        ])
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(venta=venta, producto=self.producto, cantidad=1, precio_unitario=Decimal('1200.00'))
+            for venta in ventas
+        ])
+
+    def test_paginas_siguientes_sin_escaneos_completos(self):
+        self.client.force_login(self.admin)
+        for url in ('/admin/core/venta/', '/admin/core/venta/?estado__exact=Pagado', '/admin/core/detalleventa/'):
+            base = url.split('?')[0]
+            siguiente = self.client.get(url).context['cl'].url_siguiente
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(base + siguiente)
+            self.assertEqual(response.status_code, 200, siguiente)
+            self.assertEqual(planes_con_escaneo(ctx.captured_queries), [], siguiente)
+
+    def test_changelists_sin_escaneos_completos(self):
+        self.client.force_login(self.admin)
+        for url in self.paginas:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(planes_con_escaneo(ctx.captured_queries), [], url)
+
+
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.ventas = []
+        for cantidad in (1, 2, 3):
+            venta = Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo)
+            DetalleVenta.objects.bulk_create([
+                DetalleVenta(venta=venta, producto=self.producto, cantidad=cantidad, precio_unitario=Decimal('100.00')),
+                DetalleVenta(venta=venta, producto=self.producto, cantidad=1, precio_unitario=Decimal('50.00')),
+            ])
+            self.ventas.append(venta)
+
+    def test_managers_excluyen_eliminados(self):
+        self.producto.delete()
+        self.assertFalse(Producto.objects.filter(pk=self.producto.pk).exists())
+        self.assertIsNotNone(Producto.all_objects.get(pk=self.producto.pk).deleted_at)
+        # Las FK siguen resolviendo hacia filas eliminadas
+        self.assertEqual(DetalleVenta.objects.first().producto, self.producto)
+
+    def test_soft_delete_masivo_es_un_update(self):
+        with self.assertNumQueries(1):
+            Producto.objects.filter(pk=self.producto.pk).soft_delete()
+        self.assertEqual(Producto.objects.count(), 0)
+
+    def test_cascada_venta_detalle(self):
+        eliminar = Venta.objects.filter(pk__in=[self.ventas[0].pk, self.ventas[1].pk])
+        with CaptureQueriesContext(connection) as ctx:
+            eliminar.soft_delete()
+        # Un UPDATE por tabla; las demás consultas rehacen el resumen de compras del cliente
+        updates = [q['sql'].split()[1] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(updates, ['"core_detalleventa"', '"core_venta"'])
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertEqual(DetalleVenta.objects.count(), 2)
+        # La venta eliminada conserva su monto
+        self.assertEqual(Venta.all_objects.get(pk=self.ventas[0].pk).monto_total, Decimal('150.00'))
+
+        Venta.all_objects.filter(pk=self.ventas[0].pk).restore()
+        self.assertEqual(Venta.objects.count(), 2)
+        self.assertEqual(DetalleVenta.objects.count(), 4)
+
+    def test_linea_eliminada_descuenta_monto(self):
+        venta = self.ventas[2]
+        venta.detalleventa_set.get(cantidad=3).delete()
+        venta.refresh_from_db()
+        self.assertEqual(venta.monto_total, Decimal('50.00'))
+        DetalleVenta.all_objects.filter(venta=venta).restore()
+        venta.refresh_from_db()
+        self.assertEqual(venta.monto_total, Decimal('350.00'))
+
+    def test_admin_elimina_con_soft_delete(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/core/venta/', {
+            'action': 'delete_selected',
+            '_selected_action': [self.ventas[0].pk],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Venta.all_objects.filter(pk=self.ventas[0].pk).exists())
+        self.assertFalse(Venta.objects.filter(pk=self.ventas[0].pk).exists())
+        self.assertEqual(self.client.get('/admin/core/venta/').context['cl'].result_count, 2)
+
+    def test_hard_delete(self):
+        self.ventas[0].hard_delete()
+        self.assertFalse(Venta.all_objects.filter(pk=self.ventas[0].pk).exists())
+        self.assertEqual(DetalleVenta.all_objects.count(), 4)
+
+    def test_unicidad_incluye_eliminados(self):
+        eliminado = Usuario.objects.create_user(username='exempleado', run='33333333-3', first_name='Ex', paterno='Empleado')
+        eliminado.delete()
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/core/usuario/add/', {
+            'username': 'exempleado', 'usable_password': 'true', 'password1': 'clave-larga-123', 'password2': 'clave-larga-123',
+        })
+        # Error del formulario y no IntegrityError al guardar
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('username', response.context['adminform'].form.errors)
+        with self.assertRaises(ValidationError) as error:
+            Usuario(username='nuevo', run='33333333-3', first_name='Nuevo', paterno='Empleado').validate_unique()
+        self.assertEqual(list(error.exception.message_dict), ['run'])
+
+        self.producto.codigo = 'MRQ-1'
+        self.producto.save()
+        self.producto.delete()
+        with self.assertRaises(ValidationError):
+            Producto(nombre='Otra', precio=1, tipo='Propia', categoria=self.categoria, codigo='MRQ-1').validate_unique()
+        # Editar la fila eliminada no choca consigo misma
+        Producto.all_objects.get(pk=self.producto.pk).validate_unique()
+
+
+    def test_rol_con_usuarios_protegido(self):
+        with self.assertRaises(ProtectedError):
+            Rol.objects.filter(nombre='Cliente').delete()
+        with self.assertRaises(ProtectedError):
+            self.rol_cliente.delete()
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/core/rol/', {
+            'action': 'delete_selected', '_selected_action': [self.rol_cliente.pk], 'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Rol.objects.filter(pk=self.rol_cliente.pk).exists())
+        # Sin usuarios se elimina como cualquier otra fila
+        Rol.objects.create(nombre='Temporal').delete()
+        self.assertFalse(Rol.objects.filter(nombre='Temporal').exists())
+
+    def test_rol_eliminado_no_concede_acceso(self):
+        Venta.objects.create(usuario=self.admin, metodo_pago=self.efectivo)
+        # Un rol eliminado por fuera del ORM: el usuario queda con un rol_id que no está vigente
+        Rol.all_objects.filter(pk=self.rol_cliente.pk).update(deleted_at=timezone.now())
+        invalidar_cache_roles()
+        rol = resolver_rol(self.cliente)
+        self.assertIs(rol.tipo, TipoRol.DESCONOCIDO)
+        self.assertTrue(rol.es_cliente)
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get('/admin/core/producto/').status_code, 403)
+        self.assertEqual(self.client.get('/admin/core/venta/').status_code, 403)
+
+
+class PaginacionKeysetTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        ahora = timezone.now()
+        # Varias ventas comparten fecha para ejercitar el desempate por id
+        Venta.objects.bulk_create([
+            Venta(usuario=self.cliente, metodo_pago=self.efectivo, fecha=ahora - datetime.timedelta(minutes=i // 3))
+            for i in range(35)
+        ])
+        self.esperado = list(Venta.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+        self.client.force_login(self.admin)
+
+    def recorrer(self, url):
+        paginas = []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse([q for q in ctx.captured_queries if 'OFFSET' in q['sql']])
+            cl = response.context['cl']
+            paginas.append([obj.id for obj in cl.result_list])
+            url = cl.url_siguiente and '/admin/core/venta/' + cl.url_siguiente
+        return paginas, cl
+
+    @mock.patch('core.admin.VentaAdmin.list_per_page', 10)
+    def test_recorre_todas_las_paginas_sin_offset(self):
+        paginas, cl = self.recorrer('/admin/core/venta/')
+        self.assertEqual([len(p) for p in paginas], [10, 10, 10, 5])
+        self.assertEqual(sum(paginas, []), self.esperado)
+
+        # Volver hacia atrás desde la última página
+        response = self.client.get('/admin/core/venta/' + cl.url_anterior)
+        self.assertEqual([obj.id for obj in response.context['cl'].result_list], paginas[2])
+
+    @mock.patch('core.admin.VentaAdmin.list_per_page', 10)
+    @mock.patch('core.paginacion.LIMITE_CONTEO', 20)
+    def test_conteo_acotado_y_opcional(self):
+        response = self.client.get('/admin/core/venta/')
+        cl = response.context['cl']
+        self.assertTrue(cl.conteo_aproximado)
+        self.assertEqual(cl.result_count, 20)
+        self.assertContains(response, 'Más de 20')
+        cl = self.client.get('/admin/core/venta/' + cl.url_contar).context['cl']
+        self.assertEqual((cl.result_count, cl.conteo_aproximado), (35, False))
+
+    @mock.patch('core.admin.VentaAdmin.list_per_page', 10)
+    def test_filtros_y_otro_orden(self):
+        cl = self.client.get('/admin/core/venta/?estado__exact=Pendiente').context['cl']
+        self.assertTrue(cl.keyset_activo)
+        self.assertIn('estado__exact=Pendiente', cl.url_siguiente)
+        # Ordenar por otra columna vuelve a la paginación estándar
+        cl = self.client.get('/admin/core/venta/?o=3').context['cl']
+        self.assertFalse(cl.keyset_activo)
+        self.assertEqual(cl.result_count, 35)
+
+    def test_cursor_invalido(self):
+        for url in (
+            '/admin/core/venta/?_cursor=no-es-fecha',
+            # Desempate que no es un id, id que no es número y cursor con partes de más
+            '/admin/core/venta/?_cursor=2024-01-01T00:00:00|abc',
+            '/admin/core/detalleventa/?_cursor=abc',
+            '/admin/core/venta/?_cursor=2024-01-01T00:00:00|1|2',
+        ):
+            self.assertEqual(self.client.get(url).status_code, 302, url)
+
+
+class BusquedaTextoTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        Producto.objects.bulk_create([
+            Producto(nombre='Hallulla', marca='Castaño', tipo='Propia', precio=Decimal('900.00'), categoria=self.categoria),
+            Producto(nombre='Empanada de pino', tipo='Horneado', precio=Decimal('2500.00'), categoria=self.categoria),
+        ])
+        Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo, estado='Pagado')
+        Venta.objects.create(usuario=self.admin, metodo_pago=self.efectivo, estado='Entregado')
+        self.client.force_login(self.admin)
+
+    def buscar(self, modelo, termino):
+        response = self.client.get(f'/admin/core/{modelo}/', {'q': termino})
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def nombres_productos(self, termino):
+        return sorted(p.nombre for p in self.buscar('producto', termino).result_list)
+
+    def test_busca_subcadenas_sin_like(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.nombres_productos('RAQUE'), ['Marraqueta'])
+        self.assertFalse([q for q in ctx.captured_queries if 'LIKE' in q['sql']])
+        self.assertEqual(self.nombres_productos('castaño'), ['Hallulla'])
+        self.assertEqual(self.nombres_productos('horneado pino'), ['Empanada de pino'])
+        self.assertEqual(self.nombres_productos('"de pino"'), ['Empanada de pino'])
+        self.assertEqual(self.nombres_productos('Propia'), ['Hallulla', 'Marraqueta'])
+
+    def test_indice_sigue_a_los_cambios(self):
+        Producto.objects.filter(nombre='Hallulla').update(nombre='Coliza')
+        producto = Producto.objects.create(nombre='Dobladita', tipo='Propia', precio=1, categoria=self.categoria)
+        self.assertEqual(self.nombres_productos('coliza'), ['Coliza'])
+        self.assertEqual(self.nombres_productos('hallulla'), [])
+        self.assertEqual(self.nombres_productos('dobladita'), ['Dobladita'])
+        producto.hard_delete()
+        self.assertEqual(self.nombres_productos('dobladita'), [])
+        # Los borrados lógicos siguen indexados pero el admin no los muestra
+        Producto.objects.filter(nombre='Coliza').delete()
+        self.assertEqual(self.nombres_productos('coliza'), [])
+
+    def test_terminos_cortos_y_caracteres_especiales(self):
+        # Bajo el largo mínimo del índice se usa la búsqueda con LIKE
+        self.assertEqual(self.nombres_productos('ll'), ['Hallulla'])
+        self.assertEqual(self.nombres_productos('pino" OR *'), [])
+        self.assertEqual(self.nombres_productos("'"), ['Empanada de pino', 'Hallulla', 'Marraqueta'])
+
+    def test_ventas_por_cliente_y_estado(self):
+        cl = self.buscar('venta', 'pérez')
+        self.assertEqual([v.usuario for v in cl.result_list], [self.cliente])
+        cl = self.buscar('venta', 'entreg')
+        self.assertEqual([v.estado for v in cl.result_list], ['Entregado'])
+        cl = self.buscar('venta', 'sistema pagado')
+        self.assertEqual(list(cl.result_list), [])
+
+    def test_admin_sin_filtro_usa_like(self):
+        from django.contrib import admin
+        from django.test import RequestFactory
+
+        from .busqueda import BusquedaTextoMixin
+
+        class CategoriaAdmin(BusquedaTextoMixin, admin.ModelAdmin):
+            search_fields = ['nombre']
+
+        resultado, _ = CategoriaAdmin(Categoria, admin.site).get_search_results(
+            RequestFactory().get('/admin/'), Categoria.objects.all(), 'nader',
+        )
+        self.assertEqual(list(resultado), [self.categoria])
+
+
+class DatosSinteticosTests(TestCase):
+    def ventas_generadas(self):
+        return list(
+            Venta.objects.order_by('id')
+            .values_list('usuario__username', 'canal_venta', 'estado', 'fecha', 'monto_total')
+        )
+
+    def test_generacion_determinista_y_cuadrada(self):
+        self.assertEqual(generar_ventas(num_ventas=300, num_productos=20, num_usuarios=10), (300, DetalleVenta.objects.count()))
+        primera = self.ventas_generadas()
+        self.assertFalse(ventas_descuadradas().exists())
+        self.assertTrue(all(fecha < timezone.now() for _, _, _, fecha, _ in primera))
+
+        Venta.all_objects.all().hard_delete()
+        generar_ventas(num_ventas=300, num_productos=20, num_usuarios=10)
+        self.assertEqual(self.ventas_generadas(), primera)
+
+    def test_tope_de_lineas(self):
+        ventas, lineas = generar_ventas(num_lineas=1000, num_productos=20, num_usuarios=10)
+        self.assertEqual(lineas, 1000)
+        self.assertEqual((Venta.objects.count(), DetalleVenta.objects.count()), (ventas, 1000))
+
+    def test_seed_db_escala(self):
+        salida = io.StringIO()
+        call_command('seed_db', scale=50, productos=10, usuarios=5, stdout=salida)
+        self.assertIn('50 ventas y', salida.getvalue())
+        self.assertIn('filas/s', salida.getvalue())
+        # Los datos base más las ventas sintéticas
+        self.assertEqual(Venta.objects.count(), 52)
+
+
+class PresupuestosAdminTests(TestCase):
+    """
+    Recorre las páginas de cada ModelAdmin como Admin y como Cliente y
+    compara su estado y sus consultas con presupuestos_admin.json. Los
+    presupuestos de tiempo y memoria dependen de la máquina: se comparan solo
+    con PRESUPUESTOS_TIEMPO=1, o con `manage.py benchmark admin`. Para
+    registrar una nueva línea base:
+    ACTUALIZAR_PRESUPUESTOS=1 python manage.py test core.tests.PresupuestosAdminTests
+    """
+
+    def setUp(self):
+        crear_datos_base(self)
+        generar_ventas(num_ventas=400, num_productos=60, num_usuarios=40)
+        for _ in range(3):
+            venta = Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo, estado='Pagado')
+            DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=2, precio_unitario=Decimal('1200.00'))
+
+    def test_paginas_dentro_del_presupuesto(self):
+        resultados = ejecutar_suite({'Admin': self.admin, 'Cliente': self.cliente})
+        if os.environ.get('ACTUALIZAR_PRESUPUESTOS'):
+            guardar_presupuestos('pruebas', resultados)
+        recursos = bool(os.environ.get('PRESUPUESTOS_TIEMPO'))
+        self.assertEqual(excesos(resultados, cargar_presupuestos('pruebas'), recursos=recursos), [])
+
+    def test_excesos(self):
+        base = {'estado': 200, 'consultas': 5, 'ms': 10.0, 'kb': 100}
+        self.assertEqual(excesos({'p': dict(base, ms=70.0)}, {'p': base}), [])
+        problemas = excesos({'p': dict(base, consultas=6, ms=90.0, kb=500), 'q': base}, {'p': base})
+        self.assertEqual(len(problemas), 4)
+        self.assertIn('q: sin línea base', problemas)
+        # Sin recursos, solo cuenta la consulta extra
+        self.assertEqual(len(excesos({'p': dict(base, consultas=6, ms=900.0, kb=5000)}, {'p': base}, recursos=False)), 1)
+
+
+class ConsultasAdminConstantesTests(TestCase):
+    # Modelos que crecen con el negocio: no caben en un <select>
+    modelos_voluminosos = (Usuario, Venta, DetalleVenta, Producto, Nutricional, Direccion)
+
+    def setUp(self):
+        crear_datos_base(self)
+        generar_ventas(num_ventas=30, num_productos=10, num_usuarios=5)
+        # Una alerta de stock por categoría, para que el panel de reposición y sus filtros no partan vacíos
+        for categoria in Categoria.objects.all():
+            Producto.objects.create(nombre=f'Agotado {categoria}', precio=Decimal('300.00'), tipo='Propia', categoria=categoria)
+        self.client.force_login(self.admin)
+
+    def contar_consultas(self):
+        conteos = {}
+        for clave, url in paginas(self.client, self.admin):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+            conteos[clave] = len(ctx)
+        return conteos
+
+    def test_consultas_no_dependen_de_las_filas(self):
+        antes = self.contar_consultas()
+        generar_ventas(num_ventas=200, num_productos=80, num_usuarios=60, semilla=2)
+        self.assertEqual(self.contar_consultas(), antes)
+
+    def test_claves_foraneas_del_admin(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        for modelo, modelo_admin in site._registry.items():
+            if modelo._meta.app_label != 'core':
+                continue
+            # Las columnas con claves foráneas deben venir en la misma consulta del listado
+            for nombre in modelo_admin.list_display:
+                campo = next((f for f in modelo._meta.get_fields() if f.name == nombre), None)
+                if campo is not None and campo.many_to_one:
+                    self.assertTrue(
+                        any(r.split('__')[0] == nombre for r in modelo_admin.list_select_related or ()),
+                        f'{modelo.__name__}.{nombre} sin list_select_related',
+                    )
+            if not modelo_admin.has_change_permission(request):
+                continue
+            for admin_form in [modelo_admin] + modelo_admin.get_inline_instances(request):
+                for campo in admin_form.model._meta.fields:
+                    if campo.many_to_one and campo.related_model in self.modelos_voluminosos \
+                            and campo.name in (admin_form.get_fields(request) or ()) \
+                            and campo.name not in admin_form.raw_id_fields + admin_form.autocomplete_fields:
+                        self.fail(f'{admin_form.model.__name__}.{campo.name} usa un <select> con toda la tabla')
+
+
+class ExportacionVentasTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.venta = Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo, estado='Pagado')
+        DetalleVenta.objects.create(venta=self.venta, producto=self.producto, cantidad=3, precio_unitario=Decimal('1200.00'))
+        otra = Venta.objects.create(
+            usuario=self.admin, metodo_pago=self.efectivo, fecha=timezone.now() - datetime.timedelta(days=40),
+        )
+        DetalleVenta.objects.create(venta=otra, producto=self.producto, cantidad=1, precio_unitario=Decimal('1000.00'))
+        borrada = Venta.objects.create(usuario=self.admin, metodo_pago=self.efectivo)
+        DetalleVenta.objects.create(venta=borrada, producto=self.producto, cantidad=1, precio_unitario=Decimal('1.00'))
+        borrada.delete()
+
+    def exportado(self, lineas, formato='csv'):
+        return ''.join(exportar(lineas, formato))
+
+    def test_csv_y_jsonl(self):
+        filas = self.exportado(lineas_de_venta()).splitlines()
+        self.assertEqual(filas[0].split(','), ENCABEZADOS)
+        self.assertEqual(len(filas), 3)
+        self.assertTrue(filas[-1].endswith(',Marraqueta,Panadería,3,1200.00,3600.00'))
+        self.assertIn(',cliente,Juan,Pérez,3600.00,', filas[-1])
+
+        registros = [json.loads(fila) for fila in self.exportado(lineas_de_venta(), 'jsonl').splitlines()]
+        self.assertEqual([r['venta'] for r in registros[1:]], [self.venta.id])
+        self.assertEqual((registros[1]['subtotal'], registros[1]['metodo_pago']), ('3600.00', 'Efectivo'))
+
+    def test_rango_de_fechas(self):
+        hoy = timezone.localdate()
+        self.assertEqual(lineas_de_venta(desde=hoy, hasta=hoy).count(), 1)
+        self.assertEqual(lineas_de_venta(hasta=hoy - datetime.timedelta(days=1)).count(), 1)
+
+    def test_admin(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/core/venta/', {
+            'action': 'exportar_csv', '_selected_action': [self.venta.pk],
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 2)
+
+        self.assertContains(self.client.get('/admin/core/venta/exportar/'), 'name="desde"')
+        hoy = timezone.localdate()
+        response = self.client.get('/admin/core/venta/exportar/', {
+            'desde': hoy - datetime.timedelta(days=60), 'hasta': hoy, 'formato': 'jsonl',
+        })
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        response = self.client.get('/admin/core/venta/exportar/', {'desde': hoy, 'hasta': hoy - datetime.timedelta(days=1), 'formato': 'csv'})
+        self.assertContains(response, 'La fecha inicial debe ser anterior a la final.')
+
+        # El cliente solo exporta sus propias ventas
+        self.client.force_login(self.cliente)
+        response = self.client.get('/admin/core/venta/exportar/', {
+            'desde': hoy - datetime.timedelta(days=60), 'hasta': hoy, 'formato': 'jsonl',
+        })
+        self.assertEqual([json.loads(f)['venta'] for f in b''.join(response.streaming_content).splitlines()], [self.venta.id])
+
+    def test_comando(self):
+        salida = io.StringIO()
+        call_command('exportar_ventas', formato='jsonl', stdout=salida)
+        self.assertEqual(len(salida.getvalue().splitlines()), 2)
+
+    @mock.patch('core.exportacion.TAMANO_BLOQUE', 200)
+    def test_memoria_acotada(self):
+        def pico(num_lineas):
+            generar_ventas(num_lineas=num_lineas - DetalleVenta.objects.count(), num_productos=20, num_usuarios=10)
+            tracemalloc.start()
+            try:
+                escritos = sum(len(bloque) for bloque in exportar(lineas_de_venta(), 'csv'))
+                return tracemalloc.get_traced_memory()[1], escritos
+            finally:
+                tracemalloc.stop()
+
+        pico_chico, bytes_chico = pico(1000)
+        pico_grande, bytes_grande = pico(5000)
+        self.assertGreater(bytes_grande, 4 * bytes_chico)
+        # Cinco veces más líneas no deben necesitar mucha más memoria
+        self.assertLess(pico_grande, pico_chico * 1.5)
+
+
+class ImportacionProductosTests(TestCase):
+    ENCABEZADO = 'codigo,nombre,tipo,precio,categoria,stock_actual,ingredientes,tiempo_preparacion,proteinas,azucar,gluten\n'
+
+    def setUp(self):
+        crear_datos_base(self)
+        self.producto.codigo = 'MAR-1'
+        self.producto.save()
+
+    def importar(self, filas, encabezado=ENCABEZADO, **kwargs):
+        return importar_productos(io.StringIO(encabezado + filas), **kwargs)
+
+    def test_inserta_actualiza_y_crea_categorias(self):
+        resultado = self.importar(
+            'MAR-1,Marraqueta,Propia,1300,Panadería,80,,,,,\n'
+            'KUC-1,Kuchen de nuez,Propia,9900,Pastelería,5,"Harina, nuez",90,6,20,si\n'
+            'TE-1,Té verde,Reventa,2500,Té,12,,,,,\n',
+            tamano_lote=2,
+        )
+        self.assertEqual((resultado.filas, resultado.importadas, resultado.errores), (3, 3, []))
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.precio, self.producto.stock_actual), (Decimal('1300.00'), 80))
+        kuchen = Producto.objects.get(codigo='KUC-1')
+        self.assertEqual((kuchen.categoria.nombre, kuchen.nutricional.tiempo_preparacion, kuchen.nutricional.gluten), ('Pastelería', 90, True))
+        self.assertTrue(Categoria.objects.filter(nombre='Té').exists())
+
+        # Reimportar actualiza la misma ficha nutricional y no duplica productos
+        self.importar('KUC-1,Kuchen de nuez,Propia,9900,Pastelería,5,"Harina, nuez",75,6,20,no\n')
+        kuchen_nuevo = Producto.objects.get(codigo='KUC-1')
+        self.assertEqual(kuchen_nuevo.nutricional_id, kuchen.nutricional_id)
+        self.assertEqual((kuchen_nuevo.nutricional.tiempo_preparacion, kuchen_nuevo.nutricional.gluten), (75, False))
+        self.assertEqual(Producto.all_objects.count(), 3)
+
+    def test_errores_por_fila(self):
+        resultado = self.importar(
+            'A,Pan,Propia,0,Panadería,1,,,,,\n'
+            'B,Pan,Propia,abc,Panadería,1,,,,,\n'
+            ',Pan,Propia,100,Panadería,1,,,,,\n'
+            'C,Pan,Propia,100,,1,,,,,\n'
+            'D,Pan,Propia,100,Panadería,-3,,,,,\n'
+            'E,Pan,Propia,100,Panadería,1,Harina,,,,\n'
+            'F,Pan,Propia,100,Panadería,1,,,,,\n'
+        )
+        self.assertEqual((resultado.filas, resultado.importadas), (7, 1))
+        self.assertEqual([(linea, codigo) for linea, codigo, _ in resultado.errores], [(2, 'A'), (3, 'B'), (4, ''), (5, 'C'), (6, 'D'), (7, 'E')])
+        mensajes = [mensaje for _, _, mensaje in resultado.errores]
+        self.assertEqual(mensajes[0], 'El precio debe ser mayor a 0.')
+        self.assertTrue(mensajes[1].startswith('precio:'))
+        self.assertTrue(mensajes[4].startswith('stock_actual:'))
+        self.assertTrue(mensajes[5].startswith('tiempo_preparacion:'))
+        self.assertEqual(list(Producto.objects.filter(codigo__isnull=False).order_by('codigo').values_list('codigo', flat=True)), ['F', 'MAR-1'])
+
+    def test_columnas_opcionales_y_borrados(self):
+        self.producto.delete()
+        resultado = self.importar('MAR-1,Marraqueta,Propia,1250,Panadería\n', encabezado='Codigo,Nombre,Tipo,Precio,Categoria\n')
+        self.assertEqual(resultado.importadas, 1)
+        # Vuelve a estar vigente y conserva el stock, que no venía en el archivo
+        producto = Producto.objects.get(codigo='MAR-1')
+        self.assertEqual((producto.precio, producto.stock_actual), (Decimal('1250.00'), 50))
+
+        with self.assertRaises(ArchivoInvalido):
+            self.importar('MAR-1,Marraqueta\n', encabezado='codigo,nombre\n')
+
+    def test_admin_y_comando(self):
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get('/admin/core/producto/'), '/admin/core/producto/importar/')
+        archivo = SimpleUploadedFile('productos.csv', (self.ENCABEZADO + 'X-1,Hallulla,Propia,900,Panadería,10,,,,,\nX-2,Mala,Propia,-1,Panadería,1,,,,,\n').encode())
+        response = self.client.post('/admin/core/producto/importar/', {'archivo': archivo})
+        self.assertContains(response, '1 de 2 filas importadas.')
+        self.assertContains(response, 'El precio debe ser mayor a 0.')
+        self.assertTrue(Producto.objects.filter(codigo='X-1').exists())
+        # El cliente no puede importar
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get('/admin/core/producto/importar/').status_code, 403)
+
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ruta = os.path.join(directorio.name, 'productos.csv')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(self.ENCABEZADO + 'X-3,Coliza,Propia,800,Panadería,4,,,,,\n')
+        salida = io.StringIO()
+        call_command('importar_productos', ruta, stdout=salida)
+        self.assertIn('1 de 1 filas importadas', salida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('importar_productos', ruta + '.no-existe')
+
+
+class CacheMaestrosTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        CATEGORIAS.invalidar()
+        CATEGORIAS.reiniciar_contadores()
+
+    def nombres(self):
+        return [c.nombre for c in CATEGORIAS.todos()]
+
+    def test_lectura_e_invalidacion(self):
+        self.assertEqual(self.nombres(), ['Panadería'])
+        with self.assertNumQueries(0):
+            self.assertEqual(CATEGORIAS.obtener(self.categoria.pk).nombre, 'Panadería')
+            self.assertIsNone(CATEGORIAS.obtener('x'))
+        self.assertEqual((CATEGORIAS.aciertos, CATEGORIAS.fallos), (1, 1))
+
+        # save, update, bulk_create y soft delete descartan el cache
+        Categoria.objects.create(nombre='Pastelería')
+        self.assertEqual(self.nombres(), ['Panadería', 'Pastelería'])
+        Categoria.objects.filter(nombre='Pastelería').update(nombre='Tortas')
+        self.assertEqual(self.nombres(), ['Panadería', 'Tortas'])
+        Categoria.objects.bulk_create([Categoria(nombre='Bebidas')])
+        self.assertEqual(len(self.nombres()), 3)
+        Categoria.objects.get(nombre='Tortas').delete()
+        self.assertEqual(self.nombres(), ['Panadería', 'Bebidas'])
+
+        # Las filas retornadas por obtener son copias
+        copia = CATEGORIAS.obtener(self.categoria.pk)
+        copia.nombre = 'Otra'
+        self.assertEqual(CATEGORIAS.obtener(self.categoria.pk).nombre, 'Panadería')
+
+    def test_cache_por_pk(self):
+        nutricional = Nutricional.objects.create(ingredientes='Harina', tiempo_preparacion=30)
+        NUTRICIONALES.invalidar()
+        NUTRICIONALES.obtener(nutricional.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(NUTRICIONALES.obtener(nutricional.pk).ingredientes, 'Harina')
+        importar_productos(io.StringIO(
+            'codigo,nombre,tipo,precio,categoria,ingredientes,tiempo_preparacion,proteinas,azucar,gluten\n'
+            'X,Pan,Propia,100,Panadería,Harina,30,,,\n'
+        ))
+        Producto.objects.filter(codigo='X').update(nutricional=nutricional)
+        importar_productos(io.StringIO(
+            'codigo,nombre,tipo,precio,categoria,ingredientes,tiempo_preparacion,proteinas,azucar,gluten\n'
+            'X,Pan,Propia,100,Panadería,Harina integral,30,,,\n'
+        ))
+        # La importación actualiza la ficha con SQL directo y también invalida
+        self.assertEqual(NUTRICIONALES.obtener(nutricional.pk).ingredientes, 'Harina integral')
+
+    @override_settings(CACHE_MAESTROS='default')
+    def test_cache_compartido_entre_procesos(self):
+        from django.core.cache import cache
+        cache.clear()
+        # Otra instancia sobre la misma tabla hace de segundo proceso
+        otro_proceso = CacheMaestro(Categoria)
+        self.assertEqual(self.nombres(), ['Panadería'])
+        with self.assertNumQueries(0):
+            self.assertEqual([c.nombre for c in otro_proceso.todos()], ['Panadería'])
+        self.assertEqual(otro_proceso.compartidos, 1)
+
+        Categoria.objects.create(nombre='Pastelería')
+        self.assertEqual(len(otro_proceso.todos()), 2)
+
+    def test_admin_sin_consultas_a_maestras(self):
+        Categoria.objects.create(nombre='Pastelería')
+        self.client.force_login(self.admin)
+        urls = ['/admin/core/producto/', '/admin/core/producto/add/', f'/admin/core/usuario/{self.cliente.pk}/change/']
+        for url in urls:
+            self.client.get(url)
+        for url in urls:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+            self.assertNotIn('FROM "core_categoria"', sql, url)
+            self.assertNotIn('FROM "core_rol"', sql, url)
+        self.assertContains(self.client.get('/admin/core/producto/'), f'?categoria__id__exact={self.categoria.pk}')
+
+        datos = {'nombre': 'Hallulla', 'precio': '900', 'tipo': 'Propia', 'stock_actual': 10}
+        response = self.client.post('/admin/core/producto/add/', {**datos, 'categoria': 999})
+        self.assertContains(response, 'Select a valid choice')
+        self.client.post('/admin/core/producto/add/', {**datos, 'categoria': self.categoria.pk})
+        self.assertEqual(Producto.objects.get(nombre='Hallulla').categoria, self.categoria)
+
+    def test_estadisticas(self):
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get('/admin/cache-maestros/'), 'Categorias')
+        self.client.post('/admin/cache-maestros/')
+        self.assertEqual(CATEGORIAS.aciertos, 0)
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get('/admin/cache-maestros/').status_code, 403)
+
+
+class InstrumentacionTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        instrumentacion.limpiar()
+
+    def test_registra_peticiones(self):
+        self.client.force_login(self.admin)
+        with self.assertLogs('core.instrumentacion', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/admin/core/producto/')
+        registro = instrumentacion.recientes()[0]
+        self.assertEqual(json.loads(logs.records[0].getMessage()), registro)
+        self.assertEqual(
+            (registro['url_name'], registro['modelo'], registro['rol'], registro['estado']),
+            ('admin:core_producto_changelist', 'core.producto', 'Admin', 200),
+        )
+        self.assertEqual(registro['consultas'], len(ctx.captured_queries))
+        self.assertGreaterEqual(registro['ms'], registro['ms_db'])
+        self.assertLessEqual(len(registro['sql_lentas']), 5)
+
+        # Vistas propias de un ModelAdmin también se etiquetan con su modelo
+        self.client.get('/admin/core/producto/importar/')
+        self.assertEqual(instrumentacion.recientes()[0]['modelo'], 'core.producto')
+
+    def test_consultas_repetidas(self):
+        medicion = instrumentacion.MedicionConsultas(num_lentas=2)
+        with connection.execute_wrapper(medicion):
+            for pk in (1, 1, 2):
+                list(Categoria.objects.filter(pk=pk))
+            list(Producto.objects.all())
+        self.assertEqual((medicion.consultas, medicion.repetidas, len(medicion.lentas)), (4, 1, 2))
+
+    @override_settings(INSTRUMENTACION_MUESTREO=0)
+    def test_muestreo(self):
+        self.client.force_login(self.admin)
+        self.client.get('/admin/')
+        self.assertEqual(instrumentacion.recientes(), [])
+
+    def test_pagina_admin(self):
+        self.client.force_login(self.admin)
+        self.client.get('/admin/core/venta/')
+        self.assertContains(self.client.get('/admin/instrumentacion/'), 'admin:core_venta_changelist')
+        self.client.post('/admin/instrumentacion/')
+        self.assertEqual(len(instrumentacion.recientes()), 1)
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get('/admin/instrumentacion/').status_code, 403)
+
+    def test_log_crea_su_directorio_al_escribir(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ruta = os.path.join(directorio.name, 'logs', 'peticiones.jsonl')
+        handler = ArchivoRotativo(ruta, delay=True)
+        self.addCleanup(handler.close)
+        self.assertFalse(os.path.exists(os.path.dirname(ruta)))
+        handler.emit(logging.makeLogRecord({'msg': '{}'}))
+        with open(ruta, encoding='utf-8') as archivo:
+            self.assertEqual(archivo.read(), '{}\n')
+
+
+class PoliticaAccesoTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        # Su id contiene el del cliente: la regla anterior por subcadenas lo dejaba pasar
+        self.otro = Usuario.objects.create_user(
+            pk=int(f'1{self.cliente.pk}'), username='otro', email='otro@forneria.cl', password='otro123',
+            first_name='Ana', paterno='Rojas', run='33333333-3', rol=self.rol_cliente,
+        )
+        self.client.force_login(self.cliente)
+
+    def test_cliente_solo_edita_su_usuario(self):
+        self.assertEqual(self.client.get(f'/admin/core/usuario/{self.cliente.pk}/change/').status_code, 200)
+        self.assertEqual(self.client.get(f'/admin/core/usuario/{self.otro.pk}/change/').status_code, 403)
+        self.assertEqual(self.client.get(f'/admin/core/usuario/{self.otro.pk}/password/').status_code, 403)
+        self.assertEqual(self.client.get(f'/admin/core/usuario/{self.otro.pk}/delete/').status_code, 403)
+        self.assertEqual(self.client.get('/admin/core/usuario/add/').status_code, 403)
+
+    def test_cliente_sin_acceso_a_catalogo(self):
+        # Ni con el permiso de Django la política lo deja pasar
+        self.cliente.user_permissions.add(Permission.objects.get(codename='view_producto'))
+        for path in ('/admin/core/producto/', '/admin/core/producto/importar/', '/admin/core/categoria/'):
+            self.assertEqual(self.client.get(path).status_code, 403, path)
+        self.assertEqual(self.client.get('/admin/core/venta/').status_code, 200)
+        indice = self.client.get('/admin/')
+        self.assertNotContains(indice, '/admin/core/producto/')
+        self.assertContains(indice, '/admin/core/venta/')
+
+    def test_admin_sin_restricciones(self):
+        self.client.force_login(self.admin)
+        for path in ('/admin/core/producto/', f'/admin/core/usuario/{self.otro.pk}/change/', '/admin/core/usuario/add/'):
+            self.assertEqual(self.client.get(path).status_code, 200, path)
+
+    def test_tabla_compilada(self):
+        reglas = politica.compilar()[TipoRol.CLIENTE]
+        self.assertEqual(reglas['core_usuario_change'], politica.Acceso.PROPIO)
+        self.assertEqual(reglas['auth_user_password_change'], politica.Acceso.PROPIO)
+        self.assertEqual(reglas['core_producto_importar'], politica.Acceso.DENEGADO)
+        self.assertNotIn('core_usuario_changelist', reglas)
+        self.assertNotIn('core_venta_changelist', reglas)
+
+    def test_permisos_del_model_admin(self):
+        from django.contrib import admin
+        from django.test import RequestFactory
+
+        request = RequestFactory().get('/admin/')
+        request.user = self.cliente
+        usuario_admin = admin.site._registry[Usuario]
+        self.assertFalse(usuario_admin.has_add_permission(request))
+        self.assertTrue(usuario_admin.has_change_permission(request, self.cliente))
+        self.assertFalse(usuario_admin.has_change_permission(request, self.otro))
+        self.assertFalse(admin.site._registry[Producto].has_module_permission(request))
+
+
+class PerfilBaseDatosTests(TestCase):
+    def pragmas(self):
+        conexion = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            with conexion.cursor() as cursor:
+                return {
+                    pragma: cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+                    for pragma in ('journal_mode', 'synchronous', 'busy_timeout')
+                }
+        finally:
+            conexion.close()
+
+    def test_pragmas_sqlite(self):
+        self.assertEqual(self.pragmas(), {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000})
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 250}):
+            self.assertEqual(self.pragmas()['busy_timeout'], 250)
+
+    def test_conexiones_persistentes(self):
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 60)
+        self.assertTrue(connection.settings_dict['CONN_HEALTH_CHECKS'])
+
+    def test_servidor_de_carga(self):
+        with servidor(2) as direccion:
+            resultado = generar_carga(direccion, [('GET', '/admin/login/', None, {'Host': 'testserver'})], 2, 0.3)
+        self.assertGreater(resultado['peticiones'], 0)
+        self.assertEqual((resultado['errores'], list(resultado['estados'])), ([], [200]))
+
+
+class ConcurrenciaSqliteTests(TransactionTestCase):
+    def setUp(self):
+        crear_datos_base(self)
+
+    def tearDown(self):
+        concurrencia.COLA.detener()
+
+    def estres(self, hilos=8, operaciones=25):
+        errores = []
+
+        def venta_y_devolucion():
+            # Lee y luego escribe en la misma transacción, como el admin al guardar una venta
+            with transaction.atomic():
+                Producto.objects.get(pk=self.producto.pk)
+                ajustar_stock({self.producto.pk: 1})
+                ajustar_stock({self.producto.pk: -2})
+
+        def trabajar():
+            try:
+                for _ in range(operaciones):
+                    concurrencia.escribir(venta_y_devolucion)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        trabajadores = [threading.Thread(target=trabajar) for _ in range(hilos)]
+        for hilo in trabajadores:
+            hilo.start()
+        for hilo in trabajadores:
+            hilo.join()
+        self.producto.refresh_from_db()
+        return errores, self.producto.stock_actual - 50
+
+    def test_estres_sin_escrituras_perdidas(self):
+        self.assertEqual(self.estres(), ([], 8 * 25))
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    @override_settings(SQLITE_COLA_ESCRITURA=True)
+    def test_estres_con_cola_de_escritura(self):
+        self.assertEqual(self.estres(), ([], 8 * 25))
+        self.assertIsNotNone(concurrencia.COLA._hilo)
+
+    @override_settings(SQLITE_ESPERA_REINTENTO=0)
+    def test_reintenta_bloqueos(self):
+        funcion = mock.Mock(side_effect=[OperationalError('database is locked')] * 2 + ['ok'])
+        self.assertEqual(concurrencia.escribir(funcion), 'ok')
+        self.assertEqual(funcion.call_count, 3)
+
+        # Otros errores, o los que agotan los intentos, suben de inmediato
+        funcion = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with self.assertRaises(OperationalError):
+            concurrencia.escribir(funcion)
+        self.assertEqual(funcion.call_count, 1)
+        funcion = mock.Mock(side_effect=OperationalError('database is locked'))
+        with override_settings(SQLITE_REINTENTOS=3), self.assertRaises(OperationalError):
+            concurrencia.escribir(funcion)
+        self.assertEqual(funcion.call_count, 3)
+
+        # Dentro de un atomic() externo no se reintenta
+        funcion = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError), transaction.atomic():
+            concurrencia.escribir(funcion)
+        self.assertEqual(funcion.call_count, 1)
+
+
+class AsgiTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.venta = Venta.objects.create(usuario=self.admin, metodo_pago=self.efectivo)
+        instrumentacion.limpiar()
+
+    def test_middleware_sin_saltos_de_hilo(self):
+        from django.core.handlers.asgi import ASGIHandler
+        from asgiref.sync import iscoroutinefunction
+
+        from .middleware import RoleBasedAccessMiddleware
+
+        handler = ASGIHandler()
+        propios = [m for m in handler._view_middleware if isinstance(getattr(m, '__self__', None), RoleBasedAccessMiddleware)]
+        self.assertEqual(len(propios), 1)
+        self.assertTrue(iscoroutinefunction(propios[0]))
+
+    async def test_catalogo(self):
+        self.assertEqual((await self.async_client.get('/api/catalogo/')).status_code, 401)
+        await self.async_client.aforce_login(self.cliente)
+        for i in range(3):
+            await Producto.objects.acreate(
+                nombre=f'Hallulla {i}', precio=Decimal('900.00'), tipo='Propia', categoria=self.categoria,
+            )
+        with mock.patch('core.api.LIMITE_CATALOGO', 2):
+            pagina = (await self.async_client.get('/api/catalogo/')).json()
+            self.assertEqual(len(pagina['productos']), 2)
+            self.assertEqual(pagina['productos'][0]['categoria'], 'Panadería')
+            siguiente = (await self.async_client.get(f'/api/catalogo/?despues={pagina["siguiente"]}')).json()
+        self.assertEqual([p['nombre'] for p in siguiente['productos']], ['Hallulla 1', 'Hallulla 2'])
+        self.assertIsNone(siguiente['siguiente'])
+        buscados = (await self.async_client.get('/api/catalogo/?q=Marraq')).json()['productos']
+        self.assertEqual([p['nombre'] for p in buscados], ['Marraqueta'])
+        self.assertEqual((await self.async_client.get('/api/catalogo/?categoria=x')).status_code, 400)
+
+    async def test_estado_venta_por_rol(self):
+        await self.async_client.aforce_login(self.cliente)
+        # La venta es del admin: para el cliente no existe
+        self.assertEqual((await self.async_client.get(f'/api/ventas/{self.venta.pk}/estado/')).status_code, 404)
+        await self.async_client.aforce_login(self.admin)
+        respuesta = await self.async_client.get(f'/api/ventas/{self.venta.pk}/estado/')
+        self.assertEqual(respuesta.json()['estado'], 'Pendiente')
+        registro = instrumentacion.recientes()[0]
+        self.assertEqual((registro['url_name'], registro['rol']), ('api_estado_venta', 'Admin'))
+        self.assertGreater(registro['consultas'], 0)
+
+    async def test_estado_venta_exige_permiso(self):
+        empleado = await Usuario.objects.acreate(
+            username='empleado', first_name='Eva', paterno='Soto', run='44444444-4', is_staff=True,
+        )
+        await self.async_client.aforce_login(empleado)
+        self.assertEqual((await self.async_client.get(f'/api/ventas/{self.venta.pk}/estado/')).status_code, 403)
+        await empleado.user_permissions.aadd(await Permission.objects.aget(codename='view_venta'))
+        self.assertEqual((await self.async_client.get(f'/api/ventas/{self.venta.pk}/estado/')).status_code, 200)
+
+    async def test_politica_en_modo_async(self):
+        await self.async_client.aforce_login(self.cliente)
+        self.assertEqual((await self.async_client.get('/admin/core/producto/')).status_code, 403)
+        self.assertEqual((await self.async_client.get(f'/admin/core/usuario/{self.admin.pk}/change/')).status_code, 403)
+        self.assertEqual((await self.async_client.get(f'/admin/core/usuario/{self.cliente.pk}/change/')).status_code, 200)
+
+
+class CajaTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.productos = [self.producto] + [
+            Producto.objects.create(
+                nombre=f'Pan {i}', precio=Decimal('500.00') + i, tipo='Propia',
+                categoria=self.categoria, stock_actual=20,
+            )
+            for i in range(9)
+        ]
+        self.client.force_login(self.admin)
+
+    def cobrar(self, lineas, clave=None, **extra):
+        cuerpo = {'lineas': [{'producto': pid, 'cantidad': cantidad} for pid, cantidad in lineas], **extra}
+        cabeceras = {'HTTP_IDEMPOTENCY_KEY': clave} if clave else {}
+        return self.client.post('/api/ventas/', json.dumps(cuerpo), content_type='application/json', **cabeceras)
+
+    def test_registra_venta_y_descuenta_stock(self):
+        respuesta = self.cobrar([(self.producto.pk, 3), (self.productos[1].pk, 2), (self.producto.pk, 1)],
+                                metodo_pago=self.efectivo.pk)
+        self.assertEqual(respuesta.status_code, 201)
+        venta = Venta.objects.get(pk=respuesta.json()['id'])
+        self.assertEqual((venta.estado, venta.metodo_pago_id, venta.usuario_id), ('Pagado', self.efectivo.pk, self.admin.pk))
+        # Las líneas repetidas del mismo producto se agrupan
+        self.assertEqual(venta.detalleventa_set.count(), 2)
+        self.assertEqual(venta.monto_total, Decimal('4') * 1200 + 2 * Decimal('500'))
+        self.assertEqual(Decimal(respuesta.json()['monto_total']), venta.monto_total)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 46)
+
+    def test_reintento_con_la_misma_clave(self):
+        primera = self.cobrar([(self.producto.pk, 5)], clave='caja1-0001')
+        segunda = self.cobrar([(self.producto.pk, 5)], clave='caja1-0001')
+        self.assertEqual((primera.status_code, segunda.status_code), (201, 200))
+        self.assertEqual(primera.json()['id'], segunda.json()['id'])
+        self.assertEqual(Venta.objects.count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 45)
+        # La carrera entre dos reintentos la resuelve la restricción única
+        venta = Venta.objects.get()
+        with mock.patch('core.caja.Venta.all_objects.filter') as filtro:
+            filtro.return_value.first.side_effect = [None, venta]
+            repetida, creada = registrar_venta(self.admin, [(self.producto.pk, 5)], clave='caja1-0001')
+        self.assertEqual((repetida, creada), (venta, False))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 45)
+
+    def test_carrito_invalido(self):
+        respuesta = self.cobrar([(self.producto.pk, 0), ('x', 1)], metodo_pago=999)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(len(respuesta.json()['errores']), 3)
+        respuesta = self.cobrar([(self.producto.pk, 1), (999999, 1)])
+        self.assertEqual(respuesta.json()['errores'], ['Producto 999999 inexistente.'])
+        self.assertEqual(self.client.post('/api/ventas/', 'no es json', content_type='application/json').status_code, 400)
+        with self.assertRaises(CarritoInvalido):
+            registrar_venta(self.admin, [(self.producto.pk, 1)], clave='x' * 65)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_stock_insuficiente_no_deja_cambios(self):
+        respuesta = self.cobrar([(self.productos[1].pk, 1), (self.producto.pk, 51)])
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json()['fallidos'], [{'producto': self.producto.pk, 'cantidad': 51}])
+        self.assertFalse(Venta.all_objects.exists())
+        self.assertFalse(DetalleVenta.all_objects.exists())
+        self.productos[1].refresh_from_db()
+        self.assertEqual(self.productos[1].stock_actual, 20)
+
+    def test_permisos_y_csrf(self):
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.cobrar([(self.producto.pk, 1)]).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.cobrar([(self.producto.pk, 1)]).status_code, 401)
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.admin)
+        cuerpo = json.dumps({'lineas': [{'producto': self.producto.pk, 'cantidad': 1}]})
+        self.assertEqual(client.post('/api/ventas/', cuerpo, content_type='application/json').status_code, 403)
+
+    def test_permiso_add_venta(self):
+        # Sin rol no hay política que aplicar: decide el permiso del modelo, como en el admin
+        empleado = Usuario.objects.create_user(
+            username='empleado', password='empleado123', first_name='Eva', paterno='Soto', run='44444444-4',
+        )
+        self.client.force_login(empleado)
+        empleado.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.assertEqual(self.cobrar([(self.producto.pk, 1)]).status_code, 403)
+        Usuario.objects.filter(pk=empleado.pk).update(is_staff=True)
+        empleado.user_permissions.clear()
+        self.assertEqual(self.cobrar([(self.producto.pk, 1)]).status_code, 403)
+        self.assertFalse(Venta.objects.exists())
+        empleado.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.assertEqual(self.cobrar([(self.producto.pk, 1)], clave='caja2-0001').status_code, 201)
+
+        # La clave de otro usuario no entrega su venta
+        self.client.force_login(self.admin)
+        respuesta = self.cobrar([(self.producto.pk, 1)], clave='caja2-0001')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertNotIn('id', respuesta.json())
+        self.assertEqual(Venta.objects.count(), 1)
+
+    def test_consultas_constantes(self):
+        lineas = [(producto.pk, 1) for producto in self.productos]
+        # El método de pago sale del cache de tablas maestras
+        registrar_venta(self.admin, lineas[:1], metodo_pago_id=self.efectivo.pk)
+        # Clave, productos, la venta, un UPDATE de stock, un INSERT de sus
+        # movimientos y la revisión de sus alertas, las líneas en un INSERT,
+        # monto_total, el resumen del cliente (la venta, luego sus líneas y
+        # unidades) en tres INSERT y los savepoints, sin importar el largo del carrito
+        with self.assertNumQueries(17):
+            registrar_venta(self.admin, lineas, metodo_pago_id=self.efectivo.pk, clave='caja1-0002')
+
+
+class SincronizacionTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.pan = Producto.objects.create(
+            nombre='Hallulla', precio=Decimal('300.00'), tipo='Propia', categoria=self.categoria, stock_actual=5,
+        )
+        self.client.force_login(self.admin)
+
+    def subir(self, ventas, comprimir=True):
+        cuerpo = '\n'.join(v if isinstance(v, str) else json.dumps(v) for v in ventas).encode()
+        cabeceras = {}
+        if comprimir:
+            cuerpo = gzip.compress(cuerpo)
+            cabeceras['HTTP_CONTENT_ENCODING'] = 'gzip'
+        return self.client.post('/api/ventas/lote/', cuerpo, content_type='application/x-ndjson', **cabeceras)
+
+    def venta(self, clave, *lineas, **extra):
+        # lineas: (producto_id, cantidad) o (producto_id, cantidad, precio)
+        lineas = [dict(zip(('producto', 'cantidad', 'precio'), linea)) for linea in lineas]
+        return {'id': clave, 'lineas': lineas, **extra}
+
+    def test_registra_lote_y_reporta_cada_venta(self):
+        respuesta = self.subir([
+            self.venta('t1-1', (self.producto.pk, 2, '1200.00'), fecha='2026-10-01T09:30:00-03:00'),
+            self.venta('t1-2', (self.pan.pk, 3), (self.producto.pk, 1), metodo_pago=self.efectivo.pk),
+            self.venta('t1-3', (self.pan.pk, 3)),
+            self.venta('t1-4', (self.producto.pk, 1, 1000)),
+            'no es json',
+            self.venta('t1-1', (self.producto.pk, 1)),
+        ])
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(datos['totales'], {'aceptada': 2, 'duplicada': 0, 'rechazada': 4})
+        estados = [(r['linea'], r['estado']) for r in datos['resultados']]
+        self.assertEqual(estados, [
+            (1, 'aceptada'), (2, 'aceptada'), (3, 'rechazada'), (4, 'rechazada'), (5, 'rechazada'), (6, 'rechazada'),
+        ])
+        self.assertEqual(datos['resultados'][2]['errores'], [f'No hay suficiente stock del producto {self.pan.pk}.'])
+        self.assertEqual(datos['resultados'][3]['errores'], ['Línea 1: el precio cambió a 1200.00.'])
+        primera = Venta.objects.get(clave_idempotencia='t1-1')
+        self.assertEqual((primera.canal_venta, primera.estado, primera.monto_total), ('Local', 'Pagado', Decimal('2400.00')))
+        self.assertEqual(primera.fecha, datetime.datetime(2026, 10, 1, 12, 30, tzinfo=datetime.timezone.utc))
+        segunda = Venta.objects.get(clave_idempotencia='t1-2')
+        self.assertEqual(segunda.monto_total, Decimal('2100.00'))
+        self.assertEqual(ventas_descuadradas().count(), 0)
+        self.producto.refresh_from_db()
+        self.pan.refresh_from_db()
+        self.assertEqual((self.producto.stock_actual, self.pan.stock_actual), (47, 2))
+
+    def test_reenviar_el_lote_no_duplica(self):
+        ventas = [self.venta('t2-1', (self.producto.pk, 1)), self.venta('t2-2', (self.pan.pk, 1))]
+        primera = self.subir(ventas).json()
+        segunda = self.subir(ventas, comprimir=False).json()
+        self.assertEqual(segunda['totales'], {'aceptada': 0, 'duplicada': 2, 'rechazada': 0})
+        self.assertEqual([r['venta'] for r in primera['resultados']], [r['venta'] for r in segunda['resultados']])
+        self.assertEqual(Venta.objects.count(), 2)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 49)
+
+    def test_consultas_por_tramo(self):
+        def lote(prefijo, num_ventas):
+            return [(i, json.dumps(self.venta(f'{prefijo}-{i}', (self.producto.pk, 1))).encode()) for i in range(num_ventas)]
+
+        # Sin umbral de alerta que cruzar: la alerta nueva sería un INSERT solo en uno de los casos
+        Producto.objects.filter(pk=self.producto.pk).update(umbral_alerta=0)
+        # Dos tramos: las consultas no dependen de cuántas ventas trae cada uno
+        with CaptureQueriesContext(connection) as chico:
+            resultados = sincronizar_ventas(self.admin, lote('t3', 4), tamano_tramo=2)
+        with CaptureQueriesContext(connection) as grande:
+            sincronizar_ventas(self.admin, lote('t4', 40), tamano_tramo=20)
+        self.assertEqual({r['estado'] for r in resultados}, {'aceptada'})
+        self.assertEqual(len(chico.captured_queries), len(grande.captured_queries))
+        self.assertEqual(DetalleVenta.objects.count(), 44)
+
+    def test_lote_invalido(self):
+        respuesta = self.client.post('/api/ventas/lote/', b'no es gzip', content_type='application/x-ndjson',
+                                     HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(respuesta.status_code, 400)
+        with mock.patch('core.sincronizacion.MAX_VENTAS_LOTE', 2):
+            respuesta = self.subir([self.venta(f't5-{i}', (self.producto.pk, 1)) for i in range(3)])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Venta.objects.exists())
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.subir([self.venta('t5-9', (self.producto.pk, 1))]).status_code, 403)
+
+    def test_permiso_add_venta(self):
+        empleado = Usuario.objects.create_user(
+            username='terminal', password='terminal123', first_name='Caja', paterno='Dos', run='44444444-4', is_staff=True,
+        )
+        self.client.force_login(empleado)
+        self.assertEqual(self.subir([self.venta('t6-1', (self.producto.pk, 1))]).status_code, 403)
+        self.assertFalse(Venta.objects.exists())
+        empleado.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.assertEqual(self.subir([self.venta('t6-1', (self.producto.pk, 1))]).json()['totales']['aceptada'], 1)
+        # El id de la venta de otra terminal no se informa como duplicada
+        self.client.force_login(self.admin)
+        resultado = self.subir([self.venta('t6-1', (self.producto.pk, 1))]).json()['resultados'][0]
+        self.assertEqual((resultado['estado'], resultado['venta']), ('rechazada', None))
+        self.assertEqual(Venta.objects.count(), 1)
+
+
+class MovimientoStockTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.pan = Producto.objects.create(
+            nombre='Hallulla', precio=Decimal('900.00'), tipo='Propia', categoria=self.categoria, stock_actual=10,
+        )
+
+    def movimientos(self, producto):
+        return list(MovimientoStock.objects.filter(producto=producto).order_by('id').values_list('tipo', 'cantidad'))
+
+    def test_venta_registra_movimientos_con_la_venta(self):
+        venta, _ = registrar_venta(self.admin, [(self.producto.pk, 3), (self.pan.pk, 2)], self.efectivo.pk)
+        self.assertEqual(self.movimientos(self.producto), [('inicial', 50), ('venta', -3)])
+        self.assertEqual(
+            set(MovimientoStock.objects.filter(tipo='venta').values_list('venta_id', flat=True)), {venta.pk},
+        )
+        self.assertEqual(reconciliar_stock(aplicar=False), [])
+
+    def test_agotar_y_guardar_registran_movimientos(self):
+        self.client.force_login(self.admin)
+        self.client.post('/admin/core/producto/', {'action': 'marcar_agotado', '_selected_action': [self.pan.pk]})
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.stock_actual = 45
+        producto.save()
+        # Guardar sin cambiar el stock no registra nada
+        producto.nombre = 'Marraqueta grande'
+        producto.save()
+        self.assertEqual(self.movimientos(self.pan), [('inicial', 10), ('agotado', -10)])
+        self.assertEqual(self.movimientos(self.producto), [('inicial', 50), ('ajuste', -5)])
+        self.assertEqual(reconciliar_stock(aplicar=False), [])
+
+    def test_eliminar_venta_devuelve_stock(self):
+        primera, _ = registrar_venta(self.admin, [(self.producto.pk, 3), (self.pan.pk, 2)], self.efectivo.pk)
+        segunda, _ = registrar_venta(self.admin, [(self.pan.pk, 4)], self.efectivo.pk)
+        self.client.force_login(self.admin)
+        self.client.post(f'/admin/core/venta/{primera.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(self.movimientos(self.producto), [('inicial', 50), ('venta', -3), ('venta', 3)])
+        self.client.post('/admin/core/venta/', {'action': 'delete_selected', '_selected_action': [segunda.pk], 'post': 'yes'})
+        self.assertEqual(Venta.objects.count(), 0)
+        self.assertEqual(
+            dict(Producto.objects.filter(pk__in=[self.producto.pk, self.pan.pk]).values_list('pk', 'stock_actual')),
+            {self.producto.pk: 50, self.pan.pk: 10},
+        )
+        self.assertEqual(
+            sorted(MovimientoStock.objects.filter(cantidad__gt=0, tipo='venta').values_list('venta_id', 'cantidad')),
+            sorted([(primera.pk, 3), (primera.pk, 2), (segunda.pk, 4)]),
+        )
+        self.assertEqual(reconciliar_stock(aplicar=False), [])
+
+    def test_save_no_pisa_descuentos_concurrentes(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        ajustar_stock({self.producto.pk: 4})
+        producto.nombre = 'Marraqueta grande'
+        producto.save()
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, 46)
+
+    def test_reconciliar_corrige_update_directo(self):
+        Producto.objects.filter(pk=self.pan.pk).update(stock_actual=99)
+        self.assertEqual(reconciliar_stock(), [(self.pan.pk, 99, 10)])
+        self.pan.refresh_from_db()
+        self.assertEqual(self.pan.stock_actual, 10)
+
+    def test_compactar_y_reconciliar(self):
+        ajustar_stock({self.producto.pk: 5, self.pan.pk: 1})
+        self.assertEqual(compactar_stock(), 2)
+        self.assertEqual(CorteStock.objects.get(producto=self.producto).stock, 45)
+        ajustar_stock({self.producto.pk: 2})
+        Producto.objects.filter(pk=self.producto.pk).update(stock_actual=0)
+        # Desde los cortes solo se leen los movimientos posteriores; el resultado es el mismo que desde cero
+        with CaptureQueriesContext(connection) as ctx:
+            parcial = reconciliar_stock(aplicar=False)
+        self.assertEqual(parcial, reconciliar_stock(completo=True, aplicar=False))
+        self.assertEqual(parcial, [(self.producto.pk, 0, 43)])
+        lectura = [q['sql'] for q in ctx.captured_queries if 'core_movimientostock"."cantidad' in q['sql']]
+        self.assertIn('"id" > ', lectura[0])
+
+    def test_comando_reconciliar(self):
+        Producto.objects.filter(pk=self.pan.pk).update(stock_actual=3)
+        with self.assertRaises(CommandError):
+            call_command('reconciliar_stock', '--verificar', stdout=io.StringIO())
+        salida = io.StringIO()
+        call_command('reconciliar_stock', '--completo', stdout=salida)
+        self.assertIn('Stock corregido para 1 productos.', salida.getvalue())
+        call_command('reconciliar_stock', '--verificar', stdout=io.StringIO())
+
+
+class AlertasStockTests(TestCase):
+    def setUp(self):
+        crear_datos_base(self)
+        self.pan = Producto.objects.create(
+            nombre='Hallulla', precio=Decimal('900.00'), tipo='Propia', categoria=self.categoria, stock_actual=12,
+        )
+
+    def alertas(self):
+        return dict(AlertaStock.objects.values_list('producto_id', 'faltante'))
+
+    def test_ventas_y_reposicion_mantienen_las_alertas(self):
+        ajustar_stock({self.pan.pk: 2})
+        self.assertEqual(self.alertas(), {})
+        ajustar_stock({self.pan.pk: 3})
+        desde = AlertaStock.objects.get().desde
+        ajustar_stock({self.pan.pk: 4})
+        self.assertEqual(self.alertas(), {self.pan.pk: 7})
+        # La alerta conserva el momento en que el producto bajó del umbral
+        self.assertEqual(AlertaStock.objects.get().desde, desde)
+        reposicion.reponer_stock(Producto.objects.filter(pk=self.pan.pk))
+        self.assertEqual(self.alertas(), {})
+
+    def test_umbral_de_producto_y_categoria(self):
+        self.categoria.umbral_alerta = 60
+        self.categoria.save()
+        self.assertEqual(self.alertas(), {self.producto.pk: 10, self.pan.pk: 48})
+        self.pan.umbral_alerta = 5
+        self.pan.save()
+        self.assertEqual(self.alertas(), {self.producto.pk: 10})
+        self.producto.delete()
+        ajustar_stock({self.pan.pk: 12})
+        self.assertEqual(self.alertas(), {self.producto.pk: 10, self.pan.pk: 5})
+        # Un producto eliminado deja de estar en alerta al revisarse
+        alertas.revisar_alertas([self.producto.pk])
+        self.assertEqual(self.alertas(), {self.pan.pk: 5})
+
+    def test_revision_no_depende_del_catalogo(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as ctx:
+                ajustar_stock({self.pan.pk: 1})
+            return ctx.captured_queries
+
+        antes = consultas()
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Pan {i}', precio=Decimal('100.00'), tipo='Propia', categoria=self.categoria, stock_actual=i % 20)
+            for i in range(200)
+        ])
+        despues = consultas()
+        self.assertEqual(len(antes), len(despues))
+        revision = [q['sql'] for q in despues if 'core_alertastock' in q['sql']]
+        self.assertEqual(len(revision), 1)
+        self.assertIn(f'IN ({self.pan.pk})', revision[0])
+        self.assertEqual(AlertaStock.objects.count(), 100)
+
+    def test_reconstruir_corrige_update_directo(self):
+        Producto.objects.filter(pk=self.pan.pk).update(stock_actual=0)
+        self.assertEqual(alertas.reconstruir_alertas(), (1, 0))
+        Producto.objects.filter(pk=self.pan.pk).update(stock_actual=30)
+        self.assertEqual(alertas.reconstruir_alertas(), (0, 1))
+
+    def test_panel_con_velocidad_de_venta(self):
+        registrar_venta(self.admin, [(self.pan.pk, 7)], self.efectivo.pk)
+        candidatos = alertas.candidatos_reposicion()
+        self.assertEqual(
+            [(c['producto_id'], c['stock'], c['vendidas']) for c in candidatos], [(self.pan.pk, 5, 7)],
+        )
+        self.assertAlmostEqual(candidatos[0]['dias_restantes'], 5 * alertas.DIAS_VELOCIDAD / 7)
+        self.client.force_login(self.admin)
+        respuesta = self.client.get('/admin/core/alertastock/')
+        self.assertEqual([a.vendidas for a in respuesta.context['cl'].result_list], [7])
+        self.assertContains(respuesta, 'Hallulla')
+        salida = io.StringIO()
+        call_command('alertas_stock', stdout=salida)
+        self.assertIn('Hallulla', salida.getvalue())
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get('/admin/core/alertastock/').status_code, 403)
+
+    def test_importacion_con_umbral(self):
+        importar_productos(io.StringIO(
+            'codigo,nombre,tipo,precio,categoria,stock_actual,umbral_alerta\n'
+            'KUC-1,Kuchen de nuez,Propia,9900,Pastelería,5,8\n'
+        ))
+        kuchen = Producto.objects.get(codigo='KUC-1')
+        self.assertEqual(self.alertas(), {kuchen.pk: 3})
+
+
+class ResumenClientesTests(TestCase):
+    def setUp(self):
+        # El cache sobrevive al rollback de cada test y los id de usuario se repiten
+        cache.clear()
+        crear_datos_base(self)
+        self.pan = Producto.objects.create(
+            nombre='Hallulla', precio=Decimal('300.00'), tipo='Propia', categoria=self.categoria, stock_actual=100,
+        )
+
+    def resumenes(self):
+        return {
+            'totales': list(ResumenCliente.objects.order_by('usuario_id').values_list('usuario_id', 'total_gastado', 'num_ventas', 'ultima_compra')),
+            'compras': sorted(CompraProducto.objects.filter(unidades__gt=0).values_list('usuario_id', 'producto_id', 'unidades')),
+        }
+
+    def test_ventas_acumulan_el_resumen(self):
+        registrar_venta(self.cliente, [(self.producto.pk, 1), (self.pan.pk, 2)], self.efectivo.pk)
+        segunda, _ = registrar_venta(self.cliente, [(self.pan.pk, 3)], self.efectivo.pk)
+        sincronizar_ventas(self.cliente, [(1, json.dumps({
+            'id': 't1', 'metodo_pago': self.efectivo.pk, 'lineas': [{'producto': self.producto.pk, 'cantidad': 1}],
+        }).encode())])
+        resumen = ResumenCliente.objects.get(usuario=self.cliente)
+        # En caja la venta y sus líneas suben la versión por separado; el lote sincronizado, una vez
+        self.assertEqual((resumen.total_gastado, resumen.num_ventas, resumen.version), (Decimal('3900.00'), 3, 5))
+        self.assertEqual(resumen.ultima_compra, Venta.objects.get(clave_idempotencia='t1').fecha)
+        self.assertEqual(
+            [f['producto_id'] for f in clientes.pagina_historial(self.cliente.pk)['favoritos']], [self.pan.pk, self.producto.pk],
+        )
+        # Lo acumulado coincide con rehacerlo desde las ventas
+        acumulado = self.resumenes()
+        clientes.recalcular_clientes()
+        self.assertEqual(self.resumenes(), acumulado)
+
+    def test_eliminar_y_restaurar_venta(self):
+        primera, _ = registrar_venta(self.cliente, [(self.producto.pk, 1)], self.efectivo.pk)
+        registrar_venta(self.cliente, [(self.pan.pk, 2)], self.efectivo.pk)
+        antes = self.resumenes()
+        primera.delete()
+        resumen = ResumenCliente.objects.get(usuario=self.cliente)
+        self.assertEqual((resumen.total_gastado, resumen.num_ventas), (Decimal('600.00'), 1))
+        self.assertFalse(CompraProducto.objects.filter(producto=self.producto, unidades__gt=0).exists())
+        Venta.all_objects.filter(pk=primera.pk).restore()
+        self.assertEqual(self.resumenes(), antes)
+
+    def test_comando_corrige_resumen_desfasado(self):
+        registrar_venta(self.cliente, [(self.pan.pk, 2)], self.efectivo.pk)
+        antes = self.resumenes()
+        # Solo monto_total: VentaQuerySet.update lo deja pasar sin tocar el resumen
+        Venta.objects.filter(usuario=self.cliente).update(monto_total=Decimal('1.00'))
+        call_command('recalcular_clientes', stdout=io.StringIO())
+        self.assertEqual(ResumenCliente.objects.get(usuario=self.cliente).total_gastado, Decimal('1.00'))
+        self.assertEqual(self.resumenes()['compras'], antes['compras'])
+
+    def test_datos_sinteticos_acumulan(self):
+        generar_ventas(num_ventas=120, num_productos=10, num_usuarios=8)
+        acumulado = self.resumenes()
+        self.assertEqual(sum(n for _, _, n, _ in acumulado['totales']), 120)
+        clientes.recalcular_clientes()
+        self.assertEqual(self.resumenes(), acumulado)
+
+    def test_escrituras_por_el_orm(self):
+        venta = Venta.objects.create(usuario=self.cliente, metodo_pago=self.efectivo, canal_venta='Local')
+        linea = DetalleVenta.objects.create(venta=venta, producto=self.pan, cantidad=2, precio_unitario=Decimal('300.00'))
+        DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=1, precio_unitario=Decimal('1200.00'))
+        resumen, pagina = clientes.historial(self.cliente.pk)
+        self.assertEqual((resumen['total_gastado'], resumen['num_ventas']), (Decimal('1800.00'), 1))
+        self.assertEqual([v['id'] for v in pagina['ventas']], [venta.pk])
+        # Guardar la venta descarta la página en cache
+        venta.refresh_from_db()
+        venta.estado = 'Entregado'
+        venta.save()
+        self.assertEqual(clientes.historial(self.cliente.pk)[1]['ventas'][0]['estado'], 'Entregado')
+        # Editar, mover y borrar líneas deja lo mismo que rehacerlo desde las ventas
+        linea.cantidad = 5
+        linea.save()
+        otra = Venta.objects.create(usuario=self.admin, metodo_pago=self.efectivo, canal_venta='Local')
+        DetalleVenta.objects.filter(pk=linea.pk).update(venta=otra)
+        acumulado = self.resumenes()
+        clientes.recalcular_clientes()
+        self.assertEqual(self.resumenes(), acumulado)
+        self.assertEqual(ResumenCliente.objects.get(usuario=self.admin).total_gastado, Decimal('1500.00'))
+        otra.hard_delete()
+        Venta.all_objects.filter(pk=venta.pk).hard_delete()
+        self.assertEqual(self.resumenes(), {
+            'totales': [(self.admin.pk, Decimal('0.00'), 0, None), (self.cliente.pk, Decimal('0.00'), 0, None)], 'compras': [],
+        })
+
+    def test_seed_db_arma_el_resumen(self):
+        call_command('seed_db', stdout=io.StringIO())
+        cliente = Usuario.objects.get(email='cliente@forneria.cl')
+        resumen = ResumenCliente.objects.get(usuario=cliente)
+        self.assertEqual((resumen.total_gastado, resumen.num_ventas), (Decimal('9700.00'), 2))
+        self.assertEqual(len(clientes.pagina_historial(cliente.pk)['ventas']), 2)
+
+    def test_historial_en_cache_con_version(self):
+        for _ in range(3):
+            registrar_venta(self.cliente, [(self.pan.pk, 1)], self.efectivo.pk)
+        clientes.historial(self.cliente.pk)
+        # Con la página en cache, solo se lee el resumen
+        with self.assertNumQueries(1):
+            resumen, pagina = clientes.historial(self.cliente.pk)
+        self.assertEqual(len(pagina['ventas']), 3)
+        # Cambiar el estado no cambia los totales, pero descarta las páginas guardadas
+        Venta.objects.filter(usuario=self.cliente).update(estado='Entregado')
+        _, pagina = clientes.historial(self.cliente.pk)
+        self.assertEqual({v['estado'] for v in pagina['ventas']}, {'Entregado'})
+        registrar_venta(self.cliente, [(self.pan.pk, 1)], self.efectivo.pk)
+        self.assertEqual(len(clientes.historial(self.cliente.pk)[1]['ventas']), 4)
+
+    def test_vista_paginada_por_cursor(self):
+        ventas = [registrar_venta(self.cliente, [(self.pan.pk, 1)], self.efectivo.pk)[0].pk for _ in range(5)]
+        registrar_venta(self.admin, [(self.pan.pk, 1)], self.efectivo.pk)
+        self.client.force_login(self.cliente)
+        vistas, parametros = [], {}
+        with mock.patch.object(clientes, 'VENTAS_POR_PAGINA', 2):
+            while parametros is not None:
+                respuesta = self.client.get('/admin/mis-compras/', parametros)
+                self.assertEqual(respuesta.status_code, 200)
+                pagina = respuesta.context['pagina']
+                vistas += [v['id'] for v in pagina['ventas']]
+                parametros = {'despues': pagina['siguiente']} if pagina['siguiente'] else None
+        self.assertEqual(vistas, ventas[::-1])
+        self.assertContains(self.client.get('/admin/mis-compras/'), '$1500.00')
+        self.assertEqual(self.client.get('/admin/mis-compras/?despues=no-es-cursor').status_code, 400)
+
+    def test_consultas_no_dependen_de_las_compras(self):
+        registrar_venta(self.cliente, [(self.pan.pk, 1)], self.efectivo.pk)
+        with CaptureQueriesContext(connection) as pocas:
+            clientes.pagina_historial(self.cliente.pk)
+        generar_ventas(num_ventas=200, num_productos=10, num_usuarios=1)
+        frecuente = ResumenCliente.objects.order_by('-num_ventas').first().usuario_id
+        with CaptureQueriesContext(connection) as muchas:
+            clientes.pagina_historial(frecuente)
+        self.assertEqual(len(pocas), len(muchas))
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from .clientes import recalcular_clientes
+from .models import DetalleVenta, Venta
+
+
+def monto_calculado():
+    """Expresión con la suma de cantidad * precio_unitario de las líneas de cada Venta."""
+    suma = (
+        DetalleVenta.objects.filter(venta=OuterRef('pk'))
+        .order_by()
+        .values('venta')
+        .annotate(total=Sum(F('cantidad') * F('precio_unitario')))
+        .values('total')
+    )
+    campo = DecimalField(max_digits=10, decimal_places=2)
+    return Round(Coalesce(Subquery(suma, output_field=campo), Value(Decimal('0')), output_field=campo), 2)
+
+
+def recalcular_montos(ventas=None):
+    """
+    Recalcula monto_total en un solo UPDATE. Retorna la cantidad de ventas actualizadas.
+
+    Por defecto solo ventas vigentes: las eliminadas conservan el monto que tenían.
+    El UPDATE de solo monto_total no pasa por el resumen de clientes (ver
+    VentaQuerySet.update): se rehacen los clientes de las ventas descuadradas.
+    """
+    if ventas is None:
+        ventas = Venta.objects.all()
+    with transaction.atomic(using=ventas.db):
+        usuarios = set(ventas_descuadradas(ventas).values_list('usuario_id', flat=True))
+        actualizadas = ventas.update(monto_total=monto_calculado())
+        if usuarios:
+            recalcular_clientes(usuarios)
+    return actualizadas
+
+
+def ventas_descuadradas(ventas=None):
+    """Ventas cuyo monto_total no coincide con la suma de sus líneas."""
+    if ventas is None:
+        ventas = Venta.objects.all()
+    return ventas.alias(calculado=monto_calculado()).exclude(monto_total=F('calculado'))
@@ -1,3 +1,58 @@
-from django.shortcuts import render
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, HttpResponseRedirect
+from django.template.response import TemplateResponse
 
-# Create your views here.
+from . import cache_maestros, clientes, instrumentacion
+from .roles import es_cliente
+
+
+def estadisticas_cache_maestros(request):
+    """Aciertos y fallos del cache de tablas maestras de este proceso."""
+    if es_cliente(request):
+        raise PermissionDenied
+    if request.method == 'POST':
+        for cache in cache_maestros.CACHES_MAESTROS.values():
+            cache.reiniciar_contadores()
+        return HttpResponseRedirect(request.path)
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Cache de tablas maestras',
+        'estadisticas': cache_maestros.estadisticas(),
+    }
+    return TemplateResponse(request, 'admin/core/cache_maestros.html', context)
+
+
+def peticiones_recientes(request):
+    """Peticiones medidas por la instrumentación en este proceso, agrupadas por ruta."""
+    if es_cliente(request):
+        raise PermissionDenied
+    if request.method == 'POST':
+        instrumentacion.limpiar()
+        return HttpResponseRedirect(request.path)
+    registros = instrumentacion.recientes()
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Peticiones recientes',
+        'resumen': instrumentacion.resumen_por_ruta(registros),
+        'registros': registros[:100],
+        'total': len(registros),
+    }
+    return TemplateResponse(request, 'admin/core/instrumentacion.html', context)
+
+
+def mis_compras(request):
+    """Resumen de compras del usuario y sus ventas paginadas con ?despues=<cursor>; ver core/clientes.py."""
+    cursor = None
+    if request.GET.get('despues'):
+        cursor = clientes.leer_cursor(request.GET['despues'])
+        if cursor is None:
+            return HttpResponseBadRequest('Cursor inválido.')
+    resumen, pagina = clientes.historial(request.user.pk, cursor)
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Mis compras',
+        'resumen': resumen,
+        'pagina': pagina,
+    }
+    return TemplateResponse(request, 'admin/core/mis_compras.html', context)
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.InstrumentacionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,11 +76,111 @@ WSGI_APPLICATION = 'la_forneria.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Motor según el entorno (.env o variables): DB_ENGINE=sqlite (por defecto) o
+# mysql. Las conexiones se reutilizan entre peticiones del mismo hilo durante
+# DB_CONN_MAX_AGE segundos (0 = una conexión por petición, vacío = sin límite)
+# y se verifican antes de reutilizarlas. Django mantiene una conexión por hilo:
+# el pool efectivo es procesos x hilos del servidor WSGI, que debe quedar bajo
+# el max_connections de MySQL.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default='60', cast=lambda valor: int(valor) if valor else None)
+
+if DB_ENGINE == 'mysql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': config('DB_NAME', default='la_forneria'),
+            'USER': config('DB_USER', default='root'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='127.0.0.1'),
+            'PORT': config('DB_PORT', default='3306'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # BEGIN IMMEDIATE: la transacción toma el bloqueo de escritura al
+                # empezar y espera busy_timeout; con DEFERRED una transacción que
+                # leyó y luego escribe falla al instante con "database is locked"
+                'transaction_mode': config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+            },
+            'TEST': {
+                # Base de pruebas en archivo para que los tests con hilos compartan datos
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
     }
+
+# PRAGMA que core/signals.py aplica a cada conexión SQLite nueva. WAL deja leer
+# mientras otra conexión escribe; synchronous=NORMAL es seguro con WAL (solo
+# arriesga la última transacción ante un corte de energía, no la base) y
+# busy_timeout (ms) espera al bloqueo de escritura en vez de fallar al instante.
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='wal'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='normal'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+}
+# Escrituras de stock (core/concurrencia.py): intentos ante "database is locked",
+# espera base en segundos del backoff exponencial, y si pasan por un único hilo
+# escritor (solo SQLite)
+SQLITE_REINTENTOS = config('SQLITE_REINTENTOS', default=5, cast=int)
+SQLITE_ESPERA_REINTENTO = 0.05
+SQLITE_COLA_ESCRITURA = config('SQLITE_COLA_ESCRITURA', default=False, cast=bool)
+
+# Cache de tablas maestras (core/cache_maestros.py): siempre hay un cache por
+# proceso; CACHE_MAESTROS nombra un alias de CACHES (p. ej. uno FileBasedCache
+# o Redis) para compartir versiones y datos entre procesos. Vacío = solo proceso.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+CACHE_MAESTROS = config('CACHE_MAESTROS', default='')
+
+# Instrumentación de peticiones (core/instrumentacion.py)
+# Fracción de peticiones medidas: 1.0 todas, 0.1 una de cada diez, 0 ninguna
+INSTRUMENTACION_MUESTREO = config('INSTRUMENTACION_MUESTREO', default=1.0, cast=float)
+# Peticiones recientes que se muestran en /admin/instrumentacion/ (por proceso)
+INSTRUMENTACION_BUFFER = 500
+# Consultas más lentas que se guardan por petición
+INSTRUMENTACION_SQL_LENTAS = 5
+# Log JSON de una línea por petición, rotado por tamaño, p. ej. logs/peticiones.jsonl;
+# vacío (por defecto) lo desactiva
+INSTRUMENTACION_LOG = config('INSTRUMENTACION_LOG', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'mensaje': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'instrumentacion': {
+            # Crea el directorio del log al escribir la primera línea
+            'class': 'core.registro.ArchivoRotativo',
+            'filename': INSTRUMENTACION_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'formatter': 'mensaje',
+            'delay': True,
+        } if INSTRUMENTACION_LOG else {'class': 'logging.NullHandler'},
+    },
+    'loggers': {
+        'core.instrumentacion': {'handlers': ['instrumentacion'], 'level': 'INFO', 'propagate': False},
+    },
 }
 
 # Password validation
@@ -17,6 +17,16 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from core import api
+from core.views import estadisticas_cache_maestros, mis_compras, peticiones_recientes
+
 urlpatterns = [
+    path('admin/cache-maestros/', admin.site.admin_view(estadisticas_cache_maestros), name='cache_maestros'),
+    path('admin/instrumentacion/', admin.site.admin_view(peticiones_recientes), name='instrumentacion'),
+    path('admin/mis-compras/', admin.site.admin_view(mis_compras), name='mis_compras'),
     path('admin/', admin.site.urls),
+    path('api/catalogo/', api.catalogo, name='api_catalogo'),
+    path('api/ventas/', api.cobrar, name='api_cobrar'),
+    path('api/ventas/lote/', api.sincronizar, name='api_sincronizar'),
+    path('api/ventas/<int:pk>/estado/', api.estado_venta, name='api_estado_venta'),
 ]